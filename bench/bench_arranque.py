@@ -0,0 +1,58 @@
+"""
+Benchmark de arranque en frío de la CLI.
+Mide el tiempo de importar sbc.cli, el tiempo hasta que aparece el prompt
+y el tiempo hasta la primera respuesta de 'python -m sbc.cli'.
+Uso: python bench/bench_arranque.py
+"""
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parents[1]
+PROMPT = b'Consulta>>> '
+REPETICIONES = 10
+
+def tiempo_import() -> float:
+    """Segundos que tarda 'import sbc.cli' según -X importtime"""
+    salida = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import sbc.cli'],
+        cwd=RAIZ, capture_output=True, text=True,
+    ).stderr
+    linea = [l for l in salida.splitlines() if l.rstrip().endswith('| sbc.cli')][-1]
+    return int(linea.split('|')[1]) / 1e6
+
+def tiempo_prompt_y_respuesta() -> tuple[float, float]:
+    """Segundos hasta ver el prompt y hasta recibir la respuesta a una consulta"""
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(
+        [sys.executable, '-m', 'sbc.cli'], cwd=RAIZ,
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0,
+    )
+    leido = b''
+    while not leido.endswith(PROMPT):
+        leido += proceso.stdout.read(1)
+    t_prompt = time.perf_counter() - inicio
+
+    proceso.stdin.write(b'tomate color X ?\n')
+    proceso.stdin.flush()
+    leido = b''
+    while not leido.endswith(PROMPT):
+        leido += proceso.stdout.read(1)
+    t_respuesta = time.perf_counter() - inicio
+
+    proceso.stdin.write(b'q\n')
+    proceso.stdin.close()
+    proceso.wait()
+    return t_prompt, t_respuesta
+
+def main():
+    imports = [tiempo_import() for _ in range(REPETICIONES)]
+    prompts, respuestas = zip(*(tiempo_prompt_y_respuesta() for _ in range(REPETICIONES)))
+    print(f'import sbc.cli:       {statistics.median(imports) * 1000:7.1f} ms')
+    print(f'primer prompt:        {statistics.median(prompts) * 1000:7.1f} ms')
+    print(f'primera respuesta:    {statistics.median(respuestas) * 1000:7.1f} ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+Benchmark de carga de una KB repartida en muchos ficheros.
+Genera N ficheros sintéticos con hechos (y alguna regla) en un directorio
+temporal y compara carga_directorio con 1 proceso y con todos los núcleos.
+Uso: python bench/bench_carga.py [n_ficheros] [hechos_por_fichero]
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sbc.cargar_kb import carga_directorio
+
+def generar(directorio: Path, n_ficheros: int, hechos_por_fichero: int) -> None:
+    for f in range(n_ficheros):
+        lineas = [f'# cocina {f}', f'Plato cocina_{f} si <- Plato ingrediente ing{f}_0']
+        for i in range(hechos_por_fichero):
+            confianza = f' [0.{i % 9 + 1}]' if i % 10 == 0 else ''
+            lineas.append(f'plato{f}_{i % 500} ingrediente ing{f}_{i % 50}{confianza}')
+        (directorio / f'cocina_{f:04d}.txt').write_text('\n'.join(lineas) + '\n', encoding='utf-8')
+
+def medir(directorio: Path, n_procesos: int | None) -> tuple[float, int]:
+    inicio = time.perf_counter()
+    kb = carga_directorio(directorio, n_procesos=n_procesos)
+    return time.perf_counter() - inicio, len(kb['hechos'])
+
+def main():
+    n_ficheros = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    hechos_por_fichero = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        directorio = Path(tmp)
+        generar(directorio, n_ficheros, hechos_por_fichero)
+        for n_procesos in (1, None):
+            segundos, n_hechos = medir(directorio, n_procesos)
+            etiqueta = n_procesos or f'{os.cpu_count()} (todos)'
+            print(f'procesos={etiqueta}: {n_hechos} hechos en {segundos:.2f} s')
+
+if __name__ == '__main__':
+    main()
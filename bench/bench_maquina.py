@@ -0,0 +1,42 @@
+"""
+Microbenchmark: generadores anidados (query) frente al motor con pila explícita (sbc.maquina).
+Uso: python bench/bench_maquina.py
+"""
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sbc.cargar_kb import carga_kb
+from sbc.ed import Tripleta
+from sbc.parser import parsear_tripleta, parsear_regla
+from sbc.query import query
+from sbc.maquina import resolver
+
+REPETICIONES = 5
+
+def cadena(n: int) -> dict:
+    """Derivaciones de profundidad n: cierre transitivo de n0 sig n1 sig ... nN"""
+    return {
+        'hechos': [Tripleta(f'n{i}', 'sig', f'n{i + 1}') for i in range(n)],
+        'reglas': [parsear_regla('A alcanza B <- A sig B'), parsear_regla('A alcanza C <- A sig B, B alcanza C')],
+    }
+
+def medir(nombre: str, tripleta: Tripleta, kb: dict) -> None:
+    t_query = timeit.timeit(lambda: sum(1 for _ in query(tripleta, kb)), number=REPETICIONES)
+    t_pila = timeit.timeit(lambda: sum(1 for _ in resolver(tripleta, kb)), number=REPETICIONES)
+    print(f'{nombre:<30} query: {t_query * 1000:8.1f} ms  pila: {t_pila * 1000:8.1f} ms  x{t_query / t_pila:.1f}')
+
+def main():
+    kb_dir = Path(__file__).resolve().parents[1] / 'kb'
+    kb = carga_kb(kb_dir / 'ingredientes.txt', kb_dir / 'reglas.txt')
+    for consulta in ('X contiene lacteo', 'X alergeno Y', 'paella_marisco Y Z'):
+        medir(consulta, parsear_tripleta(consulta), kb)
+
+    # Por debajo del límite de recursión para que query también pueda
+    for profundidad in (50, 150, 300):
+        medir(f'cadena n0 alcanza X ({profundidad})', parsear_tripleta('n0 alcanza X'), cadena(profundidad))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""
+Microbenchmark: unify genérico frente al camino rápido precompilado.
+Uso: python bench/bench_unificar.py
+"""
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sbc.cargar_kb import carga_kb
+from sbc.parser import parsear_tripleta
+from sbc.unificar import unify, compilar_patron, unificar_hecho
+
+REPETICIONES = 200
+
+def main():
+    kb_dir = Path(__file__).resolve().parents[1] / 'kb'
+    hechos = carga_kb(kb_dir / 'ingredientes.txt', Path('/no/existe'))['hechos']
+
+    for consulta in ('X ingrediente Y', 'X tipo carne', 'paella_marisco ingrediente X', 'X Y Z'):
+        tripleta = parsear_tripleta(consulta)
+
+        def generico():
+            for hecho in hechos:
+                unify(tripleta, hecho)
+
+        def rapido():
+            patron = compilar_patron(tripleta)
+            for hecho in hechos:
+                unificar_hecho(patron, hecho)
+
+        t_generico = timeit.timeit(generico, number=REPETICIONES)
+        t_rapido = timeit.timeit(rapido, number=REPETICIONES)
+        print(f'{consulta:<30} unify: {t_generico * 1000:8.1f} ms  '
+              f'rapido: {t_rapido * 1000:8.1f} ms  x{t_generico / t_rapido:.1f}')
+
+if __name__ == '__main__':
+    main()
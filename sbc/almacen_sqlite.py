@@ -0,0 +1,284 @@
+"""
+Almacén persistente de hechos en SQLite.
+
+HechosSQLite se comporta como la lista kb['hechos'] (iterar, 'in', append, extend)
+pero guarda los hechos en un fichero, así que la KB puede superar la RAM y
+sobrevive a reinicios. Las reglas se compilan a joins SQL para que 'descubrir'
+se ejecute dentro de la base de datos:
+    - conjunción (AND): MIN de las confianzas
+    - disyunción (OR): MAX ... GROUP BY sobre el consecuente
+SQLite trabaja con una caché de páginas acotada, así que descubrir_en_disco usa un
+fichero temporal para que el cierre de una KB en memoria no necesite otra copia de
+todos los hechos (ver sbc.query.descubrir con max_pendientes).
+"""
+import sqlite3
+import tempfile
+from itertools import islice
+from pathlib import Path
+from sbc.ed import Tripleta, Regla, es_variable
+from sbc.unificar import Patron
+from sbc.grafo import GrafoDependencias, predicado_de
+from sbc.limites import Presupuesto, LimiteAlcanzado
+
+COLUMNAS = ('sujeto', 'predicado', 'objeto')
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS hechos (
+    sujeto TEXT NOT NULL,
+    predicado TEXT NOT NULL,
+    objeto TEXT NOT NULL,
+    confianza REAL NOT NULL DEFAULT 1.0,
+    -- 0 si es un hecho base, número de ejecución de 'descubrir' si es derivado
+    derivado INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (sujeto, predicado, objeto)
+) WITHOUT ROWID;
+-- Índices cubrientes: la clave primaria cubre (s), (s, p) y (s, p, o)
+CREATE INDEX IF NOT EXISTS hechos_pos ON hechos (predicado, objeto, sujeto, confianza);
+CREATE INDEX IF NOT EXISTS hechos_osp ON hechos (objeto, sujeto, predicado, confianza);
+-- Predicados con hechos agregados (append/extend) desde el último 'descubrir'
+CREATE TABLE IF NOT EXISTS agregados (
+    predicado TEXT PRIMARY KEY
+) WITHOUT ROWID;
+"""
+
+# Hechos existentes cuya confianza ha subido (los nuevos se marcan con 'derivado').
+# Tabla y disparador temporales: solo existen en esta conexión y no cambian el fichero.
+MEJORADOS = """
+CREATE TEMP TABLE IF NOT EXISTS mejorados (
+    sujeto TEXT NOT NULL,
+    predicado TEXT NOT NULL,
+    objeto TEXT NOT NULL,
+    PRIMARY KEY (sujeto, predicado, objeto)
+) WITHOUT ROWID;
+CREATE TEMP TRIGGER IF NOT EXISTS hechos_mejorados AFTER UPDATE OF confianza ON main.hechos
+BEGIN
+    INSERT OR IGNORE INTO mejorados VALUES (new.sujeto, new.predicado, new.objeto);
+END;
+"""
+
+# Memoria aproximada de un hecho en la tabla y sus dos índices, y caché mínima (KiB)
+BYTES_POR_HECHO = 200
+MIN_CACHE_KIB = 256
+
+# Si el hecho ya existe nos quedamos con la confianza máxima (OR)
+INSERTAR = """
+INSERT INTO hechos (sujeto, predicado, objeto, confianza) VALUES (?, ?, ?, ?)
+ON CONFLICT (sujeto, predicado, objeto) DO UPDATE SET confianza = excluded.confianza
+WHERE excluded.confianza > hechos.confianza
+"""
+
+
+def compilar_regla(regla: Regla, ejecucion: int) -> tuple[str, list] | None:
+    """
+    Compila una regla a un INSERT ... SELECT con un alias de 'hechos' por antecedente.
+    Retorna (sql, parametros) o None si alguna variable del consecuente no aparece en el cuerpo.
+    """
+    condiciones = []
+    parametros_where = []
+    # variable -> primera columna donde aparece (p.ej. 'h0.sujeto')
+    columnas_variable: dict[str, str] = {}
+
+    for i, antecedente in enumerate(regla.get_antecedentes()):
+        for columna, termino in zip(COLUMNAS, antecedente):
+            ref = f'h{i}.{columna}'
+            if not es_variable(termino):
+                condiciones.append(f'{ref} = ?')
+                parametros_where.append(termino)
+            elif termino in columnas_variable:
+                # Variable compartida: condición de join
+                condiciones.append(f'{ref} = {columnas_variable[termino]}')
+            else:
+                columnas_variable[termino] = ref
+
+    seleccion = []
+    parametros_select = []
+    for termino in regla.get_consecuente():
+        if not es_variable(termino):
+            seleccion.append('?')
+            parametros_select.append(termino)
+        elif termino in columnas_variable:
+            seleccion.append(columnas_variable[termino])
+        else:
+            return None
+
+    n = len(regla.get_antecedentes())
+    tablas = ', '.join(f'hechos h{i}' for i in range(n))
+    # MIN con varios argumentos es escalar en SQLite: confianza de la conjunción
+    confianzas = ', '.join(['?'] + [f'h{i}.confianza' for i in range(n)])
+    where = ' AND '.join(condiciones) if condiciones else '1'
+
+    sql = f"""
+        INSERT INTO hechos (sujeto, predicado, objeto, confianza, derivado)
+        SELECT s, p, o, MAX(c), ? FROM (
+            SELECT {seleccion[0]} AS s, {seleccion[1]} AS p, {seleccion[2]} AS o, MIN({confianzas}) AS c
+            FROM {tablas} WHERE {where}
+        ) WHERE 1 GROUP BY s, p, o
+        ON CONFLICT (sujeto, predicado, objeto) DO UPDATE SET confianza = excluded.confianza
+        WHERE excluded.confianza > hechos.confianza
+    """
+    parametros = [ejecucion] + parametros_select + [regla.confianza] + parametros_where
+    return sql, parametros
+
+
+class HechosSQLite:
+    """Hechos de la KB guardados en un fichero SQLite"""
+
+    def __init__(self, ruta: Path | str):
+        self.ruta = Path(ruta)
+        # Se puede crear en el hilo de carga y usar desde el principal
+        self.conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+        # Resultados intermedios (GROUP BY, ordenaciones) en ficheros temporales, no en memoria.
+        # Antes de crear las tablas temporales: cambiarlo después las borraría
+        self.conexion.execute('PRAGMA temp_store = FILE')
+        self.conexion.executescript(ESQUEMA)
+        self.conexion.executescript(MEJORADOS)
+
+    def __iter__(self):
+        for fila in self.conexion.execute('SELECT sujeto, predicado, objeto, confianza FROM hechos'):
+            yield Tripleta(*fila)
+
+    def __len__(self) -> int:
+        return self.conexion.execute('SELECT COUNT(*) FROM hechos').fetchone()[0]
+
+    def __contains__(self, hecho: Tripleta) -> bool:
+        """Mismo criterio que la lista: mismos términos y misma confianza"""
+        fila = self.conexion.execute(
+            'SELECT confianza FROM hechos WHERE sujeto = ? AND predicado = ? AND objeto = ?',
+            tuple(hecho),
+        ).fetchone()
+        return fila is not None and fila[0] == hecho.confianza
+
+    def append(self, hecho: Tripleta) -> None:
+        self.extend([hecho])
+
+    def extend(self, hechos) -> None:
+        """Inserta los hechos y anota sus predicados para el siguiente 'descubrir'"""
+        predicados = set()
+
+        def filas():
+            for hecho in hechos:
+                predicados.add(hecho.predicado)
+                yield (*hecho, hecho.confianza)
+
+        with self.conexion:
+            self.conexion.executemany(INSERTAR, filas())
+            self.conexion.executemany('INSERT OR IGNORE INTO agregados VALUES (?)',
+                                      ((p,) for p in predicados))
+
+    def buscar(self, patron: Patron) -> list[Tripleta]:
+        """Hechos candidatos para un patrón usando los índices de la tabla"""
+        where = ' AND '.join(f'{COLUMNAS[pos]} = ?' for pos, _ in patron.literales) or '1'
+        filas = self.conexion.execute(
+            f'SELECT sujeto, predicado, objeto, confianza FROM hechos WHERE {where}',
+            tuple(literal for _, literal in patron.literales),
+        )
+        return [Tripleta(*fila) for fila in filas]
+
+    def cardinalidad(self, patron: Patron) -> int:
+        """Número de hechos que casan con los literales del patrón"""
+        where = ' AND '.join(f'{COLUMNAS[pos]} = ?' for pos, _ in patron.literales) or '1'
+        return self.conexion.execute(
+            f'SELECT COUNT(*) FROM hechos WHERE {where}',
+            tuple(literal for _, literal in patron.literales),
+        ).fetchone()[0]
+
+    def descubrir(self, reglas: list[Regla], presupuesto: Presupuesto | None = None,
+                  max_pendientes: int | None = None) -> list[Tripleta]:
+        """
+        Encadenamiento hacia delante dentro de SQLite, por estratos del grafo de
+        dependencias: los estratos no recursivos ejecutan sus INSERT ... SELECT una vez
+        y los recursivos hasta que ninguno cambia la tabla. Un estrato cuyas entradas
+        son todas predicados derivados que no han cambiado (ni en esta ejecución ni
+        por hechos agregados desde la anterior) se salta.
+        Retorna, como el evaluador en memoria, los hechos que no existían antes de
+        empezar y los que ya existían pero han subido de confianza.
+        Con presupuesto cada sentencia ejecutada cuenta como un paso y al agotarlo se
+        guarda lo derivado hasta entonces. Con max_pendientes la caché de páginas se limita
+        a unos max_pendientes hechos (los resultados intermedios ya van a ficheros temporales).
+        """
+        if max_pendientes is not None:
+            cache = self.conexion.execute('PRAGMA cache_size').fetchone()[0]
+            # Tamaño negativo: KiB en lugar de páginas
+            self.conexion.execute(f'PRAGMA cache_size = {-max(MIN_CACHE_KIB, max_pendientes * BYTES_POR_HECHO // 1024)}')
+            try:
+                return self._descubrir(reglas, presupuesto)
+            finally:
+                self.conexion.execute(f'PRAGMA cache_size = {cache}')
+        return self._descubrir(reglas, presupuesto)
+
+    def _descubrir(self, reglas: list[Regla], presupuesto: Presupuesto | None) -> list[Tripleta]:
+        ejecucion = self.conexion.execute('SELECT COALESCE(MAX(derivado), 0) + 1 FROM hechos').fetchone()[0]
+        estratos = GrafoDependencias(reglas).estratos()
+        derivables = set().union(*(e.predicados for e in estratos))
+        with self.conexion:
+            # Un hecho agregado con un predicado derivado también dispara sus estratos
+            cambiados = {fila[0] for fila in self.conexion.execute('SELECT predicado FROM agregados')}
+            self.conexion.execute('DELETE FROM agregados')
+            self.conexion.execute('DELETE FROM mejorados')
+            try:
+                self._evaluar_estratos(estratos, derivables, cambiados, ejecucion, presupuesto)
+            except LimiteAlcanzado:
+                # Lo derivado hasta aquí es correcto (aunque incompleto): se guarda, y el
+                # siguiente 'descubrir' vuelve a evaluar lo que dependa de lo que ha cambiado
+                self.conexion.executemany('INSERT OR IGNORE INTO agregados VALUES (?)',
+                                          ((p,) for p in cambiados if p is not None))
+
+        filas = self.conexion.execute(
+            """SELECT sujeto, predicado, objeto, confianza FROM hechos WHERE derivado = ?
+               UNION
+               SELECT h.sujeto, h.predicado, h.objeto, h.confianza
+               FROM mejorados JOIN hechos h USING (sujeto, predicado, objeto)""",
+            (ejecucion,),
+        )
+        return [Tripleta(*fila) for fila in filas]
+
+    def _evaluar_estratos(self, estratos, derivables: set, cambiados: set, ejecucion: int,
+                          presupuesto: Presupuesto | None) -> None:
+        for estrato in estratos:
+            # Los predicados base pueden haber cambiado desde la última ejecución
+            if not any(p not in derivables or p in cambiados for p in estrato.entradas):
+                continue
+            sentencias = [(s, predicado_de(r.get_consecuente()))
+                          for s, r in ((compilar_regla(r, ejecucion), r) for r in estrato.reglas)
+                          if s is not None]
+            ronda = 0
+            cambios = True
+            while cambios:
+                if presupuesto is not None and not presupuesto.puede_profundizar(ronda):
+                    break
+                ronda += 1
+                cambios = False
+                for (sql, parametros), predicado in sentencias:
+                    if presupuesto is not None:
+                        presupuesto.paso()
+                    if self.conexion.execute(sql, parametros).rowcount > 0:
+                        cambios = True
+                        cambiados.add(predicado)
+                if not estrato.recursivo:
+                    break
+
+    def cerrar(self) -> None:
+        self.conexion.close()
+
+
+def descubrir_en_disco(kb: dict, presupuesto: Presupuesto | None, max_pendientes: int) -> list[Tripleta]:
+    """
+    Encadenamiento hacia delante de una KB sin motor propio en un fichero SQLite temporal.
+    Los hechos se copian y los derivados se agregan a kb['hechos'] en lotes de max_pendientes,
+    así que además de la KB solo hay en memoria un lote y la caché de SQLite (no el estado
+    del evaluador). Todo se recalcula desde cero (no es incremental) y, para el evaluador
+    en memoria (kb['evaluador']), los hechos agregados quedan como hechos base.
+    Retorna los hechos agregados: los nuevos y los que ya existían con menos confianza.
+    """
+    with tempfile.TemporaryDirectory() as directorio:
+        almacen = HechosSQLite(Path(directorio) / 'descubrir.sqlite')
+        try:
+            hechos = iter(kb['hechos'])
+            while lote := list(islice(hechos, max_pendientes)):
+                almacen.extend(lote)
+            nuevos = almacen.descubrir(kb['reglas'], presupuesto, max_pendientes)
+        finally:
+            almacen.cerrar()
+    for inicio in range(0, len(nuevos), max_pendientes):
+        kb['hechos'].extend(nuevos[inicio:inicio + max_pendientes])
+    return nuevos
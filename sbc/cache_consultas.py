@@ -0,0 +1,118 @@
+"""
+Caché LRU de resultados de consultas.
+
+La clave es el patrón de la consulta con las variables canónicas (X tipo Y y A tipo B
+comparten entrada). Cada entrada recuerda de qué predicados depende según el grafo de
+dependencias de las reglas, así que agregar 'tomate color rojo' solo invalida las
+consultas que dependen de 'color'.
+"""
+from collections import OrderedDict
+from sbc.ed import Tripleta, Sustitucion, es_variable
+from sbc.grafo import GrafoDependencias, predicado_de
+
+def normalizar(tripleta: Tripleta) -> tuple[tuple[str, str, str], list[str]]:
+    """
+    Renombra las variables por orden de aparición (V0, V1...).
+    Retorna la clave y la lista de variables originales en ese orden.
+    """
+    variables = []
+    clave = []
+    for termino in tripleta:
+        if es_variable(termino):
+            if termino not in variables:
+                variables.append(termino)
+            clave.append(f'V{variables.index(termino)}')
+        else:
+            clave.append(termino)
+    return tuple(clave), variables
+
+
+class CacheConsultas:
+    """Caché LRU limitada por número de entradas y por número total de respuestas guardadas"""
+
+    def __init__(self, max_entradas: int = 1024, max_respuestas: int = 100_000):
+        self.max_entradas = max_entradas
+        self.max_respuestas = max_respuestas
+        # clave -> (filas [(valores, confianza)], dependencias o None si depende de todo)
+        self.entradas: OrderedDict = OrderedDict()
+        # Índice inverso para invalidar sin recorrer todas las entradas
+        self.por_predicado: dict[str, set] = {}
+        self.dependen_de_todo: set = set()
+        self.respuestas = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self._grafo: GrafoDependencias | None = None
+        self._n_reglas = 0
+
+    def __len__(self) -> int:
+        return len(self.entradas)
+
+    def obtener(self, tripleta: Tripleta, kb: dict) -> list[tuple[Sustitucion, float]] | None:
+        """Resultados guardados para la consulta (con sus propias variables) o None"""
+        self._comprobar_reglas(kb)
+        clave, variables = normalizar(tripleta)
+        entrada = self.entradas.get(clave)
+        if entrada is None:
+            self.fallos += 1
+            return None
+        self.entradas.move_to_end(clave)
+        self.aciertos += 1
+        filas, _ = entrada
+        return [(Sustitucion(dict(zip(variables, valores))), confianza) for valores, confianza in filas]
+
+    def guardar(self, tripleta: Tripleta, resultados: list[tuple[Sustitucion, float]], kb: dict) -> None:
+        """Guarda los resultados de query para la consulta"""
+        self._comprobar_reglas(kb)
+        clave, variables = normalizar(tripleta)
+        filas = [(tuple(ss.aplicar(v) for v in variables), confianza) for ss, confianza in resultados]
+        if len(filas) > self.max_respuestas:
+            return
+
+        self._eliminar(clave)
+        dependencias = self._grafo.dependencias(predicado_de(tripleta))
+        self.entradas[clave] = (filas, dependencias)
+        self.respuestas += len(filas)
+        if dependencias is None:
+            self.dependen_de_todo.add(clave)
+        else:
+            for predicado in dependencias:
+                self.por_predicado.setdefault(predicado, set()).add(clave)
+
+        # Expulsar las entradas menos usadas recientemente
+        while len(self.entradas) > self.max_entradas or self.respuestas > self.max_respuestas:
+            self._eliminar(next(iter(self.entradas)))
+
+    def invalidar(self, predicado: str) -> None:
+        """Elimina las entradas que dependen de un predicado al que se han agregado hechos"""
+        if es_variable(predicado):
+            self.limpiar()
+            return
+        for clave in self.por_predicado.get(predicado, set()) | self.dependen_de_todo:
+            self._eliminar(clave)
+
+    def limpiar(self) -> None:
+        """Vacía la caché"""
+        self.entradas.clear()
+        self.por_predicado.clear()
+        self.dependen_de_todo.clear()
+        self.respuestas = 0
+
+    def _comprobar_reglas(self, kb: dict) -> None:
+        """Si cambian las reglas se reconstruye el grafo y se vacía la caché"""
+        reglas = kb['reglas']
+        if self._grafo is None or self._grafo.reglas is not reglas or self._n_reglas != len(reglas):
+            self._grafo = GrafoDependencias(reglas)
+            self._n_reglas = len(reglas)
+            self.limpiar()
+
+    def _eliminar(self, clave) -> None:
+        entrada = self.entradas.pop(clave, None)
+        if entrada is None:
+            return
+        filas, dependencias = entrada
+        self.respuestas -= len(filas)
+        if dependencias is None:
+            self.dependen_de_todo.discard(clave)
+        else:
+            for predicado in dependencias:
+                self.por_predicado[predicado].discard(clave)
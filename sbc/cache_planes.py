@@ -0,0 +1,86 @@
+"""
+Caché LRU de consultas analizadas.
+
+Cada línea de la CLI pasa por parsear_paginacion y parsear_consulta (pyparsing) y
+después el motor vuelve a buscar qué reglas pueden derivar la consulta y, en las
+conjunciones, el orden de los antecedentes (ver sbc.query.planificar). Con un flujo
+de consultas repetidas todo eso se repite igual cada vez. CachePlanes lo guarda por
+texto normalizado (espacios sobrantes fuera) y se vacía si cambian las reglas.
+El orden de una conjunción se elige con las cardinalidades del momento: si luego
+cambian los hechos el plan sigue siendo correcto, aunque puede no ser el mejor.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from sbc.ed import Tripleta, Regla
+from sbc.parser import parsear_consulta, parsear_paginacion
+from sbc.query import planificar, reglas_candidatas
+from sbc.unificar import compilar_patron
+
+# Tipos cuyo resultado no se modifica después (un 'hecho' acaba dentro de la KB)
+TIPOS_CACHEABLES = ('consulta', 'conjuncion', 'razonar', 'cuantos')
+
+
+@dataclass
+class Plan:
+    """Consulta analizada y lo que el motor necesita de ella que no depende de los hechos"""
+    consulta: Tripleta | list[Tripleta] | None
+    tipo: str
+    limite: int | None
+    desplazamiento: int
+    # Reglas que pueden derivar la consulta (si es una sola tripleta)
+    reglas: list[Regla] | None = None
+    # Orden de ejecución de la conjunción
+    orden: list[Tripleta] | None = None
+
+
+class CachePlanes:
+    """Caché LRU de planes por texto de la consulta"""
+
+    def __init__(self, max_entradas: int = 1024):
+        self.max_entradas = max_entradas
+        self.entradas: OrderedDict[str, Plan] = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+        self._reglas: list[Regla] = []
+
+    def __len__(self) -> int:
+        return len(self.entradas)
+
+    def obtener(self, texto: str, kb: dict, parsear=parsear_consulta) -> Plan:
+        """
+        Plan de la consulta: guardado o analizado ahora con parsear (la CLI pasa el suyo).
+        Lanza los mismos errores que el parser; los errores no se guardan.
+        """
+        self._comprobar_reglas(kb)
+        clave = ' '.join(texto.split())
+        plan = self.entradas.get(clave)
+        if plan is not None:
+            self.entradas.move_to_end(clave)
+            self.aciertos += 1
+            return plan
+
+        self.fallos += 1
+        consulta_str, limite, desplazamiento = parsear_paginacion(clave)
+        consulta, tipo = parsear(consulta_str)
+        plan = Plan(consulta, tipo, limite, desplazamiento)
+        if tipo not in TIPOS_CACHEABLES:
+            return plan
+        if isinstance(consulta, list):
+            plan.orden = planificar(consulta, kb)
+        else:
+            plan.reglas = reglas_candidatas(compilar_patron(consulta), kb)
+        self.entradas[clave] = plan
+        if len(self.entradas) > self.max_entradas:
+            self.entradas.popitem(last=False)
+        return plan
+
+    def limpiar(self) -> None:
+        """Vacía la caché"""
+        self.entradas.clear()
+
+    def _comprobar_reglas(self, kb: dict) -> None:
+        """Si cambian las reglas (también en el sitio) los planes ya no valen"""
+        reglas = kb['reglas']
+        if len(reglas) != len(self._reglas) or any(a is not b for a, b in zip(reglas, self._reglas)):
+            self._reglas = list(reglas)
+            self.limpiar()
@@ -1,27 +1,233 @@
 """Carga de la base de conocimientos"""
+import glob
+import os
+import threading
+import time
+from array import array
+from collections.abc import Iterable
+from contextlib import nullcontext
+from dataclasses import dataclass
+from itertools import islice
 from pathlib import Path
 from sbc.ed import Tripleta, Regla
-from sbc.parser import parsear_tripleta, parsear_regla
+from sbc.parser import parsear_tripleta, parsear_tripleta_rapida, parsear_regla
+from sbc.indice import Indice, indice_kb
+from sbc.diario import registrar_kb
+
+# Hechos por transacción al cargar un fichero de texto en SQLite
+TAMANO_LOTE_SQLITE = 10_000
+
+def leer_lineas(fichero: Path) -> list[str]:
+    """Líneas útiles de un fichero de la KB: sin espacios, vacías ni comentarios ('#')"""
+    if not fichero.exists():
+        return []
+    lineas = (linea.strip() for linea in fichero.read_text(encoding='utf-8').splitlines())
+    return [linea for linea in lineas if linea and not linea.startswith('#')]
+
+def carga_kb(fichero_hechos: Path, fichero_reglas: Path, fichero_sqlite: Path | None = None,
+             n_fragmentos: int | None = None, versionado: bool = False,
+             recargar: bool = True) -> list[Tripleta | Regla]:
+    """
+    Carga la base de conocimiento y retorna un diccionario con hechos y reglas.
+    Si se indica fichero_sqlite los hechos se guardan en ese fichero (ver sbc.almacen_sqlite);
+    se leen del texto y se insertan por lotes, sin tenerlos todos en memoria. Con
+    recargar=False un fichero_sqlite que ya existe se abre tal cual, sin leer fichero_hechos.
+    Si se indica n_fragmentos los hechos se reparten entre procesos (ver sbc.fragmentos).
+    Con versionado los hechos se guardan en un almacén multiversión (ver sbc.versiones).
+    """
+    reglas = [parsear_regla(linea) for linea in leer_lineas(fichero_reglas)]
+
+    if fichero_sqlite is not None:
+        # Importación perezosa: sqlite3 solo se carga si se usa este almacén
+        from sbc.almacen_sqlite import HechosSQLite
+        existia = Path(fichero_sqlite).exists()
+        almacen = HechosSQLite(fichero_sqlite)
+        if (recargar or not existia) and Path(fichero_hechos).exists():
+            pendientes = leer_hechos(Path(fichero_hechos))
+            # Una transacción por lote: la memoria no crece con el tamaño del fichero
+            while lote := list(islice(pendientes, TAMANO_LOTE_SQLITE)):
+                almacen.extend(lote)
+        return {'hechos': almacen, 'reglas': reglas}
+
+    hechos = [parsear_tripleta(linea) for linea in leer_lineas(fichero_hechos)]
+    if n_fragmentos is not None:
+        from sbc.fragmentos import HechosFragmentados
+        almacen = HechosFragmentados(n_fragmentos)
+        almacen.extend(hechos)
+        hechos = almacen
+    elif versionado:
+        from sbc.versiones import HechosVersionados
+        hechos = HechosVersionados(hechos)
+
+    return {'hechos': hechos, 'reglas': reglas}
 
-def carga_kb(fichero_hechos: Path, fichero_reglas: Path) -> list[Tripleta | Regla]:
-    """Carga la base de conocimiento y retorna un diccionario con hechos y reglas"""
-    hechos = []
-    reglas = []
 
-    # Cargar hechos
-    if fichero_hechos.exists():
-        for linea in fichero_hechos.read_text(encoding='utf-8').splitlines():
+# Resultado de parsear un fichero en un proceso trabajador:
+# (ruta, términos distintos, ids de sujeto/predicado/objeto de cada hecho, confianzas, reglas)
+Trozo = tuple[str, list[str], array, array, list[Regla]]
+
+def _parsear_fichero(ruta: str) -> Trozo:
+    """
+    Parsea un fichero de la KB (hechos y reglas mezclados; las reglas llevan '<-').
+    Los hechos se devuelven como ids sobre una tabla local de términos, que se
+    serializa mucho más pequeña que una lista de Tripletas.
+    """
+    ids_terminos: dict[str, int] = {}
+    ids = array('I')
+    confianzas = array('d')
+    reglas = []
+    with open(ruta, encoding='utf-8') as fichero:
+        for numero, linea in enumerate(fichero, start=1):
             linea = linea.strip()
-            # Ignorar lineas que empiezan con '#'
-            if linea and not linea.startswith('#'):
-                hechos.append(parsear_tripleta(linea))
+            if not linea or linea.startswith('#'):
+                continue
+            try:
+                if '<-' in linea:
+                    reglas.append(parsear_regla(linea))
+                    continue
+                hecho = parsear_tripleta_rapida(linea)
+            except Exception as e:
+                raise ValueError(f'{ruta}:{numero}: {e}') from None
+            for termino in hecho:
+                ids.append(ids_terminos.setdefault(termino, len(ids_terminos)))
+            confianzas.append(hecho.confianza)
+    return ruta, list(ids_terminos), ids, confianzas, reglas
+
+def ficheros_kb(origen: Path | str) -> list[Path]:
+    """Ficheros .txt de un directorio (recursivamente) o que casan con un glob, en orden"""
+    if Path(origen).is_dir():
+        return sorted(Path(origen).rglob('*.txt'))
+    return sorted(Path(ruta) for ruta in glob.glob(str(origen), recursive=True) if Path(ruta).is_file())
+
+def carga_directorio(origen: Path | str, n_procesos: int | None = None) -> dict:
+    """
+    Carga una KB repartida en muchos ficheros: un directorio o un glob ('kb/**/*.txt').
+    Los ficheros se parsean en paralelo en un ProcessPoolExecutor y después se unen
+    en un solo paso que comparte los términos repetidos y construye el índice.
+    Con n_procesos=1 (o un solo fichero) se parsea en este proceso.
+    """
+    ficheros = [str(f) for f in ficheros_kb(origen)]
+    if not ficheros:
+        raise ValueError(f'No hay ficheros de la KB en {origen}')
+    n_procesos = min(n_procesos or os.cpu_count() or 1, len(ficheros))
+
+    if n_procesos <= 1:
+        trozos = map(_parsear_fichero, ficheros)
+        return _unir_trozos(trozos)
+    # Importación perezosa: el pool solo se carga si se usa
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=n_procesos) as pool:
+        # Varios ficheros por tarea cuando hay muchos pequeños
+        trozos = pool.map(_parsear_fichero, ficheros, chunksize=max(1, len(ficheros) // (4 * n_procesos)))
+        return _unir_trozos(trozos)
+
+def _unir_trozos(trozos) -> dict:
+    """Une los trozos en el orden de los ficheros: tabla global de términos, hechos, reglas e índice"""
+    terminos: dict[str, str] = {}
+    hechos: list[Tripleta] = []
+    reglas: list[Regla] = []
+    for _, terminos_trozo, ids, confianzas, reglas_trozo in trozos:
+        # Un único objeto str por término en toda la KB
+        locales = [terminos.setdefault(t, t) for t in terminos_trozo]
+        for n, confianza in enumerate(confianzas):
+            i = 3 * n
+            hechos.append(Tripleta(locales[ids[i]], locales[ids[i + 1]], locales[ids[i + 2]], confianza))
+        reglas.extend(reglas_trozo)
 
-    # Cargar reglas
-    if fichero_reglas.exists():
-        for linea in fichero_reglas.read_text(encoding='utf-8').splitlines():
+    indice = Indice(hechos)
+    # Lo reutiliza indice_kb en la primera consulta
+    indice.origen = hechos
+    return {'hechos': hechos, 'reglas': reglas, 'indice': indice}
+
+
+@dataclass
+class Importacion:
+    """Resultado de una importación de hechos"""
+    insertados: list[Tripleta]
+    duplicados: int
+    segundos: float
+
+    def resumen(self) -> str:
+        total = len(self.insertados) + self.duplicados
+        ritmo = f'{total / self.segundos:.0f}' if self.segundos > 0 else '-'
+        return (f'Importados {len(self.insertados)} hechos ({self.duplicados} duplicados) '
+                f'en {self.segundos:.2f} s ({ritmo} hechos/s)')
+
+def leer_hechos(fichero: Path):
+    """Hechos de un fichero con el parser rápido; los errores indican fichero:línea"""
+    with open(fichero, encoding='utf-8') as f:
+        for numero, linea in enumerate(f, start=1):
             linea = linea.strip()
-            # Ignorar lineas que empiezan con '#'
-            if linea and not linea.startswith('#'):
-                reglas.append(parsear_regla(linea))
-    
-    return {'hechos': hechos, 'reglas': reglas}
\ No newline at end of file
+            if not linea or linea.startswith('#'):
+                continue
+            try:
+                yield parsear_tripleta_rapida(linea)
+            except Exception as e:
+                raise ValueError(f'{fichero}:{numero}: {e}') from None
+
+def importar_hechos(kb: dict, hechos: Iterable[Tripleta | tuple]) -> Importacion:
+    """
+    Agrega a la KB los hechos (Tripletas o tuplas (s, p, o[, confianza])) que no estén ya,
+    con el mismo criterio que 'S P O .' (términos y confianza).
+    Los repetidos del lote se descartan con un conjunto y los de la KB con el índice,
+    así que no se recorre kb['hechos'] por cada hecho. Los hechos se agregan de una vez
+    al final (si un hecho falla al parsearse no se agrega ninguno) y el índice se
+    actualiza en un solo paso. Con kb['diario'] el lote se registra en un solo bloque.
+    """
+    inicio = time.perf_counter()
+    # Almacenes versionados: nadie más escribe entre la comprobación y la inserción
+    escritura = getattr(kb['hechos'], 'escritura', nullcontext)
+    with escritura():
+        existentes = indice_kb(kb)
+        vistos = set()
+        nuevos = []
+        duplicados = 0
+        for hecho in hechos:
+            if not isinstance(hecho, Tripleta):
+                hecho = Tripleta(*hecho)
+            clave = (hecho.sujeto, hecho.predicado, hecho.objeto, hecho.confianza)
+            if clave in vistos or hecho in existentes:
+                duplicados += 1
+                continue
+            vistos.add(clave)
+            nuevos.append(hecho)
+        kb['hechos'].extend(nuevos)
+        indice_kb(kb)
+        registrar_kb(kb, nuevos)
+    return Importacion(nuevos, duplicados, time.perf_counter() - inicio)
+
+def importar_fichero(kb: dict, fichero: Path) -> Importacion:
+    """Importa los hechos de un fichero (una tripleta por línea, como ingredientes.txt)"""
+    return importar_hechos(kb, leer_hechos(Path(fichero)))
+
+
+class CargaEnSegundoPlano:
+    """
+    Carga la KB en un hilo para no bloquear el arranque.
+    obtener() espera solo hasta que termine la carga y retorna la KB.
+    """
+
+    def __init__(self, fichero_hechos: Path, fichero_reglas: Path, fichero_sqlite: Path | None = None,
+                 recargar: bool = True):
+        self._kb = None
+        self._error = None
+        self._hilo = threading.Thread(
+            target=self._cargar, args=(fichero_hechos, fichero_reglas, fichero_sqlite, recargar), daemon=True
+        )
+        self._hilo.start()
+
+    def _cargar(self, fichero_hechos, fichero_reglas, fichero_sqlite, recargar) -> None:
+        try:
+            self._kb = carga_kb(fichero_hechos, fichero_reglas, fichero_sqlite, recargar=recargar)
+        except Exception as e:
+            self._error = e
+
+    def terminada(self) -> bool:
+        return not self._hilo.is_alive()
+
+    def obtener(self) -> dict:
+        """Espera a que termine la carga; relanza el error si la carga falló"""
+        self._hilo.join()
+        if self._error is not None:
+            raise self._error
+        return self._kb
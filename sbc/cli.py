@@ -1,8 +1,24 @@
-﻿from pathlib import Path
-from sbc.cargar_kb import carga_kb
-from sbc.parser import parsear_consulta
-from sbc.query import query, descubrir, razonar
+﻿import signal
+import sys
+from contextlib import nullcontext
+from functools import partial
+from pathlib import Path
+from sbc.cargar_kb import CargaEnSegundoPlano, importar_fichero, leer_lineas
+from sbc.indice import indice_kb
+from sbc.parser import parsear_consulta, parsear_paginacion, parsear_regla
+from sbc.query import query, descubrir, razonar, respuestas, contar
+from sbc.limites import Limites, Cancelacion, Presupuesto, recoger
+from sbc.maquina import resolver
+from sbc.conjuntos_magicos import query_magico
 from sbc.ed import Tripleta, es_variable
+from sbc.cache_consultas import CacheConsultas
+from sbc.cache_planes import CachePlanes
+from sbc.grafo import GrafoDependencias
+from sbc.vigilancia import VigilanteKB
+from sbc.materializacion import Materializador
+from sbc.orden_reglas import OrdenReglas
+from sbc.diario import Diario, registrar_kb
+from sbc.versiones import instantanea_kb
 
 def extraer_variables(tripleta: Tripleta) -> list[str]:
     """Extrae todas las variables únicas de una tripleta."""
@@ -12,25 +28,109 @@ def extraer_variables(tripleta: Tripleta) -> list[str]:
             variables.append(termino)
     return variables
 
-def formatear_resultados(consulta_str: str, kb: dict):
-    """Consulta la KB y produce strings formateados como resultado"""
+def formatear_respuesta(tripleta: Tripleta, variables: list[str], valores: tuple[str, ...], confianza: float) -> str:
+    """Formatea una respuesta (valores de las variables) de una consulta"""
+    conf_str = f' [{int(confianza * 100)}%]' if confianza < 1.0 else ''
+    if len(variables) == 1:
+        sujeto, predicado, _ = tripleta.terminos()
+        if sujeto == variables[0]:
+            return f'{valores[0]}{conf_str}'
+        return f'{predicado} = {valores[0]}{conf_str}'
+    return f'{" ".join(valores)}{conf_str}'
 
-    tripleta_usr, tipo = parsear_consulta(consulta_str)
+def formatear_resultados(consulta_str: str, kb: dict, cache: CacheConsultas | None = None,
+                         limites: Limites | None = None, cancelacion: Cancelacion | None = None,
+                         pila: bool = False, planes: CachePlanes | None = None, magico: bool = False):
+    """
+    Consulta la KB y produce strings formateados como resultado.
+    Si se pasa una cache se reutilizan los resultados de consultas repetidas.
+    Las consultas admiten paginación: 'S P O ? limit N offset M'.
+    Con limites (los de la sesión, que cambia el comando 'limites') o cancelacion la
+    evaluación se corta al agotarlos y se muestran los resultados parciales.
+    Con pila las consultas usan el motor iterativo de sbc.maquina.
+    Con planes las consultas repetidas no se vuelven a analizar ni a planificar.
+    Con magico (y sin pila) las tripletas se evalúan hacia delante con conjuntos mágicos.
+    """
+
+    if planes is not None:
+        plan = planes.obtener(consulta_str, kb, parsear_consulta)
+        tripleta_usr, tipo, limite, desplazamiento = plan.consulta, plan.tipo, plan.limite, plan.desplazamiento
+    else:
+        plan = None
+        consulta_str, limite, desplazamiento = parsear_paginacion(consulta_str)
+        tripleta_usr, tipo = parsear_consulta(consulta_str)
+    paginada = limite is not None or desplazamiento > 0
+    presupuesto = None
+    if (limites is not None and limites.activos()) or cancelacion is not None:
+        presupuesto = Presupuesto(limites, cancelacion)
+    # Sin presupuesto ni pila el motor se llama igual que siempre
+    opciones = {}
+    if presupuesto is not None:
+        opciones['presupuesto'] = presupuesto
+    if pila:
+        opciones['pila'] = True
+    # Reglas candidatas y orden de la conjunción guardados en el plan
+    opciones_plan = {}
+    if plan is not None and plan.reglas is not None and not pila:
+        opciones_plan['reglas'] = plan.reglas
+    if plan is not None and plan.orden is not None:
+        opciones_plan['plan'] = plan.orden
+    # Solo se pasa si se pide: los motores se siguen llamando igual que siempre
+    opciones_magico = {'magico': True} if magico and not pila else {}
 
     # Si es hecho, agregar a la KB
     if tipo == 'hecho':
         sujeto_usr, predicado_usr, objeto_usr = tripleta_usr.terminos()
-        if tripleta_usr not in kb['hechos']:
-            kb['hechos'].append(tripleta_usr)
+        # Almacenes versionados: nadie más escribe entre la comprobación y la inserción
+        escritura = getattr(kb['hechos'], 'escritura', nullcontext)
+        with escritura():
+            # El índice evita recorrer todos los hechos
+            nuevo = tripleta_usr not in indice_kb(kb)
+            if nuevo:
+                kb['hechos'].append(tripleta_usr)
+                registrar_kb(kb, [tripleta_usr])
+        if nuevo:
+            if cache is not None:
+                cache.invalidar(predicado_usr)
             yield f'Hecho agregado: {sujeto_usr} {predicado_usr} {objeto_usr}'
         else:
             yield f'Ya existe el hecho: {sujeto_usr} {predicado_usr} {objeto_usr}'
+    elif tipo == 'importar':
+        importacion = importar_fichero(kb, tripleta_usr)
+        if cache is not None:
+            for predicado in {hecho.predicado for hecho in importacion.insertados}:
+                cache.invalidar(predicado)
+        yield importacion.resumen()
     elif tipo == 'razonar':
-        resultado = razonar(tripleta_usr, kb)
+        resultado = razonar(tripleta_usr, kb, **opciones, **opciones_plan, **opciones_magico)
         yield 'SI' if resultado else 'NO'
+    elif tipo == 'consulta' and paginada and extraer_variables(tripleta_usr):
+        # Consulta paginada: el motor deja de buscar en cuanto tiene las respuestas pedidas
+        variables = extraer_variables(tripleta_usr)
+        for valores, confianza in respuestas(tripleta_usr, kb, limite, desplazamiento, presupuesto, pila,
+                                             **opciones_plan, **opciones_magico):
+            yield formatear_respuesta(tripleta_usr, variables, valores, confianza)
     elif tipo == 'consulta':
         # Si es consulta, procesar normalmente
-        resultados = list(query(tripleta_usr, kb))
+        resultados = cache.obtener(tripleta_usr, kb) if cache is not None else None
+        if resultados is None:
+            motor = query
+            if pila:
+                # Solo las variables de la consulta: el coste por respuesta no depende de la profundidad
+                motor = partial(resolver, variables=extraer_variables(tripleta_usr))
+            if opciones_magico:
+                # Las reglas candidatas del plan no aplican: se evalúa hacia delante
+                motor, opciones_plan = query_magico, {}
+            # Almacenes versionados: toda la consulta lee la misma versión
+            lectura = instantanea_kb(kb)
+            if presupuesto is None:
+                resultados = list(motor(tripleta_usr, lectura, **opciones_plan))
+            else:
+                resultados = recoger(motor(tripleta_usr, lectura, presupuesto, **opciones_plan), presupuesto,
+                                     extraer_variables(tripleta_usr))
+            # Un resultado truncado no es la respuesta completa: no se guarda
+            if cache is not None and (presupuesto is None or presupuesto.truncado is None):
+                cache.guardar(tripleta_usr, resultados, kb)
         variables = extraer_variables(tripleta_usr)
 
         # No existen variables -> SI/NO con confianza
@@ -59,12 +159,7 @@ def formatear_resultados(consulta_str: str, kb: dict):
                 
                 # Yield de los resultados únicos
                 for valor, confianza in valores_dict.items():
-                    sujeto_usr, predicado_usr, _ = tripleta_usr.terminos()
-                    conf_str = f' [{int(confianza * 100)}%]' if confianza < 1.0 else ''
-                    if sujeto_usr == var:
-                        yield f'{valor}{conf_str}'
-                    else:
-                        yield f'{predicado_usr} = {valor}{conf_str}'
+                    yield formatear_respuesta(tripleta_usr, variables, (valor,), confianza)
             else:
                 valores_dict = {}
                 for ss, confianza in resultados:
@@ -74,10 +169,31 @@ def formatear_resultados(consulta_str: str, kb: dict):
                         valores_dict[valores] = confianza
                 # yield resultados
                 for valores, confianza in valores_dict.items():
-                    conf_str = f' [{int(confianza * 100)}%]' if confianza < 1.0 else ''
-                    yield f'{" ".join(valores)}{conf_str}'
+                    yield formatear_respuesta(tripleta_usr, variables, valores, confianza)
+    elif tipo == 'conjuncion':
+        # Consulta conjuntiva: se planifica el orden de los antecedentes y se une de una vez
+        variables = list(dict.fromkeys(v for t in tripleta_usr for v in extraer_variables(t)))
+        encontradas = respuestas(tripleta_usr, kb, limite, desplazamiento, presupuesto, pila, **opciones_plan)
+        if not variables:
+            if encontradas:
+                confianza = encontradas[0][1]
+                yield f'SI (confianza: {int(confianza * 100)}%)' if confianza < 1.0 else 'SI'
+            else:
+                yield 'NO'
+        else:
+            for valores, confianza in encontradas:
+                conf_str = f' [{int(confianza * 100)}%]' if confianza < 1.0 else ''
+                yield f'{" ".join(valores)}{conf_str}'
+    elif tipo == 'cuantos':
+        if paginada:
+            raise ValueError('limit y offset no se pueden usar con cuantos')
+        # Solo el número: no se construyen las respuestas
+        yield str(contar(tripleta_usr, kb, presupuesto, **opciones_plan))
     elif tipo == 'descubrir':
-        nuevos_hechos = descubrir(kb)
+        nuevos_hechos = descubrir(kb) if presupuesto is None else descubrir(kb, presupuesto)
+        if cache is not None:
+            for predicado in {hecho.predicado for hecho in nuevos_hechos}:
+                cache.invalidar(predicado)
         if nuevos_hechos:
             yield(f'Se descubrieron {len(nuevos_hechos)} nuevos hechos:')
             for hecho in nuevos_hechos:
@@ -86,6 +202,27 @@ def formatear_resultados(consulta_str: str, kb: dict):
                 yield(f'  {hecho_sujeto} {hecho_predicado} {hecho_objeto} {conf_str}')
         else:
             yield('No se descubrieron nuevos hechos')
+    elif tipo == 'grafo':
+        # Estratos en el orden en que los evalúa 'descubrir!'
+        lineas = GrafoDependencias(kb['reglas']).describir()
+        yield from lineas if lineas else ['No hay reglas']
+    elif tipo == 'materializacion':
+        materializacion = kb.get('materializacion')
+        if materializacion is None:
+            yield 'Materialización desactivada (usa --materializar)'
+        else:
+            lineas = materializacion.estado()
+            yield from lineas if lineas else ['No se ha consultado ningún predicado derivado']
+            yield f'Hechos materializados: {materializacion.hechos()} de {materializacion.max_hechos}'
+    elif tipo == 'limites':
+        if limites is None:
+            raise ValueError('Los límites solo se pueden cambiar en una sesión de la CLI')
+        for campo, valor in tripleta_usr.items():
+            setattr(limites, campo, valor)
+        yield f'Límites: {limites.describir()}'
+
+    if presupuesto is not None and presupuesto.truncado is not None:
+        yield f'(resultados truncados: {presupuesto.truncado})'
                 
 
 
@@ -94,8 +231,31 @@ if __name__ == '__main__':
     kb_dir = Path('kb')
     fichero_hechos = kb_dir / "ingredientes.txt"
     fichero_reglas = kb_dir / "reglas.txt"
+    # --vigilar: recargar los ficheros de la KB cuando cambian
+    vigilar = '--vigilar' in sys.argv[1:]
+    # --pila: motor iterativo (sin límite de recursión en derivaciones profundas)
+    pila = '--pila' in sys.argv[1:]
+    # --materializar: guardar en tablas los predicados derivados más consultados (sbc.materializacion)
+    materializar = '--materializar' in sys.argv[1:]
+    # --orden-fijo: razonar prueba las reglas en el orden del fichero en vez del adaptativo (sbc.orden_reglas)
+    orden_fijo = '--orden-fijo' in sys.argv[1:]
+    # --magico: evaluar las consultas hacia delante con conjuntos mágicos (sbc.conjuntos_magicos)
+    magico = '--magico' in sys.argv[1:]
+    # --diario: guardar los hechos nuevos en kb/diario (sbc.diario) y recuperarlos al arrancar
+    diario = Diario(kb_dir / 'diario') if '--diario' in sys.argv[1:] else None
 
-    kb = carga_kb(fichero_hechos=fichero_hechos, fichero_reglas=fichero_reglas)
+    kb_recuperada = None
+    if diario is not None:
+        kb_recuperada = diario.recuperar([parsear_regla(linea) for linea in leer_lineas(fichero_reglas)])
+    # El prompt aparece enseguida; la primera consulta espera a que termine la carga
+    carga = None if kb_recuperada is not None else CargaEnSegundoPlano(fichero_hechos=fichero_hechos,
+                                                                       fichero_reglas=fichero_reglas)
+    cache = CacheConsultas(max_entradas=1024, max_respuestas=100_000)
+    planes = CachePlanes(max_entradas=1024)
+    # Límites de la sesión (comando 'limites') y Ctrl-C para cancelar la consulta en curso
+    limites = Limites()
+    cancelacion = Cancelacion()
+    vigilante = None
     continuando = True
     while continuando:
         try:
@@ -105,9 +265,40 @@ if __name__ == '__main__':
                 print('Hasta luego!!!')
                 continuando = False
             else:
-                for res in formatear_resultados(usr_input, kb):
-                    print(res)
+                kb = kb_recuperada if carga is None else carga.obtener()
+                if diario is not None and 'diario' not in kb:
+                    if carga is not None:
+                        # Primera sesión con diario: la KB de los ficheros es el primer punto de control
+                        diario.punto_de_control(kb)
+                    kb['diario'] = diario
+                if materializar and 'materializacion' not in kb:
+                    kb['materializacion'] = Materializador()
+                if not orden_fijo and 'orden_reglas' not in kb:
+                    kb['orden_reglas'] = OrdenReglas()
+                if vigilar:
+                    if vigilante is None:
+                        vigilante = VigilanteKB(kb, fichero_hechos, fichero_reglas)
+                    cambios = vigilante.comprobar()
+                    if cambios is not None:
+                        print(cambios.resumen())
+                        if diario is not None:
+                            # El diario solo registra altas: las bajas quedan en un punto de control
+                            diario.punto_de_control(kb)
+                        if cambios.reglas_agregadas or cambios.reglas_eliminadas:
+                            cache.limpiar()
+                        for predicado in cambios.predicados():
+                            cache.invalidar(predicado)
+                cancelacion.reiniciar()
+                anterior = signal.signal(signal.SIGINT, lambda *_: cancelacion.cancelar())
+                try:
+                    for res in formatear_resultados(usr_input, kb, cache, limites, cancelacion, pila, planes,
+                                                    magico):
+                        print(res)
+                finally:
+                    signal.signal(signal.SIGINT, anterior)
                 print()
         except Exception as e:
             print(f'Error: {e}')
             print()
+    if diario is not None:
+        diario.cerrar()
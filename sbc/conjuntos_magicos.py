@@ -0,0 +1,203 @@
+"""
+Reescritura por conjuntos mágicos (magic sets) de las reglas de la KB.
+
+Para una consulta como 'paella alergeno X ?' se adornan las reglas con el patrón
+de ligaduras de la consulta (b = ligado, f = libre, por sujeto/predicado/objeto)
+y se añade a cada regla una guarda mágica. La evaluación es hacia delante
+(bottom-up) pero solo dispara reglas para las metas demandadas por la consulta,
+así que no se calcula el cierre completo de la KB.
+Se usa desde sbc.query.respuestas/razonar con magico=True y desde la CLI con --magico.
+"""
+from dataclasses import dataclass
+from sbc.ed import Tripleta, Regla, Sustitucion, es_literal, es_variable
+from sbc.indice import Indice, indice_kb
+from sbc.limites import Presupuesto
+from sbc.unificar import compilar_patron, unificar_hecho
+
+@dataclass
+class ReglaAdornada:
+    """Copia de una regla especializada para un adorno de su consecuente"""
+    regla: Regla
+    # Predicado adornado del consecuente: (predicado o None si es variable, adorno)
+    clave: tuple[str | None, str]
+    # Adorno de cada antecedente según el orden izquierda -> derecha (SIPS)
+    adornos_antecedentes: list[str]
+    # Si el antecedente puede unificar con algún consecuente (genera demanda)
+    derivables: list[bool]
+
+
+def adornar(tripleta: Tripleta, ligadas: set[str]) -> str:
+    """Calcula el adorno de una tripleta: 'b' si la posición está ligada, 'f' si no"""
+    return ''.join('b' if es_literal(t) or t in ligadas else 'f' for t in tripleta)
+
+
+def valores_ligados(tripleta: Tripleta, adorno: str) -> tuple[str, ...]:
+    """Valores de las posiciones ligadas de una tripleta (la tupla mágica)"""
+    return tuple(t for t, a in zip(tripleta, adorno) if a == 'b')
+
+
+def puede_unificar(x: Tripleta, y: Tripleta) -> bool:
+    """Comprobación estructural (sin sustituciones) de si dos tripletas podrían unificar"""
+    return all(a == b or es_variable(a) or es_variable(b) for a, b in zip(x, y))
+
+
+def clave_magica(tripleta: Tripleta, adorno: str) -> tuple[str | None, str]:
+    """Predicado adornado: (predicado si es literal, adorno)"""
+    predicado = tripleta.predicado if es_literal(tripleta.predicado) else None
+    return predicado, adorno
+
+
+def reescribir(reglas: list[Regla], clave_consulta: tuple[str | None, str]) -> list[ReglaAdornada]:
+    """
+    Genera las reglas adornadas alcanzables desde el predicado adornado de la consulta.
+    Cada predicado adornado nuevo que aparece en un antecedente derivable se procesa a su vez.
+    """
+    # Consecuentes agrupados por predicado (None si el predicado es variable)
+    consecuentes: dict[str | None, list[Tripleta]] = {}
+    for regla in reglas:
+        consecuente = regla.get_consecuente()
+        consecuentes.setdefault(clave_magica(consecuente, '')[0], []).append(consecuente)
+
+    def derivable(antecedente: Tripleta) -> bool:
+        predicado = clave_magica(antecedente, '')[0]
+        posibles = consecuentes.get(None, [])
+        if predicado is None:
+            posibles = [c for grupo in consecuentes.values() for c in grupo]
+        elif predicado in consecuentes:
+            posibles = posibles + consecuentes[predicado]
+        return any(puede_unificar(antecedente, c) for c in posibles)
+
+    # Qué antecedentes pueden unificar con algún consecuente (no depende del adorno)
+    derivables = [[derivable(a) for a in regla.get_antecedentes()] for regla in reglas]
+
+    adornadas = []
+    pendientes = [clave_consulta]
+    vistos = {clave_consulta}
+
+    while pendientes:
+        predicado, adorno = pendientes.pop()
+        for regla, derivables_regla in zip(reglas, derivables):
+            consecuente = regla.get_consecuente()
+            if predicado is not None and es_literal(consecuente.predicado) and consecuente.predicado != predicado:
+                continue
+            ligadas = {t for t, a in zip(consecuente, adorno) if a == 'b' and es_variable(t)}
+            adornos_antecedentes = []
+            for antecedente, derivable in zip(regla.get_antecedentes(), derivables_regla):
+                adorno_ant = adornar(antecedente, ligadas)
+                adornos_antecedentes.append(adorno_ant)
+                clave = clave_magica(antecedente, adorno_ant)
+                if derivable and clave not in vistos:
+                    vistos.add(clave)
+                    pendientes.append(clave)
+                # Tras evaluar el antecedente todas sus variables quedan ligadas
+                ligadas.update(t for t in antecedente if es_variable(t))
+            adornadas.append(ReglaAdornada(regla, (predicado, adorno), adornos_antecedentes, derivables_regla))
+
+    return adornadas
+
+
+class EvaluadorMagico:
+    """Evaluación bottom-up de las reglas adornadas con guardas mágicas"""
+
+    def __init__(self, kb: dict, tripleta: Tripleta, presupuesto: Presupuesto | None = None):
+        # Los hechos base se buscan en el índice de la KB (no se copian en cada consulta)
+        self.base = indice_kb(kb)
+        self.presupuesto = presupuesto
+        self.derivados = Indice()
+        # (sujeto, predicado, objeto) -> hecho derivado (con la confianza máxima)
+        self.confianzas: dict[tuple[str, str, str], Tripleta] = {}
+        adorno = adornar(tripleta, set())
+        clave = clave_magica(tripleta, adorno)
+        self.reglas = reescribir(kb['reglas'], clave)
+        # Conjuntos mágicos: predicado adornado -> tuplas de valores demandados
+        self.magia: dict[tuple[str | None, str], set[tuple[str, ...]]] = {ra.clave: set() for ra in self.reglas}
+        self.magia.setdefault(clave, set()).add(valores_ligados(tripleta, adorno))
+        self.cambios = False
+
+    def evaluar(self) -> None:
+        """Aplica las reglas adornadas hasta alcanzar el punto fijo"""
+        self.cambios = True
+        while self.cambios:
+            self.cambios = False
+            for ra in self.reglas:
+                for valores in list(self.magia[ra.clave]):
+                    ss = self._ligar_consecuente(ra, valores)
+                    if ss is None:
+                        continue
+                    for ss_cuerpo, confianza in self._antecedentes(ra, 0, ss):
+                        nuevo = ra.regla.get_consecuente().aplicar_sustitucion(ss_cuerpo)
+                        self._derivar(nuevo, min(ra.regla.confianza, confianza))
+
+    def hechos(self, tripleta: Tripleta) -> list[Tripleta]:
+        """Hechos base y derivados candidatos para una tripleta"""
+        patron = compilar_patron(tripleta)
+        return list(self.base.buscar(patron)) + self.derivados.buscar(patron)
+
+    def _ligar_consecuente(self, ra: ReglaAdornada, valores: tuple[str, ...]) -> Sustitucion | None:
+        """Guarda mágica: liga las posiciones 'b' del consecuente con la tupla demandada"""
+        mappings = {}
+        ligadas = (t for t, a in zip(ra.regla.get_consecuente(), ra.clave[1]) if a == 'b')
+        for termino, valor in zip(ligadas, valores):
+            if es_variable(termino):
+                termino = mappings.setdefault(termino, valor)
+            if termino != valor:
+                return None
+        return Sustitucion(mappings)
+
+    def _antecedentes(self, ra: ReglaAdornada, i: int, ss: Sustitucion):
+        """Une los antecedentes desde el i-ésimo produciendo sustitución y confianza mínima"""
+        antecedentes = ra.regla.get_antecedentes()
+        if i == len(antecedentes):
+            yield ss, 1.0
+            return
+
+        antecedente = antecedentes[i].aplicar_sustitucion(ss)
+        # Propagar la demanda antes de consultar el antecedente
+        if ra.derivables[i]:
+            adorno = ra.adornos_antecedentes[i]
+            valores = valores_ligados(antecedente, adorno)
+            demandados = self.magia.setdefault(clave_magica(antecedentes[i], adorno), set())
+            if valores not in demandados:
+                demandados.add(valores)
+                self.cambios = True
+
+        patron = compilar_patron(antecedente)
+        for hecho in self.hechos(antecedente):
+            if self.presupuesto is not None:
+                self.presupuesto.paso()
+            ss_hecho = unificar_hecho(patron, hecho)
+            if ss_hecho is None:
+                continue
+            merged = Sustitucion(ss.get_mappings().copy())
+            merged.get_mappings().update(ss_hecho.get_mappings())
+            for ss_resto, confianza in self._antecedentes(ra, i + 1, merged):
+                yield ss_resto, min(hecho.confianza, confianza)
+
+    def _derivar(self, hecho: Tripleta, confianza: float) -> None:
+        """Guarda un hecho derivado quedándose con la confianza máxima (OR)"""
+        clave = (hecho.sujeto, hecho.predicado, hecho.objeto)
+        existente = self.confianzas.get(clave)
+        if existente is None:
+            hecho.confianza = confianza
+            self.confianzas[clave] = hecho
+            self.derivados.agregar(hecho)
+            self.cambios = True
+        elif confianza > existente.confianza:
+            existente.confianza = confianza
+            self.cambios = True
+
+
+def query_magico(tripleta: Tripleta, kb: dict, presupuesto: Presupuesto | None = None):
+    """
+    Responde una consulta evaluando hacia delante solo los hechos relevantes.
+    Produce una sustitución y confianza por cada hecho (base o derivado) que la satisface.
+    Con presupuesto cada hecho candidato de un join cuenta como un paso; puede lanzar LimiteAlcanzado.
+    """
+    evaluador = EvaluadorMagico(kb, tripleta, presupuesto)
+    evaluador.evaluar()
+
+    patron = compilar_patron(tripleta)
+    for hecho in evaluador.hechos(tripleta):
+        ss = unificar_hecho(patron, hecho)
+        if ss is not None:
+            yield ss, hecho.confianza
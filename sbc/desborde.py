@@ -0,0 +1,87 @@
+"""
+Lotes de hechos derivados con memoria acotada.
+
+En cada ronda el evaluador (ver sbc.evaluador) junta los consecuentes encontrados
+en un lote clave -> confianza máxima antes de incorporarlos al estado. Con reglas
+que combinan todo con todo (p.ej. combina_bien) el lote puede ser enorme.
+LoteDesbordable guarda como mucho max_claves en memoria: al llegar al límite las
+vuelca ordenadas a un fichero temporal (un tramo) y empieza de nuevo. Al leerlo
+se mezclan los tramos ordenados (mezcla externa) y se queda una entrada por
+clave con la confianza máxima (OR), igual que el lote en memoria.
+Acota los consecuentes pendientes de una ronda, no el conjunto de hechos derivados:
+una vez incorporados viven en el estado del evaluador y en la KB.
+"""
+import heapq
+import tempfile
+from itertools import groupby
+from operator import itemgetter
+
+Terminos = tuple[str, str, str]
+
+# Con más tramos abiertos se mezclan en uno solo (acota los ficheros abiertos)
+MAX_TRAMOS = 64
+
+
+def _leer_tramo(fichero):
+    """(clave, confianza) de un tramo volcado, en orden"""
+    fichero.seek(0)
+    for linea in fichero:
+        sujeto, predicado, objeto, confianza = linea.rstrip('\n').split('\t')
+        yield (sujeto, predicado, objeto), float(confianza)
+
+
+def _mezclar(fuentes):
+    """Mezcla fuentes ordenadas de (clave, confianza) con una sola salida por clave (confianza máxima)"""
+    for clave, grupo in groupby(heapq.merge(*fuentes), key=itemgetter(0)):
+        yield clave, max(confianza for _, confianza in grupo)
+
+
+class LoteDesbordable:
+    """Lote clave -> confianza máxima con como mucho max_claves en memoria; el resto en disco"""
+
+    def __init__(self, max_claves: int, directorio: str | None = None):
+        if max_claves <= 0:
+            raise ValueError('max_claves debe ser un número positivo')
+        self.max_claves = max_claves
+        self.directorio = directorio
+        self.memoria: dict[Terminos, float] = {}
+        # Ficheros temporales con tramos ordenados por clave (se borran al cerrarlos)
+        self.tramos: list = []
+        self.volcadas = 0
+
+    def get(self, clave: Terminos, defecto: float | None = None) -> float | None:
+        """Confianza de la clave en memoria (las volcadas se combinan al leer con items)"""
+        return self.memoria.get(clave, defecto)
+
+    def __setitem__(self, clave: Terminos, confianza: float) -> None:
+        self.memoria[clave] = confianza
+        if len(self.memoria) >= self.max_claves:
+            self.volcadas += len(self.memoria)
+            self._volcar(sorted(self.memoria.items()))
+            self.memoria = {}
+
+    def _volcar(self, ordenados) -> None:
+        fichero = tempfile.TemporaryFile('w+', encoding='utf-8', dir=self.directorio)
+        for (sujeto, predicado, objeto), confianza in ordenados:
+            # repr: el float se vuelve a leer exactamente igual
+            fichero.write(f'{sujeto}\t{predicado}\t{objeto}\t{confianza!r}\n')
+        self.tramos.append(fichero)
+        if len(self.tramos) > MAX_TRAMOS:
+            anteriores, self.tramos = self.tramos, []
+            self._volcar(_mezclar([_leer_tramo(f) for f in anteriores]))
+            for tramo in anteriores:
+                tramo.close()
+
+    def items(self):
+        """(clave, confianza máxima) una vez por clave; ordenado por clave si se ha volcado algo"""
+        if not self.tramos:
+            return self.memoria.items()
+        fuentes = [_leer_tramo(f) for f in self.tramos] + [sorted(self.memoria.items())]
+        return _mezclar(fuentes)
+
+    def cerrar(self) -> None:
+        """Borra los tramos del disco"""
+        for tramo in self.tramos:
+            tramo.close()
+        self.tramos = []
+        self.memoria = {}
@@ -0,0 +1,314 @@
+"""
+Diario de escritura anticipada (WAL) y puntos de control de los hechos de la KB.
+
+Los hechos agregados con 'S P O .', 'importar' o 'descubrir!' solo existen en la
+KB en memoria. Con kb['diario'] cada lote de hechos se añade a un fichero binario
+(diario.bin) antes de seguir, y de vez en cuando se escribe la KB entera a un
+punto de control (control.bin). Al arrancar, recuperar() lee punto de control +
+diario en lugar de volver a parsear los ficheros y repetir 'descubrir'.
+
+Formato (enteros little-endian):
+    - cabecera: 'SBCD', versión y generación (la del punto de control al que sigue el diario)
+    - bloques: longitud, crc32 y registros; un bloque se escribe entero o se descarta
+      al recuperar (un bloque cortado por una caída se ignora y se trunca)
+    - registros: 'T' define el siguiente término del fichero (los hechos usan su número),
+      'H' un hecho (derivado o no, ids de sus términos y confianza) y 'M' cuántos hechos
+      ha cerrado el evaluador con unas reglas (permite restaurarlo sin volver a derivar)
+Escritura en grupo: cada bloque se escribe al momento, pero fsync solo se llama
+cada 'grupo' hechos o 'intervalo' segundos; ante un corte de luz se pueden perder
+los hechos del último grupo sin sincronizar (nunca uno a medias).
+Solo para kb['hechos'] en memoria: SQLite ya guarda los hechos en disco.
+"""
+import hashlib
+import os
+import struct
+import time
+import zlib
+from pathlib import Path
+from sbc.ed import Tripleta, Regla
+from sbc.evaluador import EvaluadorEstratificado
+
+MAGICO = b'SBCD'
+VERSION = 1
+CABECERA = struct.Struct('<4sBQ')
+BLOQUE = struct.Struct('<II')
+TERMINO = struct.Struct('<H')
+HECHO = struct.Struct('<BIIId')
+MARCA = struct.Struct('<Q32s')
+# Hechos por bloque en los puntos de control
+HECHOS_POR_BLOQUE = 65536
+
+# Hechos en el diario a partir de los que registrar() escribe un punto de control
+CADA = 100_000
+
+
+def huella(reglas: list[Regla]) -> bytes:
+    """Resumen de las reglas: el evaluador solo se restaura con las mismas reglas"""
+    return hashlib.sha256(repr(reglas).encode('utf-8')).digest()
+
+
+class Codificador:
+    """Registros de un fichero: cada término se escribe una vez y luego por su número"""
+
+    def __init__(self):
+        self.ids: dict[str, int] = {}
+
+    def _id(self, termino: str, salida: bytearray) -> int:
+        ident = self.ids.get(termino)
+        if ident is None:
+            ident = self.ids[termino] = len(self.ids)
+            datos = termino.encode('utf-8')
+            salida += b'T' + TERMINO.pack(len(datos)) + datos
+        return ident
+
+    def hecho(self, hecho: Tripleta, derivado: bool, salida: bytearray) -> None:
+        ids = [self._id(t, salida) for t in (hecho.sujeto, hecho.predicado, hecho.objeto)]
+        salida += b'H' + HECHO.pack(derivado, *ids, hecho.confianza)
+
+    def marca(self, vistos: int, reglas: list[Regla], salida: bytearray) -> None:
+        salida += b'M' + MARCA.pack(vistos, huella(reglas))
+
+
+def escribir_bloque(fichero, registros: bytes) -> None:
+    fichero.write(BLOQUE.pack(len(registros), zlib.crc32(registros)) + registros)
+
+
+def leer_fichero(ruta: Path):
+    """
+    Lee un fichero del diario o de control. Retorna (generación, registros, bytes válidos, términos):
+    registros es una lista de ('H', Tripleta, derivado) y ('M', vistos, huella) de los bloques enteros.
+    """
+    datos = ruta.read_bytes()
+    if len(datos) < CABECERA.size:
+        return None, [], 0, []
+    magico, version, generacion = CABECERA.unpack_from(datos)
+    if magico != MAGICO or version != VERSION:
+        raise ValueError(f'{ruta}: no es un fichero del diario')
+    registros = []
+    terminos: list[str] = []
+    posicion = CABECERA.size
+    while posicion + BLOQUE.size <= len(datos):
+        longitud, crc = BLOQUE.unpack_from(datos, posicion)
+        inicio = posicion + BLOQUE.size
+        bloque = datos[inicio:inicio + longitud]
+        if len(bloque) < longitud or zlib.crc32(bloque) != crc:
+            break
+        _decodificar(bloque, terminos, registros)
+        posicion = inicio + longitud
+    return generacion, registros, posicion, terminos
+
+
+def _decodificar(bloque: bytes, terminos: list[str], registros: list) -> None:
+    i = 0
+    while i < len(bloque):
+        tipo = bloque[i:i + 1]
+        i += 1
+        if tipo == b'T':
+            (longitud,) = TERMINO.unpack_from(bloque, i)
+            i += TERMINO.size
+            terminos.append(bloque[i:i + longitud].decode('utf-8'))
+            i += longitud
+        elif tipo == b'H':
+            derivado, s, p, o, confianza = HECHO.unpack_from(bloque, i)
+            i += HECHO.size
+            registros.append(('H', Tripleta(terminos[s], terminos[p], terminos[o], confianza), bool(derivado)))
+        elif tipo == b'M':
+            vistos, resumen = MARCA.unpack_from(bloque, i)
+            i += MARCA.size
+            registros.append(('M', vistos, resumen))
+        else:
+            raise ValueError(f'Registro desconocido en el diario: {tipo!r}')
+
+
+def _sincronizar_directorio(directorio: Path) -> None:
+    """fsync del directorio para que un rename sobreviva a un corte (no existe en Windows)"""
+    if hasattr(os, 'O_DIRECTORY'):
+        descriptor = os.open(directorio, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+
+def evaluador_vigente(kb: dict) -> EvaluadorEstratificado | None:
+    """Evaluador de la KB si su estado corresponde a los hechos actuales"""
+    evaluador = kb.get('evaluador')
+    if evaluador is None or evaluador.origen is not kb['hechos']:
+        return None
+    return evaluador
+
+
+class Diario:
+    """Diario y puntos de control de los hechos de una KB en un directorio"""
+
+    def __init__(self, directorio: Path | str, grupo: int = 1, intervalo: float | None = None, cada: int = CADA):
+        self.directorio = Path(directorio)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self.ruta_diario = self.directorio / 'diario.bin'
+        self.ruta_control = self.directorio / 'control.bin'
+        self.grupo = grupo
+        self.intervalo = intervalo
+        self.cada = cada
+        self.generacion = 0
+        # Hechos en el diario desde el último punto de control y hechos escritos sin fsync
+        self.registros = 0
+        self.sin_sincronizar = 0
+        self._fichero = None
+        self._codificador = Codificador()
+        self._ultima_sincronizacion = time.monotonic()
+
+    # Recuperación
+
+    def _leer(self) -> tuple[list[tuple], int]:
+        """
+        Lee punto de control y diario y deja el diario listo para seguir añadiendo
+        (sin el bloque final cortado, si lo hay). Retorna (registros, bytes válidos del diario).
+        """
+        registros = []
+        if self.ruta_control.exists():
+            generacion, registros, _, _ = leer_fichero(self.ruta_control)
+            if generacion is None:
+                raise ValueError(f'{self.ruta_control}: punto de control incompleto')
+            self.generacion = generacion
+        validos = 0
+        if self.ruta_diario.exists():
+            generacion, del_diario, validos, terminos = leer_fichero(self.ruta_diario)
+            if generacion not in (None, 0) and not self.ruta_control.exists():
+                raise ValueError(f'Falta {self.ruta_control}: el diario no se puede recuperar solo')
+            # Un diario de una generación anterior ya está dentro del punto de control
+            if generacion == self.generacion:
+                registros += del_diario
+                self.registros = sum(1 for r in del_diario if r[0] == 'H')
+                self._codificador.ids = {t: i for i, t in enumerate(terminos)}
+            else:
+                validos = 0
+        return registros, validos
+
+    def recuperar(self, reglas: list[Regla]) -> dict | None:
+        """
+        KB con los hechos del punto de control y del diario (None si no hay nada guardado).
+        Si el último 'descubrir' registrado usó las mismas reglas se restaura también
+        kb['evaluador'], así que el siguiente 'descubrir' solo trabaja con lo nuevo.
+        """
+        if not self.ruta_control.exists() and not self.ruta_diario.exists():
+            return None
+        registros, validos = self._leer()
+        self._abrir(validos)
+
+        hechos: list[Tripleta] = []
+        derivados: list[bool] = []
+        marca = None
+        for registro in registros:
+            if registro[0] == 'H':
+                hechos.append(registro[1])
+                derivados.append(registro[2])
+            else:
+                marca = registro[1:]
+        kb = {'hechos': hechos, 'reglas': reglas}
+        if marca is not None:
+            vistos, resumen = marca
+            if resumen == huella(reglas) and vistos <= len(hechos):
+                evaluador = kb['evaluador'] = EvaluadorEstratificado(reglas)
+                evaluador.restaurar(kb, vistos, derivados)
+        return kb
+
+    # Escritura
+
+    def _abrir(self, validos: int = 0) -> None:
+        """Abre el diario para añadir; si no tiene bloques válidos se empieza con la cabecera"""
+        if validos:
+            self._fichero = open(self.ruta_diario, 'r+b')
+            self._fichero.truncate(validos)
+            self._fichero.seek(validos)
+            return
+        self._codificador = Codificador()
+        self.registros = 0
+        self._fichero = open(self.ruta_diario, 'wb')
+        self._fichero.write(CABECERA.pack(MAGICO, VERSION, self.generacion))
+        self._fichero.flush()
+        os.fsync(self._fichero.fileno())
+
+    def registrar(self, kb: dict, hechos: list[Tripleta], derivados: bool = False) -> None:
+        """
+        Añade un lote de hechos (ya agregados a la KB) al diario en un solo bloque.
+        Con derivados (los publicados por 'descubrir') se anota también hasta dónde
+        ha cerrado el evaluador la KB.
+        """
+        if self._fichero is None:
+            self._abrir(self._leer()[1])
+        registros = bytearray()
+        for hecho in hechos:
+            self._codificador.hecho(hecho, derivados, registros)
+        evaluador = evaluador_vigente(kb) if derivados else None
+        if evaluador is not None:
+            self._codificador.marca(evaluador.vistos, kb['reglas'], registros)
+        if not registros:
+            return
+        escribir_bloque(self._fichero, registros)
+        self._fichero.flush()
+        self.registros += len(hechos)
+        self.sin_sincronizar += len(hechos)
+
+        vencido = self.intervalo is not None and time.monotonic() - self._ultima_sincronizacion >= self.intervalo
+        if self.sin_sincronizar >= self.grupo or vencido:
+            self.sincronizar()
+        if self.registros >= self.cada:
+            self.punto_de_control(kb)
+
+    def sincronizar(self) -> None:
+        """fsync del diario: los bloques escritos sobreviven a un corte de luz"""
+        if self._fichero is not None and self.sin_sincronizar:
+            os.fsync(self._fichero.fileno())
+        self.sin_sincronizar = 0
+        self._ultima_sincronizacion = time.monotonic()
+
+    def punto_de_control(self, kb: dict) -> None:
+        """
+        Escribe todos los hechos de la KB en control.bin (fichero temporal y rename, así
+        que nunca queda a medias) y empieza un diario vacío de la nueva generación.
+        """
+        if self._fichero is None:
+            self._leer()
+        hechos = list(kb['hechos'])
+        evaluador = evaluador_vigente(kb)
+        propias = set() if evaluador is None else {id(c) for copias in evaluador.copias.values() for c in copias}
+
+        generacion = self.generacion + 1
+        temporal = self.ruta_control.with_suffix('.tmp')
+        codificador = Codificador()
+        with open(temporal, 'wb') as fichero:
+            fichero.write(CABECERA.pack(MAGICO, VERSION, generacion))
+            for inicio in range(0, len(hechos), HECHOS_POR_BLOQUE):
+                registros = bytearray()
+                for hecho in hechos[inicio:inicio + HECHOS_POR_BLOQUE]:
+                    codificador.hecho(hecho, id(hecho) in propias, registros)
+                escribir_bloque(fichero, registros)
+            if evaluador is not None:
+                registros = bytearray()
+                codificador.marca(evaluador.vistos, kb['reglas'], registros)
+                escribir_bloque(fichero, registros)
+            fichero.flush()
+            os.fsync(fichero.fileno())
+        os.replace(temporal, self.ruta_control)
+        _sincronizar_directorio(self.directorio)
+
+        # El diario anterior queda obsoleto (su generación es menor) aunque falle lo siguiente
+        if self._fichero is not None:
+            self._fichero.close()
+        self.generacion = generacion
+        self._abrir()
+        self.sin_sincronizar = 0
+
+    def cerrar(self) -> None:
+        if self._fichero is not None:
+            self.sincronizar()
+            self._fichero.close()
+            self._fichero = None
+
+
+def registrar_kb(kb: dict, hechos: list[Tripleta], derivados: bool = False) -> None:
+    """Registra los hechos en kb['diario'] si la KB tiene diario"""
+    diario = kb.get('diario')
+    # Tras un 'descubrir' sin hechos nuevos la marca del evaluador también avanza
+    if diario is not None and (hechos or derivados):
+        diario.registrar(kb, hechos, derivados)
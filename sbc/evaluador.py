@@ -0,0 +1,480 @@
+"""
+Encadenamiento hacia delante semi-ingenuo por estratos.
+
+Las reglas se agrupan en estratos (componentes fuertemente conexas del grafo de
+predicados) y se evalúan en orden topológico:
+    - estratos no recursivos: una sola pasada
+    - estratos recursivos: hasta el punto fijo
+En cada pasada solo se buscan derivaciones que usen al menos un hecho nuevo
+(delta), y un estrato se salta entero si ninguno de sus predicados de entrada
+recibió hechos nuevos. El evaluador se guarda en kb['evaluador'] y recuerda qué
+hechos ya ha visto, así que un 'descubrir' posterior solo trabaja con lo añadido.
+
+Los hechos derivados también se mantienen al quitar hechos o cambiar reglas
+(ver sbc.vigilancia):
+    - hechos eliminados: DRed (borrar de más y volver a derivar)
+    - reglas cambiadas: se recalculan solo los estratos afectados
+
+Los joins de antecedentes que comparten varias reglas se hacen una sola vez por
+ronda (ver sbc.prefijos). Los estratos no recursivos de un mismo nivel topológico
+no dependen entre sí, así que se evalúan juntos y comparten también sus joins.
+
+Con max_pendientes los consecuentes de cada ronda que aún no se han incorporado
+se guardan en un lote con memoria acotada que se vuelca a disco (ver sbc.desborde).
+Solo se acota ese lote: los hechos incorporados siguen en memoria (self.hechos,
+self.indice y kb['hechos']) porque los joins los buscan en el índice. Por eso
+sbc.query.descubrir con max_pendientes no usa este evaluador sino un SQLite temporal
+(ver sbc.almacen_sqlite.descubrir_en_disco).
+"""
+from sbc.ed import Tripleta, Regla, Sustitucion, es_variable
+from sbc.grafo import CUALQUIERA, GrafoDependencias, Estrato, niveles, predicado_de
+from sbc.desborde import LoteDesbordable
+from sbc.indice import Indice
+from sbc.limites import Presupuesto, LimiteAlcanzado
+from sbc.prefijos import Nodo, arbol_prefijos
+from sbc.unificar import compilar_patron, unificar_hecho
+
+Terminos = tuple[str, str, str]
+
+
+class EvaluadorEstratificado:
+    """Estado del encadenamiento hacia delante de una KB en memoria"""
+
+    def __init__(self, reglas: list[Regla], predicados: set[str] | None = None):
+        self._usar_reglas(reglas)
+        # Si se indica, solo se leen de la KB los hechos de estos predicados (ver sbc.materializacion)
+        self.predicados = predicados
+        # Lista kb['hechos'] de la que se leen los hechos y cuántos se han visto ya
+        self.origen: list[Tripleta] | None = None
+        self.vistos = 0
+        # Un hecho por clave con la confianza máxima conocida (copias, no los de la KB)
+        self.hechos: dict[Terminos, Tripleta] = {}
+        self.indice = Indice()
+        # Confianzas de cada aparición de la clave como hecho base en la KB
+        self.base: dict[Terminos, list[float]] = {}
+        # Hechos derivados que el evaluador ha agregado a la KB, por clave
+        self.copias: dict[Terminos, list[Tripleta]] = {}
+        # Estratos evaluados y saltados en la última ejecución
+        self.evaluados = 0
+        self.saltados = 0
+        # Presupuesto del 'descubrir' en curso (ver sbc.limites)
+        self.presupuesto: Presupuesto | None = None
+        # Consecuentes pendientes de incorporar en memoria por ronda (None: sin límite)
+        self.max_pendientes: int | None = None
+        # Claves volcadas a disco en la última ejecución
+        self.volcadas = 0
+
+    def _usar_reglas(self, reglas: list[Regla]) -> None:
+        self.reglas = reglas
+        # Copia: kb['reglas'] se puede cambiar en el sitio (ver cambiar_reglas)
+        self.reglas_usadas = list(reglas)
+        self.n_reglas = len(reglas)
+        self.grafo = GrafoDependencias(reglas)
+        self.estratos = self.grafo.estratos()
+        self.niveles = niveles(self.estratos)
+        # Árbol de prefijos de antecedentes de cada estrato, por id del estrato (también los conjuntos)
+        self.arboles: dict[int, Nodo] = {id(e): arbol_prefijos(e.reglas) for e in self.estratos}
+        # Estratos no recursivos de un nivel evaluados juntos, por ids de los estratos
+        self.conjuntos: dict[tuple[int, ...], Estrato] = {}
+        for nivel in self.niveles:
+            self._conjunto([e for e in nivel if not e.recursivo])
+
+    def _conjunto(self, estratos: list[Estrato]) -> Estrato | None:
+        """Un estrato no recursivo con las reglas de varios del mismo nivel (y su árbol de prefijos)"""
+        if len(estratos) <= 1:
+            return estratos[0] if estratos else None
+        clave = tuple(id(e) for e in estratos)
+        conjunto = self.conjuntos.get(clave)
+        if conjunto is None:
+            conjunto = self.conjuntos[clave] = Estrato(set().union(*(e.predicados for e in estratos)),
+                                                       [r for e in estratos for r in e.reglas],
+                                                       set().union(*(e.entradas for e in estratos)), False)
+            self.arboles[id(conjunto)] = arbol_prefijos(conjunto.reglas)
+        return conjunto
+
+    def _unidades(self, estratos: list[Estrato]) -> list[Estrato]:
+        """Estratos de un nivel tal como se evalúan: los recursivos uno a uno, el resto juntos"""
+        unidades = [e for e in estratos if e.recursivo]
+        conjunto = self._conjunto([e for e in estratos if not e.recursivo])
+        return unidades if conjunto is None else unidades + [conjunto]
+
+    def _incorporar(self, terminos: Terminos, confianza: float) -> Tripleta | None:
+        """Añade o mejora un hecho del estado. Retorna el hecho si ha cambiado"""
+        hecho = self.hechos.get(terminos)
+        if hecho is None:
+            hecho = self.hechos[terminos] = Tripleta(*terminos, confianza)
+            self.indice.agregar(hecho)
+            return hecho
+        if confianza > hecho.confianza:
+            # Mismo objeto en el índice: basta con subir la confianza
+            hecho.confianza = confianza
+            return hecho
+        return None
+
+    def _unir(self, antecedentes: list[Tripleta], fuentes: list[Indice],
+              ss: Sustitucion | None = None, confianza: float = 1.0):
+        """
+        Join de los antecedentes buscando cada uno en su índice. Produce (ss, confianza mínima).
+        Es un generador en profundidad: cada match sale en cuanto se completa.
+        """
+        if ss is None:
+            ss = Sustitucion()
+        if not antecedentes:
+            yield ss, confianza
+            return
+        patron = compilar_patron(antecedentes[0].aplicar_sustitucion(ss))
+        for hecho in fuentes[0].buscar(patron):
+            if self.presupuesto is not None:
+                self.presupuesto.paso()
+            ss_hecho = unificar_hecho(patron, hecho)
+            if ss_hecho is None:
+                continue
+            merged = Sustitucion(ss.get_mappings().copy())
+            merged.get_mappings().update(ss_hecho.get_mappings())
+            yield from self._unir(antecedentes[1:], fuentes[1:], merged, min(confianza, hecho.confianza))
+
+    def _derivar(self, estrato: Estrato, actual: Indice, lote: dict[Terminos, float] | None = None,
+                 solo_mejoras: bool = False) -> dict[Terminos, float]:
+        """
+        Consecuentes del estrato con alguna derivación que usa un hecho de 'actual' (MAX entre derivaciones).
+        Se van añadiendo a 'lote', así que si se agota el presupuesto queda lo encontrado hasta entonces.
+        Con solo_mejoras se omiten los que no mejoran el estado (no ocupan sitio en el lote).
+        """
+        predicados_delta = {h.predicado for h in actual.hechos}
+        lote = {} if lote is None else lote
+        # Cada hijo de la raíz es un antecedente que sale del delta (pequeño); el resto del estado completo
+        for nodo in self.arboles[id(estrato)].hijos.values():
+            predicado = predicado_de(nodo.antecedente)
+            if predicado is not CUALQUIERA and predicado not in predicados_delta:
+                continue
+            self._recorrer(nodo, actual, Sustitucion(), 1.0, lote, solo_mejoras)
+        return lote
+
+    def _recorrer(self, nodo: Nodo, fuente: Indice, ss: Sustitucion, confianza: float,
+                  lote: dict[Terminos, float], solo_mejoras: bool) -> None:
+        """
+        Join del antecedente del nodo sobre 'fuente' y después de sus hijos sobre el estado.
+        Cada match sirve a todas las reglas que terminan en el nodo o más abajo.
+        """
+        patron = compilar_patron(nodo.antecedente.aplicar_sustitucion(ss))
+        for hecho in fuente.buscar(patron):
+            if self.presupuesto is not None:
+                self.presupuesto.paso()
+            ss_hecho = unificar_hecho(patron, hecho)
+            if ss_hecho is None:
+                continue
+            merged = Sustitucion(ss.get_mappings().copy())
+            merged.get_mappings().update(ss_hecho.get_mappings())
+            minimo = min(confianza, hecho.confianza)
+            for regla, consecuente in nodo.finales:
+                clave = tuple(merged.aplicar(t) for t in consecuente)
+                # MIN (AND) entre la regla y los antecedentes, MAX (OR) entre derivaciones
+                nueva = min(regla.confianza, minimo)
+                if solo_mejoras:
+                    conocido = self.hechos.get(clave)
+                    if conocido is not None and nueva <= conocido.confianza:
+                        continue
+                if nueva > lote.get(clave, -1.0):
+                    lote[clave] = nueva
+            for hijo in nodo.hijos.values():
+                self._recorrer(hijo, self.indice, merged, minimo, lote, solo_mejoras)
+
+    def _evaluar_estrato(self, estrato: Estrato, delta: dict[Terminos, Tripleta],
+                         cambiados: dict[Terminos, Tripleta]) -> None:
+        """
+        Evalúa un estrato partiendo de los hechos nuevos o mejorados (delta).
+        Añade a 'cambiados' los hechos que el estrato crea o mejora según los va encontrando.
+        """
+        actual = Indice(h for h in delta.values() if h.predicado in estrato.entradas or CUALQUIERA in estrato.entradas)
+        ronda = 0
+        while len(actual):
+            # En los estratos recursivos max_profundidad limita las rondas hasta el punto fijo
+            if self.presupuesto is not None and not self.presupuesto.puede_profundizar(ronda):
+                break
+            ronda += 1
+            siguiente = Indice()
+            lote = {} if self.max_pendientes is None else LoteDesbordable(self.max_pendientes)
+            try:
+                self._derivar(estrato, actual, lote, solo_mejoras=True)
+            finally:
+                try:
+                    for clave, confianza in lote.items():
+                        hecho = self._incorporar(clave, confianza)
+                        if hecho is not None:
+                            cambiados[clave] = hecho
+                            siguiente.agregar(hecho)
+                finally:
+                    if self.max_pendientes is not None:
+                        self.volcadas += lote.volcadas
+                        lote.cerrar()
+            if not estrato.recursivo:
+                break
+            actual = siguiente
+
+    def _propagar(self, delta: dict[Terminos, Tripleta], completos: set = frozenset(),
+                  derivados: dict[Terminos, Tripleta] | None = None) -> dict[Terminos, Tripleta]:
+        """
+        Evalúa los estratos en orden a partir del delta. Los estratos que derivan algún
+        predicado de 'completos' se evalúan con todos los hechos, no solo con el delta.
+        Retorna (y añade a 'derivados' si se pasa) los hechos creados o mejorados por las reglas.
+        """
+        delta = dict(delta)
+        derivados = {} if derivados is None else derivados
+        self.evaluados = self.saltados = 0
+        predicados_delta = {h.predicado for h in delta.values()}
+        for nivel in self.niveles:
+            # Estratos del nivel que hay que evaluar, con todos los hechos o solo con el delta
+            pendientes: dict[bool, list[Estrato]] = {True: [], False: []}
+            for estrato in nivel:
+                completo = bool(estrato.predicados & completos)
+                if not completo and CUALQUIERA not in estrato.entradas and not (estrato.entradas & predicados_delta):
+                    self.saltados += 1
+                    continue
+                self.evaluados += 1
+                pendientes[completo].append(estrato)
+            cambiados: dict[Terminos, Tripleta] = {}
+            try:
+                for completo, estratos in pendientes.items():
+                    for estrato in self._unidades(estratos):
+                        self._evaluar_estrato(estrato, self.hechos if completo else delta, cambiados)
+            finally:
+                derivados.update(cambiados)
+            delta.update(cambiados)
+            predicados_delta.update(h.predicado for h in cambiados.values())
+        return derivados
+
+    def _leer_base(self, kb: dict) -> dict[Terminos, Tripleta]:
+        """Incorpora los hechos añadidos a kb['hechos'] desde la última vez. Retorna los que cambian el estado"""
+        hechos = kb['hechos']
+        # Las instantáneas de un almacén versionado son prefijos del mismo registro
+        origen = getattr(hechos, 'almacen', hechos)
+        if self.origen is not origen or self.vistos > len(hechos):
+            self.origen = origen
+            self.vistos = 0
+            self.hechos.clear()
+            self.indice = Indice()
+            self.base.clear()
+            self.copias.clear()
+
+        delta: dict[Terminos, Tripleta] = {}
+        for hecho in hechos[self.vistos:]:
+            if self.predicados is not None and hecho.predicado not in self.predicados and not es_variable(hecho.predicado):
+                continue
+            clave = tuple(hecho)
+            self.base.setdefault(clave, []).append(hecho.confianza)
+            cambiado = self._incorporar(clave, hecho.confianza)
+            if cambiado is not None:
+                delta[clave] = cambiado
+        self.vistos = len(hechos)
+        return delta
+
+    def _publicar(self, kb: dict, derivados: dict[Terminos, Tripleta]) -> list[Tripleta]:
+        """Agrega a la KB una copia de cada hecho derivado y la retorna"""
+        # Copias: el estado puede seguir subiendo la confianza en ejecuciones posteriores
+        nuevos = [Tripleta(*clave, hecho.confianza) for clave, hecho in derivados.items()]
+        for hecho in nuevos:
+            self.copias.setdefault(tuple(hecho), []).append(hecho)
+        kb['hechos'].extend(nuevos)
+        self.vistos = len(kb['hechos'])
+        return nuevos
+
+    def _retirar(self, kb: dict, claves) -> None:
+        """
+        Vuelve las claves a su confianza base (o las quita si no son hechos base)
+        y quita de la KB las copias derivadas que se habían publicado.
+        """
+        quitar = set()
+        for clave in claves:
+            hecho = self.hechos[clave]
+            confianzas_base = self.base.get(clave)
+            if confianzas_base:
+                hecho.confianza = max(confianzas_base)
+            else:
+                del self.hechos[clave]
+                self.indice.eliminar(hecho)
+            quitar.update(id(copia) for copia in self.copias.pop(clave, ()))
+        if quitar:
+            hechos = kb['hechos']
+            hechos[:] = [h for h in hechos if id(h) not in quitar]
+            self.vistos = len(hechos)
+            # El índice de la KB no sabe quitar hechos: se reconstruye en la siguiente consulta
+            kb.pop('indice', None)
+
+    def descubrir(self, kb: dict, presupuesto: Presupuesto | None = None,
+                  max_pendientes: int | None = None) -> list[Tripleta]:
+        """
+        Aplica las reglas a los hechos añadidos a la KB desde la última ejecución.
+        Agrega a la KB y retorna los hechos derivados nuevos o con más confianza que antes.
+        Si se agota el presupuesto se publica lo derivado hasta entonces (es correcto, aunque
+        incompleto) y el evaluador se descarta para que el siguiente 'descubrir' empiece de cero.
+        Con max_pendientes cada ronda guarda en memoria como mucho ese número de
+        consecuentes pendientes; el resto se vuelca a disco (ver sbc.desborde).
+        """
+        derivados: dict[Terminos, Tripleta] = {}
+        self.presupuesto = presupuesto
+        self.max_pendientes = max_pendientes
+        self.volcadas = 0
+        try:
+            self._propagar(self._leer_base(kb), derivados=derivados)
+        except LimiteAlcanzado:
+            pass
+        finally:
+            self.presupuesto = None
+            self.max_pendientes = None
+        if presupuesto is not None and presupuesto.truncado and kb.get('evaluador') is self:
+            del kb['evaluador']
+        return self._publicar(kb, derivados)
+
+    def restaurar(self, kb: dict, vistos: int, derivados: list[bool]) -> None:
+        """
+        Rehace el estado tras un 'descubrir' completo sin volver a derivar (ver sbc.diario):
+        los primeros 'vistos' hechos de la KB ya están cerrados por las reglas y derivados[i]
+        dice si el hecho i lo publicó el evaluador.
+        """
+        hechos = kb['hechos']
+        self.origen = hechos
+        for hecho, derivado in zip(hechos[:vistos], derivados):
+            clave = tuple(hecho)
+            if derivado:
+                self.copias.setdefault(clave, []).append(hecho)
+            else:
+                self.base.setdefault(clave, []).append(hecho.confianza)
+            self._incorporar(clave, hecho.confianza)
+        self.vistos = vistos
+
+    def materializar(self, kb: dict) -> Indice:
+        """
+        Incorpora los hechos añadidos a la KB y deriva sus consecuencias sin publicarlas.
+        Retorna el índice del estado: hechos base leídos y derivados, uno por clave con la
+        confianza máxima.
+        """
+        self._propagar(self._leer_base(kb))
+        return self.indice
+
+    def eliminar_hechos(self, kb: dict, eliminados: list[Tripleta]) -> tuple[list[Terminos], list[Tripleta]]:
+        """
+        Quita hechos base de la KB y actualiza los derivados con DRed:
+            1. se borran de más todos los derivados con alguna derivación que use un hecho quitado
+            2. se vuelven a derivar los que aún se pueden derivar con lo que queda
+        Retorna (claves de derivados retirados o rebajados, hechos derivados publicados de nuevo).
+        """
+        delta = self._leer_base(kb)
+        hechos = kb['hechos']
+        propias = {id(copia) for copias in self.copias.values() for copia in copias}
+
+        semillas: dict[Terminos, Tripleta] = {}
+        for eliminado in eliminados:
+            i = next((i for i, h in enumerate(hechos) if id(h) not in propias and h == eliminado), None)
+            if i is None:
+                raise ValueError(f'No existe el hecho: {" ".join(eliminado)}')
+            del hechos[i]
+            clave = tuple(eliminado)
+            self.base[clave].remove(eliminado.confianza)
+            if not self.base[clave]:
+                del self.base[clave]
+            # Solo importa si la confianza del hecho podía venir de esta aparición
+            if eliminado.confianza >= self.hechos[clave].confianza:
+                semillas[clave] = Tripleta(*clave, self.hechos[clave].confianza)
+        self.vistos = len(hechos)
+        kb.pop('indice', None)
+
+        borrados = self._borrar_de_mas(semillas)
+        retirados = [clave for clave in borrados if clave in self.copias]
+        self._retirar(kb, borrados)
+        delta = {clave: h for clave, h in delta.items() if self.hechos.get(clave) is h}
+        rederivados = self._rederivar(borrados)
+        delta.update(rederivados)
+        derivados = self._propagar(delta)
+        derivados.update(rederivados)
+        return retirados, self._publicar(kb, derivados)
+
+    def _borrar_de_mas(self, semillas: dict[Terminos, Tripleta]) -> dict[Terminos, float]:
+        """
+        Fase de borrado de DRed sobre el estado anterior: claves con alguna derivación
+        que usa un hecho borrado y que podía dar su confianza actual. Retorna clave -> confianza anterior.
+        """
+        borrados = {clave: hecho.confianza for clave, hecho in semillas.items()}
+        frontera = dict(semillas)
+        for estrato in (unidad for nivel in self.niveles for unidad in self._unidades(nivel)):
+            actual = Indice(h for h in frontera.values() if h.predicado in estrato.entradas or CUALQUIERA in estrato.entradas)
+            while len(actual):
+                siguiente = Indice()
+                for clave, confianza in self._derivar(estrato, actual).items():
+                    hecho = self.hechos.get(clave)
+                    if hecho is None or clave in borrados or confianza < hecho.confianza:
+                        continue
+                    borrados[clave] = hecho.confianza
+                    frontera[clave] = copia = Tripleta(*clave, hecho.confianza)
+                    siguiente.agregar(copia)
+                if not estrato.recursivo:
+                    break
+                actual = siguiente
+        return borrados
+
+    def _rederivar(self, claves) -> dict[Terminos, Tripleta]:
+        """Fase de rederivación de DRed: cada clave con las reglas en un paso sobre el estado actual"""
+        cambiados: dict[Terminos, Tripleta] = {}
+        for clave in claves:
+            objetivo = Tripleta(*clave)
+            mejor = -1.0
+            for regla in self.reglas_usadas:
+                ss = unificar_hecho(compilar_patron(regla.get_consecuente()), objetivo)
+                if ss is None:
+                    continue
+                antecedentes = [a.aplicar_sustitucion(ss) for a in regla.get_antecedentes()]
+                for _, confianza in self._unir(antecedentes, [self.indice] * len(antecedentes)):
+                    mejor = max(mejor, min(regla.confianza, confianza))
+            if mejor >= 0:
+                hecho = self._incorporar(clave, mejor)
+                if hecho is not None:
+                    cambiados[clave] = hecho
+        return cambiados
+
+    def cambiar_reglas(self, kb: dict) -> tuple[list[Terminos], list[Tripleta]]:
+        """
+        Adopta las reglas actuales de la KB (se pueden haber cambiado en el sitio).
+        Se borran los derivados de los predicados afectados (consecuentes de reglas añadidas
+        o quitadas y todo lo que depende de ellos) y se recalculan solo esos estratos.
+        Retorna (claves de derivados retirados o rebajados, hechos derivados publicados de nuevo).
+        """
+        delta = self._leer_base(kb)
+        anteriores = {id(r): r for r in self.reglas_usadas}
+        actuales = {id(r): r for r in kb['reglas']}
+        cambiadas = [r for i, r in anteriores.items() if i not in actuales]
+        cambiadas += [r for i, r in actuales.items() if i not in anteriores]
+        grafo_anterior = self.grafo
+        self._usar_reglas(kb['reglas'])
+
+        raices = {predicado_de(r.get_consecuente()) for r in cambiadas}
+        afectados: set | None = set(raices)
+        for grafo in (grafo_anterior, self.grafo):
+            for predicado in grafo.depende_de:
+                dependencias = grafo.dependencias(predicado)
+                if dependencias is None or CUALQUIERA in raices:
+                    afectados = None
+                    break
+                if dependencias & raices:
+                    afectados.add(predicado)
+            if afectados is None:
+                break
+        if afectados is None:
+            # Predicados variables: cualquier predicado puede estar afectado
+            afectados = {h.predicado for h in self.hechos.values()} | set(self.grafo.depende_de)
+
+        derivados_afectados = [clave for clave, hecho in self.hechos.items()
+                               if hecho.predicado in afectados and clave in self.copias]
+        self._retirar(kb, derivados_afectados)
+        delta = {clave: h for clave, h in delta.items() if self.hechos.get(clave) is h}
+        return derivados_afectados, self._publicar(kb, self._propagar(delta, completos=afectados))
+
+
+def evaluador_kb(kb: dict) -> EvaluadorEstratificado:
+    """
+    Evaluador estratificado de la KB, guardado en kb['evaluador'].
+    Se reconstruye si cambian las reglas (otra lista o distinta longitud).
+    """
+    evaluador = kb.get('evaluador')
+    reglas = kb['reglas']
+    if evaluador is None or evaluador.reglas is not reglas or evaluador.n_reglas != len(reglas):
+        evaluador = kb['evaluador'] = EvaluadorEstratificado(reglas)
+    return evaluador
@@ -0,0 +1,276 @@
+"""
+KB fragmentada por sujeto entre varios procesos.
+
+Cada proceso trabajador guarda los hechos cuyo sujeto le corresponde por hash,
+con su propio Indice. El coordinador (HechosFragmentados) se comporta como la
+lista kb['hechos'] y resuelve las búsquedas por scatter-gather:
+    - sujeto ligado: solo se pregunta al fragmento dueño de ese sujeto
+    - sujeto libre: se pregunta a todos los fragmentos y se juntan las respuestas
+Los trabajadores deciden qué hechos están ya y con qué confianza: el coordinador no
+guarda los hechos base. Los joins de las reglas (descubrir) se hacen por lotes: las
+ligaduras parciales se reparten por el fragmento dueño del valor de la variable
+compartida. descubrir evalúa por estratos y, en los recursivos, cada ronda solo une
+los hechos que cambiaron en la anterior (semi-ingenuo), que el coordinador sí guarda.
+"""
+import multiprocessing
+import zlib
+from sbc.ed import Tripleta, Regla, Sustitucion, es_variable
+from sbc.grafo import CUALQUIERA, GrafoDependencias, predicado_de
+from sbc.indice import Indice
+from sbc.unificar import Patron, compilar_patron, unificar_hecho
+
+Terminos = tuple[str, str, str]
+
+def _trabajador(conexion) -> None:
+    """Bucle de un proceso trabajador: atiende peticiones (operacion, argumento)"""
+    indice = Indice()
+    hechos: dict[Terminos, Tripleta] = {}
+    while True:
+        operacion, argumento = conexion.recv()
+        if operacion == 'agregar':
+            # Con informar se responde con los hechos nuevos o mejorados: (s, p, o, confianza)
+            lote, informar = argumento
+            cambios = []
+            for s, p, o, confianza in lote:
+                existente = hechos.get((s, p, o))
+                if existente is None:
+                    hechos[(s, p, o)] = hecho = Tripleta(s, p, o, confianza)
+                    indice.agregar(hecho)
+                    cambios.append((s, p, o, confianza))
+                elif confianza > existente.confianza:
+                    # Un hecho repetido se queda con la confianza máxima (OR)
+                    existente.confianza = confianza
+                    cambios.append((s, p, o, confianza))
+            conexion.send(cambios if informar else None)
+        elif operacion == 'contiene':
+            s, p, o, confianza = argumento
+            existente = hechos.get((s, p, o))
+            conexion.send(existente is not None and existente.confianza == confianza)
+        elif operacion == 'buscar':
+            # Un lote de patrones -> una lista de candidatos por patrón
+            respuesta = []
+            for terminos in argumento:
+                candidatos = indice.buscar(compilar_patron(Tripleta(*terminos)))
+                respuesta.append([(h.sujeto, h.predicado, h.objeto, h.confianza) for h in candidatos])
+            conexion.send(respuesta)
+        elif operacion == 'cardinalidad':
+            conexion.send(indice.cardinalidad(compilar_patron(Tripleta(*argumento))))
+        elif operacion == 'contar':
+            conexion.send(len(indice))
+        elif operacion == 'fin':
+            conexion.close()
+            return
+
+
+class HechosFragmentados:
+    """Hechos repartidos por hash del sujeto entre n procesos trabajadores"""
+
+    def __init__(self, n_fragmentos: int = 4):
+        contexto = multiprocessing.get_context('spawn')
+        self.conexiones = []
+        self.procesos = []
+        for _ in range(n_fragmentos):
+            local, remota = contexto.Pipe()
+            proceso = contexto.Process(target=_trabajador, args=(remota,), daemon=True)
+            proceso.start()
+            self.conexiones.append(local)
+            self.procesos.append(proceso)
+        # Los hechos con variables no tienen fragmento dueño: se quedan en el coordinador
+        self.no_base: list[Tripleta] = []
+
+    def fragmento(self, sujeto: str) -> int:
+        """Fragmento dueño de un sujeto (hash estable entre ejecuciones)"""
+        return zlib.crc32(sujeto.encode('utf-8')) % len(self.conexiones)
+
+    # Interfaz de lista
+
+    def __len__(self) -> int:
+        for conexion in self.conexiones:
+            conexion.send(('contar', None))
+        return sum(conexion.recv() for conexion in self.conexiones) + len(self.no_base)
+
+    def __iter__(self):
+        for terminos in self.buscar_lote([('S', 'P', 'O')])[0]:
+            yield Tripleta(*terminos)
+
+    def __contains__(self, hecho: Tripleta) -> bool:
+        """Mismo criterio que la lista: mismos términos y misma confianza (pregunta al fragmento dueño)"""
+        if any(es_variable(t) for t in hecho):
+            return hecho in self.no_base
+        conexion = self.conexiones[self.fragmento(hecho.sujeto)]
+        conexion.send(('contiene', (*hecho, hecho.confianza)))
+        return conexion.recv()
+
+    def append(self, hecho: Tripleta) -> None:
+        self.extend([hecho])
+
+    def extend(self, hechos) -> None:
+        """Reparte los hechos por fragmento y los envía en un mensaje por trabajador"""
+        self._agregar(hechos, informar=False)
+
+    def _agregar(self, hechos, informar: bool = True) -> list[tuple]:
+        """
+        Agrega los hechos en sus fragmentos. Con informar retorna los que eran nuevos o
+        mejoraban la confianza: (s, p, o, confianza).
+        """
+        lotes = [[] for _ in self.conexiones]
+        cambios = []
+        for hecho in hechos:
+            if any(es_variable(t) for t in hecho):
+                if hecho not in self.no_base:
+                    self.no_base.append(hecho)
+                    cambios.append((*hecho, hecho.confianza))
+                continue
+            lotes[self.fragmento(hecho.sujeto)].append((*hecho, hecho.confianza))
+        enviados = []
+        for conexion, lote in zip(self.conexiones, lotes):
+            if lote:
+                conexion.send(('agregar', (lote, informar)))
+                enviados.append(conexion)
+        for conexion in enviados:
+            respuesta = conexion.recv()
+            if informar:
+                cambios.extend(respuesta)
+        return cambios
+
+    # Búsquedas
+
+    def buscar_lote(self, patrones: list[Terminos]) -> list[list[tuple]]:
+        """
+        Resuelve un lote de patrones con un mensaje por fragmento (scatter-gather).
+        Retorna, para cada patrón, las tuplas (s, p, o, confianza) candidatas.
+        """
+        por_fragmento: list[list[int]] = [[] for _ in self.conexiones]
+        for i, (sujeto, _, _) in enumerate(patrones):
+            if es_variable(sujeto):
+                for indices in por_fragmento:
+                    indices.append(i)
+            else:
+                por_fragmento[self.fragmento(sujeto)].append(i)
+
+        # Scatter: todos los fragmentos trabajan a la vez
+        enviados = []
+        for conexion, indices in zip(self.conexiones, por_fragmento):
+            if indices:
+                conexion.send(('buscar', [patrones[i] for i in indices]))
+                enviados.append((conexion, indices))
+
+        # Gather
+        resultados: list[list[tuple]] = [[] for _ in patrones]
+        for conexion, indices in enviados:
+            for i, candidatos in zip(indices, conexion.recv()):
+                resultados[i].extend(candidatos)
+        if self.no_base:
+            no_base = [(*h, h.confianza) for h in self.no_base]
+            for candidatos in resultados:
+                candidatos.extend(no_base)
+        return resultados
+
+    def buscar(self, patron: Patron) -> list[Tripleta]:
+        """Hechos candidatos para un patrón (interfaz usada por sbc.query)"""
+        return [Tripleta(*t) for t in self.buscar_lote([patron.terminos])[0]]
+
+    def cardinalidad(self, patron: Patron) -> int:
+        """Número de candidatos para el patrón (planificador de sbc.query): suma de los fragmentos que lo pueden tener"""
+        sujeto = patron.terminos[0]
+        conexiones = self.conexiones if es_variable(sujeto) else [self.conexiones[self.fragmento(sujeto)]]
+        for conexion in conexiones:
+            conexion.send(('cardinalidad', patron.terminos))
+        return sum(conexion.recv() for conexion in conexiones) + len(self.no_base)
+
+    # Encadenamiento hacia delante
+
+    def unir(self, antecedentes: list[Tripleta],
+             parciales: list[tuple[Sustitucion, float]] | None = None) -> list[tuple[Sustitucion, float]]:
+        """
+        Join de los antecedentes de una regla por lotes: cada paso envía a los
+        fragmentos todas las ligaduras parciales a la vez, agrupadas por dueño.
+        Se puede partir de ligaduras ya hechas (p.ej. con un hecho del delta).
+        """
+        if parciales is None:
+            parciales = [(Sustitucion(), 1.0)]
+        for antecedente in antecedentes:
+            # Patrones distintos del paso actual (varias ligaduras pueden compartir patrón)
+            patrones = {}
+            for ss, _ in parciales:
+                patrones.setdefault(tuple(antecedente.aplicar_sustitucion(ss)), None)
+            claves = list(patrones)
+            candidatos = dict(zip(claves, self.buscar_lote(claves)))
+
+            siguientes = []
+            for ss, confianza in parciales:
+                terminos = tuple(antecedente.aplicar_sustitucion(ss))
+                patron = compilar_patron(Tripleta(*terminos))
+                for s, p, o, confianza_hecho in candidatos[terminos]:
+                    ss_hecho = unificar_hecho(patron, Tripleta(s, p, o))
+                    if ss_hecho is None:
+                        continue
+                    merged = Sustitucion(ss.get_mappings().copy())
+                    merged.get_mappings().update(ss_hecho.get_mappings())
+                    siguientes.append((merged, min(confianza, confianza_hecho)))
+            parciales = siguientes
+            if not parciales:
+                break
+        return parciales
+
+    def unir_delta(self, antecedentes: list[Tripleta], delta: Indice) -> list[tuple[Sustitucion, float]]:
+        """Derivaciones que usan algún hecho del delta: cada antecedente sale del delta y el resto de los fragmentos"""
+        predicados_delta = {h.predicado for h in delta.hechos}
+        resultados = []
+        for i, antecedente in enumerate(antecedentes):
+            predicado = predicado_de(antecedente)
+            if predicado is not CUALQUIERA and predicado not in predicados_delta:
+                continue
+            patron = compilar_patron(antecedente)
+            parciales = []
+            for hecho in delta.buscar(patron):
+                ss = unificar_hecho(patron, hecho)
+                if ss is not None:
+                    parciales.append((ss, hecho.confianza))
+            if parciales:
+                resultados.extend(self.unir(antecedentes[:i] + antecedentes[i + 1:], parciales))
+        return resultados
+
+    def descubrir(self, reglas: list[Regla], presupuesto=None, max_pendientes: int | None = None) -> list[Tripleta]:
+        """
+        Aplica las reglas por estratos hasta el punto fijo (MIN para AND, MAX para OR).
+        La primera ronda de cada estrato une todos los hechos; las siguientes de los
+        recursivos solo las derivaciones con algún hecho cambiado en la ronda anterior.
+        Retorna los hechos creados o mejorados, como sbc.evaluador.
+        No aplica presupuesto ni max_pendientes: la memoria ya se reparte entre los procesos.
+        """
+        cambiados: dict[Terminos, float] = {}
+        for estrato in GrafoDependencias(reglas).estratos():
+            delta = None
+            while True:
+                lote: dict[Terminos, float] = {}
+                for regla in estrato.reglas:
+                    antecedentes = regla.get_antecedentes()
+                    derivaciones = self.unir(antecedentes) if delta is None else self.unir_delta(antecedentes, delta)
+                    for ss, confianza in derivaciones:
+                        clave = tuple(regla.get_consecuente().aplicar_sustitucion(ss))
+                        confianza = min(regla.confianza, confianza)
+                        if confianza > lote.get(clave, -1.0):
+                            lote[clave] = confianza
+                # Los fragmentos descartan lo que ya tenían y responden con lo que ha cambiado
+                cambios = self._agregar([Tripleta(*clave, confianza) for clave, confianza in lote.items()])
+                for s, p, o, confianza in cambios:
+                    cambiados[(s, p, o)] = confianza
+                if not estrato.recursivo or not cambios:
+                    break
+                delta = Indice(Tripleta(*cambio) for cambio in cambios)
+        return [Tripleta(*clave, confianza) for clave, confianza in cambiados.items()]
+
+    def cerrar(self) -> None:
+        """Termina los procesos trabajadores"""
+        for conexion, proceso in zip(self.conexiones, self.procesos):
+            conexion.send(('fin', None))
+            proceso.join()
+        self.conexiones = []
+        self.procesos = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.cerrar()
@@ -0,0 +1,150 @@
+"""Grafo de dependencias entre predicados construido a partir de las reglas"""
+from dataclasses import dataclass
+from sbc.ed import Regla, es_variable
+
+# Nodo para predicados variables: pueden ser cualquier predicado
+CUALQUIERA = None
+
+def predicado_de(tripleta) -> str | None:
+    """Predicado de una tripleta o CUALQUIERA si es una variable"""
+    return CUALQUIERA if es_variable(tripleta.predicado) else tripleta.predicado
+
+
+class GrafoDependencias:
+    """
+    Predicados como nodos y reglas como aristas: predicado del consecuente -> predicados
+    de sus antecedentes.
+    """
+
+    def __init__(self, reglas: list[Regla]):
+        self.reglas = reglas
+        self.depende_de: dict[str | None, set[str | None]] = {}
+        for regla in reglas:
+            consecuente = predicado_de(regla.get_consecuente())
+            antecedentes = self.depende_de.setdefault(consecuente, set())
+            antecedentes.update(predicado_de(a) for a in regla.get_antecedentes())
+
+    def dependencias(self, predicado: str | None) -> set[str] | None:
+        """
+        Predicados de los que depende (transitivamente) el predicado dado, incluido él mismo.
+        Retorna None si puede depender de cualquier predicado (aparece un predicado variable).
+        """
+        if predicado is CUALQUIERA:
+            return None
+        visitados = {predicado}
+        pendientes = [predicado]
+        while pendientes:
+            actual = pendientes.pop()
+            # Las reglas con consecuente variable pueden producir cualquier predicado
+            for siguiente in self.depende_de.get(actual, set()) | self.depende_de.get(CUALQUIERA, set()):
+                if siguiente is CUALQUIERA:
+                    return None
+                if siguiente not in visitados:
+                    visitados.add(siguiente)
+                    pendientes.append(siguiente)
+        return visitados
+
+    def estratos(self) -> list['Estrato']:
+        """
+        Divide las reglas en estratos: componentes fuertemente conexas del grafo de
+        predicados en orden topológico (primero los estratos de los que dependen otros).
+        Con predicados variables no se puede estratificar y se retorna un único estrato recursivo.
+        """
+        if CUALQUIERA in self.depende_de or any(CUALQUIERA in ps for ps in self.depende_de.values()):
+            entradas = {predicado_de(a) for r in self.reglas for a in r.get_antecedentes()}
+            return [Estrato(set(self.depende_de), list(self.reglas), entradas, True)] if self.reglas else []
+
+        estratos = []
+        for componente in componentes_fuertes(self.depende_de):
+            reglas = [r for r in self.reglas if predicado_de(r.get_consecuente()) in componente]
+            entradas = {predicado_de(a) for r in reglas for a in r.get_antecedentes()}
+            estratos.append(Estrato(componente, reglas, entradas, bool(entradas & componente)))
+        return estratos
+
+    def describir(self) -> list[str]:
+        """Líneas legibles con los estratos del grafo (comando 'grafo!' de la CLI)"""
+        lineas = []
+        for i, estrato in enumerate(self.estratos(), start=1):
+            predicados = ', '.join(sorted(str(p) for p in estrato.predicados))
+            entradas = ', '.join(sorted(str(p) for p in estrato.entradas - estrato.predicados)) or '-'
+            tipo = 'recursivo' if estrato.recursivo else 'no recursivo'
+            lineas.append(f'Estrato {i} ({tipo}, {len(estrato.reglas)} reglas): {predicados} <- {entradas}')
+        return lineas
+
+
+def niveles(estratos: list['Estrato']) -> list[list['Estrato']]:
+    """
+    Agrupa estratos en orden topológico por niveles: cada estrato va en el nivel siguiente
+    al más alto de los estratos de los que lee. Los de un mismo nivel no dependen entre sí.
+    """
+    nivel_de: dict[str | None, int] = {}
+    grupos: list[list[Estrato]] = []
+    for estrato in estratos:
+        nivel = 1 + max((nivel_de[p] for p in estrato.entradas - estrato.predicados if p in nivel_de), default=-1)
+        nivel_de.update((p, nivel) for p in estrato.predicados)
+        if nivel == len(grupos):
+            grupos.append([])
+        grupos[nivel].append(estrato)
+    return grupos
+
+
+@dataclass
+class Estrato:
+    """Predicados que se derivan juntos, sus reglas y los predicados que leen sus antecedentes"""
+    predicados: set[str | None]
+    reglas: list[Regla]
+    entradas: set[str | None]
+    recursivo: bool
+
+
+def componentes_fuertes(aristas: dict) -> list[set]:
+    """
+    Componentes fuertemente conexas (Tarjan iterativo) de los nodos con aristas salientes.
+    Cada componente aparece después de todas las componentes a las que llega.
+    """
+    indices: dict = {}
+    bajos: dict = {}
+    pila: list = []
+    en_pila: set = set()
+    componentes: list[set] = []
+
+    for raiz in aristas:
+        if raiz in indices:
+            continue
+        # Pila de llamadas explícita: (nodo, iterador sobre sus sucesores)
+        llamadas = [(raiz, iter(aristas[raiz]))]
+        indices[raiz] = bajos[raiz] = len(indices)
+        pila.append(raiz)
+        en_pila.add(raiz)
+        while llamadas:
+            nodo, sucesores = llamadas[-1]
+            avanzado = False
+            for sucesor in sucesores:
+                # Los predicados base (sin reglas) no forman parte de ningún estrato
+                if sucesor not in aristas:
+                    continue
+                if sucesor not in indices:
+                    indices[sucesor] = bajos[sucesor] = len(indices)
+                    pila.append(sucesor)
+                    en_pila.add(sucesor)
+                    llamadas.append((sucesor, iter(aristas[sucesor])))
+                    avanzado = True
+                    break
+                if sucesor in en_pila:
+                    bajos[nodo] = min(bajos[nodo], indices[sucesor])
+            if avanzado:
+                continue
+            llamadas.pop()
+            if llamadas:
+                padre = llamadas[-1][0]
+                bajos[padre] = min(bajos[padre], bajos[nodo])
+            if bajos[nodo] == indices[nodo]:
+                componente = set()
+                while True:
+                    miembro = pila.pop()
+                    en_pila.discard(miembro)
+                    componente.add(miembro)
+                    if miembro == nodo:
+                        break
+                componentes.append(componente)
+    return componentes
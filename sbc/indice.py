@@ -0,0 +1,135 @@
+"""Índice en memoria de hechos por sujeto, predicado y objeto"""
+from collections import defaultdict
+from sbc.ed import Tripleta, es_variable
+from sbc.unificar import Patron
+
+class Indice:
+    """
+    Indexa hechos por cada combinación de posiciones ligadas.
+    Los hechos que contienen variables no se pueden indexar por valor,
+    así que se devuelven siempre como candidatos.
+    """
+
+    def __init__(self, hechos: list[Tripleta] = ()):
+        self.hechos: list[Tripleta] = []
+        # Lista de la KB de la que se construyó el índice (ver indice_kb)
+        self.origen: list[Tripleta] | None = None
+        self.no_base: list[Tripleta] = []
+        # Hechos base cuyos términos ya estaban en otro hecho (p.ej. con otra confianza)
+        self.repetidos = 0
+        # Una tabla por cada combinación de posiciones literales del patrón
+        self.tablas: dict[tuple[int, ...], defaultdict] = {
+            posiciones: defaultdict(list)
+            for posiciones in ((0,), (1,), (2,), (0, 1), (1, 2), (0, 2), (0, 1, 2))
+        }
+        for hecho in hechos:
+            self.agregar(hecho)
+
+    def __len__(self) -> int:
+        return len(self.hechos)
+
+    def __contains__(self, hecho: Tripleta) -> bool:
+        """Mismo criterio que la lista (términos y confianza) sin recorrer todos los hechos"""
+        terminos = (hecho.sujeto, hecho.predicado, hecho.objeto)
+        if any(es_variable(t) for t in terminos):
+            return hecho in self.no_base
+        return hecho in self.tablas[(0, 1, 2)].get(terminos, ())
+
+    def agregar(self, hecho: Tripleta) -> None:
+        """Añade un hecho a todas las tablas"""
+        self.hechos.append(hecho)
+        s, p, o = hecho.sujeto, hecho.predicado, hecho.objeto
+        if es_variable(s) or es_variable(p) or es_variable(o):
+            self.no_base.append(hecho)
+            return
+        # Claves en el mismo orden que self.tablas (se llama por cada hecho de la carga)
+        claves = ((s,), (p,), (o,), (s, p), (p, o), (s, o), (s, p, o))
+        for tabla, clave in zip(self.tablas.values(), claves):
+            tabla[clave].append(hecho)
+        # La última tabla es (s, p, o)
+        if len(tabla[clave]) > 1:
+            self.repetidos += 1
+
+    def eliminar(self, hecho: Tripleta) -> None:
+        """Quita un hecho (el mismo objeto que se agregó) de todas las tablas"""
+        _quitar(self.hechos, hecho)
+        terminos = (hecho.sujeto, hecho.predicado, hecho.objeto)
+        if any(es_variable(t) for t in terminos):
+            _quitar(self.no_base, hecho)
+            return
+        if len(self.tablas[(0, 1, 2)].get(terminos, ())) > 1:
+            self.repetidos -= 1
+        for posiciones, tabla in self.tablas.items():
+            clave = tuple(terminos[i] for i in posiciones)
+            _quitar(tabla[clave], hecho)
+            if not tabla[clave]:
+                del tabla[clave]
+
+    def buscar(self, patron: Patron) -> list[Tripleta]:
+        """
+        Devuelve los hechos candidatos a unificar con el patrón, en orden de inserción.
+        Los candidatos aún deben unificarse (variables repetidas, hechos no base).
+        """
+        if not patron.literales:
+            return self.hechos
+        posiciones = tuple(pos for pos, _ in patron.literales)
+        clave = tuple(literal for _, literal in patron.literales)
+        candidatos = self.tablas[posiciones].get(clave, [])
+        if self.no_base:
+            return candidatos + self.no_base
+        return candidatos
+
+    def cardinalidad(self, patron: Patron) -> int:
+        """Número de hechos candidatos para el patrón, sin enumerarlos"""
+        if not patron.literales:
+            return len(self.hechos)
+        posiciones = tuple(pos for pos, _ in patron.literales)
+        clave = tuple(literal for _, literal in patron.literales)
+        return len(self.tablas[posiciones].get(clave, ())) + len(self.no_base)
+
+    def contar(self, patron: Patron) -> int | None:
+        """
+        Número de respuestas distintas del patrón en los hechos, sin unificar.
+        Sin hechos repetidos es el tamaño de la tabla; None si el índice no lo sabe
+        (hechos no base o variables repetidas en el patrón).
+        """
+        if self.no_base or len(patron.nombres_variables) < len(patron.variables):
+            return None
+        if not patron.variables:
+            return 1 if patron.terminos in self.tablas[(0, 1, 2)] else 0
+        if not patron.literales:
+            return len(self.hechos) - self.repetidos
+        candidatos = self.buscar(patron)
+        if not self.repetidos:
+            return len(candidatos)
+        # Las posiciones literales son fijas: respuestas distintas = tripletas distintas
+        return len({(h.sujeto, h.predicado, h.objeto) for h in candidatos})
+
+
+def _quitar(lista: list, elemento) -> None:
+    """Quita un elemento de una lista por identidad (no por igualdad)"""
+    for i, actual in enumerate(lista):
+        if actual is elemento:
+            del lista[i]
+            return
+
+
+def indice_kb(kb: dict):
+    """
+    Índice de los hechos de la KB.
+    Si kb['hechos'] ya sabe buscar (SQLite, fragmentos...) se usa directamente.
+    Si es una lista se mantiene un Indice en kb['indice']: como la lista solo crece
+    (append/extend) basta con indexar los hechos nuevos; si se sustituye o encoge
+    se reconstruye.
+    """
+    hechos = kb['hechos']
+    if hasattr(hechos, 'buscar'):
+        return hechos
+    indice = kb.get('indice')
+    if indice is None or indice.origen is not hechos or len(indice) > len(hechos):
+        indice = Indice()
+        indice.origen = hechos
+        kb['indice'] = indice
+    for hecho in hechos[len(indice):]:
+        indice.agregar(hecho)
+    return indice
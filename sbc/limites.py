@@ -0,0 +1,128 @@
+"""
+Límites de recursos para consultas y 'descubrir'.
+
+Limites guarda la configuración (por llamada o por sesión de la CLI) y
+Presupuesto la consume durante una evaluación:
+    - max_pasos: inferencias (hechos candidatos y reglas probadas)
+    - max_profundidad: profundidad de la demostración (reglas anidadas)
+    - max_segundos: tiempo de reloj
+    - max_respuestas: respuestas de una consulta
+Pasos, tiempo y cancelación abortan la evaluación con LimiteAlcanzado; la
+profundidad solo poda la rama. En todos los casos presupuesto.truncado indica
+el motivo y las funciones del motor retornan los resultados parciales.
+"""
+import threading
+import time
+from dataclasses import dataclass, fields
+
+# Cada cuántos pasos se mira el reloj y la cancelación (empezando por el primero)
+PASOS_ENTRE_COMPROBACIONES = 64
+
+
+class LimiteAlcanzado(Exception):
+    """Se ha agotado el presupuesto o se ha cancelado la evaluación"""
+
+    def __init__(self, motivo: str):
+        super().__init__(f'Evaluación truncada: {motivo}')
+        self.motivo = motivo
+
+
+class Cancelacion:
+    """Token de cancelación que se puede activar desde otro hilo (o un manejador de señal)"""
+
+    def __init__(self):
+        self._evento = threading.Event()
+
+    def cancelar(self) -> None:
+        self._evento.set()
+
+    def cancelada(self) -> bool:
+        return self._evento.is_set()
+
+    def reiniciar(self) -> None:
+        self._evento.clear()
+
+
+@dataclass
+class Limites:
+    """Límites de una evaluación (None: sin límite)"""
+    max_pasos: int | None = None
+    max_profundidad: int | None = None
+    max_segundos: float | None = None
+    max_respuestas: int | None = None
+
+    def activos(self) -> bool:
+        return any(getattr(self, campo.name) is not None for campo in fields(self))
+
+    def describir(self) -> str:
+        partes = [f'{campo.name}={getattr(self, campo.name)}' for campo in fields(self)
+                  if getattr(self, campo.name) is not None]
+        return ' '.join(partes) if partes else 'sin límites'
+
+
+class Presupuesto:
+    """Consumo de los límites durante una evaluación"""
+
+    def __init__(self, limites: Limites | None = None, cancelacion: Cancelacion | None = None):
+        self.limites = limites or Limites()
+        self.cancelacion = cancelacion
+        self.pasos = 0
+        self.truncado: str | None = None
+        self.fin = None if self.limites.max_segundos is None else time.monotonic() + self.limites.max_segundos
+
+    def _agotar(self, motivo: str):
+        self.truncado = motivo
+        raise LimiteAlcanzado(motivo)
+
+    def paso(self) -> None:
+        """Cuenta una inferencia; lanza LimiteAlcanzado si se agota algún límite"""
+        self.pasos += 1
+        if self.limites.max_pasos is not None and self.pasos > self.limites.max_pasos:
+            self._agotar('max_pasos')
+        if self.pasos % PASOS_ENTRE_COMPROBACIONES == 1:
+            self.comprobar()
+
+    def comprobar(self) -> None:
+        """Comprueba reloj y cancelación (también se puede llamar fuera de los pasos)"""
+        if self.cancelacion is not None and self.cancelacion.cancelada():
+            self._agotar('cancelada')
+        if self.fin is not None and time.monotonic() > self.fin:
+            self._agotar('max_segundos')
+
+    def puede_profundizar(self, profundidad: int) -> bool:
+        """False (y marca la evaluación como truncada) si expandir otra regla supera la profundidad"""
+        maximo = self.limites.max_profundidad
+        if maximo is not None and profundidad >= maximo:
+            self.truncado = self.truncado or 'max_profundidad'
+            return False
+        return True
+
+
+def recoger(resultados, presupuesto: Presupuesto | None, variables: list[str] | None = None) -> list:
+    """
+    Lista con los (sustitución, confianza) de un generador del motor respetando el presupuesto.
+    Si se alcanza un límite retorna lo obtenido hasta entonces (presupuesto.truncado dice por qué).
+    max_respuestas cuenta respuestas distintas (valores de las variables de la consulta), como
+    sbc.query.respuestas: se siguen recogiendo derivaciones de las respuestas ya vistas.
+    Sin variables cada resultado cuenta como una respuesta.
+    """
+    if presupuesto is None:
+        return list(resultados)
+    maximo = presupuesto.limites.max_respuestas
+    recogidos = []
+    distintas = set()
+    try:
+        for resultado in resultados:
+            respuesta = len(recogidos) if variables is None else tuple(resultado[0].aplicar(v) for v in variables)
+            if respuesta not in distintas:
+                if maximo is not None and len(distintas) >= maximo:
+                    presupuesto.truncado = 'max_respuestas'
+                    break
+                distintas.add(respuesta)
+            recogidos.append(resultado)
+    except LimiteAlcanzado:
+        pass
+    except RecursionError:
+        # Reglas recursivas sin max_profundidad: mejor un resultado parcial que romper el proceso
+        presupuesto.truncado = 'recursion'
+    return recogidos
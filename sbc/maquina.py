@@ -0,0 +1,199 @@
+"""
+Motor de consultas iterativo con pila explícita (al estilo de una WAM reducida).
+
+query -> query_antecedentes -> query forma una cadena de generadores anidados:
+cada respuesta sube por todos ellos y las derivaciones profundas llegan al
+límite de recursión de Python. Este motor produce las mismas respuestas, en el
+mismo orden y con las mismas confianzas, con tres estructuras:
+    - metas: lista enlazada e inmutable de antecedentes pendientes (la continuación)
+    - puntos de elección: alternativas (hechos y reglas) que quedan por probar
+    - rastro: ligaduras en orden; al volver atrás se deshacen hasta la marca del punto
+
+Igual que en query, cada aplicación de regla ve solo sus propias ligaduras y las
+de las submetas ya resueltas (un ámbito por regla, sin renombrar variables): una
+variable se ve en un ámbito si su última ligadura es posterior al inicio del ámbito.
+"""
+from dataclasses import dataclass
+from sbc.ed import Tripleta, Regla, Sustitucion, es_variable
+from sbc.unificar import Patron, compilar_patron, unificar_hecho, unificar_patrones
+from sbc.indice import indice_kb
+from sbc.limites import Presupuesto
+
+# Meta pendiente: (antecedente, inicio de su ámbito en el rastro, profundidad, resto de metas)
+Metas = tuple[Tripleta, int, int, 'Metas'] | None
+
+
+@dataclass(slots=True)
+class PuntoEleccion:
+    """Alternativas pendientes de una meta y estado al que volver para probarlas"""
+    patron: Patron
+    profundidad: int
+    resto: Metas
+    confianza: float
+    marca: int
+    hechos: list[Tripleta]
+    reglas: list[Regla]
+    siguiente_hecho: int = 0
+    siguiente_regla: int = 0
+
+
+def encadenar(antecedentes: list[Tripleta], alcance: int, profundidad: int, resto: Metas) -> Metas:
+    """Pone los antecedentes delante de las metas pendientes (el primero queda arriba)"""
+    for antecedente in reversed(antecedentes):
+        resto = (antecedente, alcance, profundidad, resto)
+    return resto
+
+
+class Maquina:
+    """Estado de una resolución: ligaduras, rastro y pila de puntos de elección"""
+
+    def __init__(self, kb: dict, presupuesto: Presupuesto | None = None):
+        self.kb = kb
+        self.presupuesto = presupuesto
+        self.indice = indice_kb(kb)
+        # variable -> [(posición en el rastro, valor)], la última es la vigente
+        self.ligaduras: dict[str, list[tuple[int, str]]] = {}
+        self.rastro: list[str] = []
+        self.puntos: list[PuntoEleccion] = []
+
+    def ligar(self, sustitucion: Sustitucion) -> None:
+        for variable, valor in sustitucion.get_mappings().items():
+            self.ligaduras.setdefault(variable, []).append((len(self.rastro), valor))
+            self.rastro.append(variable)
+
+    def deshacer(self, marca: int) -> None:
+        """Deshace las ligaduras hechas desde la marca"""
+        while len(self.rastro) > marca:
+            variable = self.rastro.pop()
+            pila = self.ligaduras[variable]
+            pila.pop()
+            if not pila:
+                del self.ligaduras[variable]
+
+    def valor(self, termino: str, alcance: int = 0) -> str:
+        """Valor de un término visto desde un ámbito (como Sustitucion.aplicar)"""
+        saltos = 0
+        while es_variable(termino):
+            pila = self.ligaduras.get(termino)
+            if not pila or pila[-1][0] < alcance:
+                break
+            termino = pila[-1][1]
+            saltos += 1
+            # Un ciclo X -> Y -> X haría que Sustitucion.aplicar agotase la recursión
+            if saltos > len(self.rastro):
+                raise RecursionError(f'Ciclo de variables en {termino}')
+        return termino
+
+    def sustitucion(self, variables: list[str] | None = None) -> Sustitucion:
+        """
+        Sustitución completa de la respuesta actual (la misma que produce query).
+        Con variables solo esas, ya resueltas: el coste no depende del tamaño del rastro.
+        """
+        if variables is None:
+            return Sustitucion({variable: self.ligaduras[variable][-1][1] for variable in self.rastro})
+        valores = ((variable, self.valor(variable)) for variable in variables)
+        return Sustitucion({variable: valor for variable, valor in valores if valor != variable})
+
+    def ejecutar(self, metas: Metas, confianza: float):
+        """
+        Resuelve las metas en profundidad; produce la confianza de cada respuesta
+        con las ligaduras de la respuesta puestas (ver valor y sustitucion).
+        """
+        while True:
+            if metas is None:
+                yield confianza
+            else:
+                antecedente, alcance, profundidad, resto = metas
+                sujeto, predicado, objeto = (self.valor(t, alcance) for t in antecedente)
+                patron = compilar_patron(Tripleta(sujeto, predicado, objeto))
+                self.puntos.append(PuntoEleccion(patron, profundidad, resto, confianza, len(self.rastro),
+                                                 self.indice.buscar(patron), self.kb['reglas']))
+            siguiente = self.reintentar()
+            if siguiente is None:
+                return
+            metas, confianza = siguiente
+
+    def reintentar(self) -> tuple[Metas, float] | None:
+        """
+        Prueba la siguiente alternativa del punto de elección más reciente (volviendo
+        atrás los que se agotan). Retorna las metas y confianza con las que seguir,
+        o None si no quedan alternativas.
+        """
+        presupuesto = self.presupuesto
+        puntos = self.puntos
+        while puntos:
+            punto = puntos[-1]
+            self.deshacer(punto.marca)
+
+            # Primero los hechos
+            hechos = punto.hechos
+            while punto.siguiente_hecho < len(hechos):
+                hecho = hechos[punto.siguiente_hecho]
+                punto.siguiente_hecho += 1
+                if presupuesto is not None:
+                    presupuesto.paso()
+                ss = unificar_hecho(punto.patron, hecho)
+                if ss is not None:
+                    self.ligar(ss)
+                    return punto.resto, min(punto.confianza, hecho.confianza)
+
+            # Después las reglas
+            reglas = punto.reglas
+            patron = punto.patron
+            n_reglas = len(reglas)
+            while punto.siguiente_regla < n_reglas:
+                regla = reglas[punto.siguiente_regla]
+                punto.siguiente_regla += 1
+                if presupuesto is not None:
+                    presupuesto.paso()
+                ss = unificar_patrones(patron, compilar_patron(regla.consecuente))
+                if ss is None:
+                    continue
+                if presupuesto is not None and not presupuesto.puede_profundizar(punto.profundidad):
+                    continue
+                if punto.siguiente_regla == n_reglas:
+                    # Última alternativa: el punto ya no hace falta (la pila no crece con la recursión)
+                    puntos.pop()
+                alcance = len(self.rastro)
+                self.ligar(ss)
+                metas = encadenar(regla.get_antecedentes(), alcance, punto.profundidad + 1, punto.resto)
+                # MIN entre la regla y los antecedentes (1.0 si no hay antecedentes)
+                return metas, min(punto.confianza, regla.confianza, 1.0)
+
+            if puntos and puntos[-1] is punto:
+                puntos.pop()
+        return None
+
+
+def resolver(tripleta: Tripleta, kb: dict, presupuesto: Presupuesto | None = None,
+             variables: list[str] | None = None):
+    """
+    Mismo resultado que query(tripleta, kb, presupuesto): (sustitución, confianza) por cada match.
+    Con variables (p.ej. las de la consulta) la sustitución solo tiene esas, y el coste
+    por respuesta no depende de la profundidad de la demostración.
+    """
+    maquina = Maquina(kb, presupuesto)
+    for confianza in maquina.ejecutar(encadenar([tripleta], 0, 0, None), float('inf')):
+        yield maquina.sustitucion(variables), confianza
+
+
+def resolver_antecedentes(antecedentes: list[Tripleta], kb: dict, presupuesto: Presupuesto | None = None,
+                          variables: list[str] | None = None):
+    """Mismo resultado que query_antecedentes(antecedentes, kb, Sustitucion(), presupuesto); variables como en resolver"""
+    maquina = Maquina(kb, presupuesto)
+    for confianza in maquina.ejecutar(encadenar(antecedentes, 0, 0, None), 1.0):
+        yield maquina.sustitucion(variables), confianza
+
+
+def valores_respuestas(tripletas: list[Tripleta], variables: list[str], kb: dict,
+                       presupuesto: Presupuesto | None = None, conjuncion: bool = False):
+    """
+    (valores de las variables, confianza) por cada match, sin construir la sustitución
+    completa: el coste por respuesta no depende de la profundidad de la demostración.
+    Con conjuncion las tripletas se resuelven como query_antecedentes; si no, tripletas
+    debe ser una sola (como query).
+    """
+    maquina = Maquina(kb, presupuesto)
+    confianza_inicial = 1.0 if conjuncion else float('inf')
+    for confianza in maquina.ejecutar(encadenar(tripletas, 0, 0, None), confianza_inicial):
+        yield tuple(maquina.valor(v) for v in variables), confianza
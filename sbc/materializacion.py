@@ -0,0 +1,146 @@
+"""
+Materialización adaptativa de predicados derivados.
+
+Por cada predicado derivado (consecuente de alguna regla) se lleva la frecuencia
+de consulta, con decaimiento exponencial, y el coste medio de derivarlo hacia atrás.
+Cuando frecuencia * coste supera el umbral, el predicado se materializa: un
+evaluador estratificado propio (ver sbc.evaluador) deriva todos sus hechos en un
+índice, y las consultas siguientes se responden desde ese índice. La tabla se
+mantiene al día al agregar hechos, porque el evaluador solo procesa los añadidos
+a la KB desde la última vez.
+Un predicado que se deja de consultar baja de puntuación y se expulsa (con
+histéresis para no materializar y expulsar una y otra vez), y si las tablas
+suman más de max_hechos se expulsan las de menor puntuación.
+"""
+from dataclasses import dataclass
+from sbc.ed import Regla, Tripleta, es_variable
+from sbc.evaluador import EvaluadorEstratificado
+from sbc.grafo import GrafoDependencias, predicado_de
+from sbc.indice import Indice
+
+# Puntuación (consultas recientes * segundos por derivación) a partir de la que se materializa
+UMBRAL = 0.05
+# Factor que se aplica a todas las frecuencias en cada consulta registrada
+DECAIMIENTO = 0.99
+# Se expulsa por debajo de UMBRAL * HISTERESIS
+HISTERESIS = 0.5
+# Hechos guardados entre todas las tablas
+MAX_HECHOS = 200_000
+# Peso de la última medida en el coste medio
+PESO_COSTE = 0.3
+
+
+@dataclass
+class Estadistica:
+    """Uso de un predicado derivado"""
+    frecuencia: float = 0.0
+    coste: float = 0.0
+    consultas: int = 0
+
+    def puntuacion(self) -> float:
+        return self.frecuencia * self.coste
+
+
+class Materializador:
+    """Estadísticas de consulta y tablas materializadas de una KB (kb['materializacion'])"""
+
+    def __init__(self, umbral: float = UMBRAL, max_hechos: int = MAX_HECHOS, decaimiento: float = DECAIMIENTO):
+        self.umbral = umbral
+        self.max_hechos = max_hechos
+        self.decaimiento = decaimiento
+        self.estadisticas: dict[str, Estadistica] = {}
+        # predicado -> evaluador con las reglas y hechos de los que depende
+        self.tablas: dict[str, EvaluadorEstratificado] = {}
+        # Expulsados por no caber en max_hechos: no se vuelven a materializar hasta invalidar()
+        self.demasiado_grandes: set[str] = set()
+        self._reglas: list[Regla] = []
+        self._grafo = GrafoDependencias([])
+
+    def _comprobar_reglas(self, kb: dict) -> None:
+        """Si cambian las reglas (también en el sitio) se descartan las tablas"""
+        reglas = kb['reglas']
+        if len(reglas) != len(self._reglas) or any(a is not b for a, b in zip(reglas, self._reglas)):
+            self._reglas = list(reglas)
+            self._grafo = GrafoDependencias(self._reglas)
+            self.invalidar()
+
+    def derivado(self, predicado: str, kb: dict) -> bool:
+        """Si alguna regla deriva el predicado (solo estos se pueden materializar)"""
+        self._comprobar_reglas(kb)
+        return not es_variable(predicado) and predicado in self._grafo.depende_de
+
+    def tabla(self, tripleta: Tripleta, kb: dict) -> Indice | None:
+        """Índice con los hechos del predicado de la tripleta al día, o None si no está materializado"""
+        self._comprobar_reglas(kb)
+        evaluador = self.tablas.get(tripleta.predicado)
+        if evaluador is None:
+            return None
+        return evaluador.materializar(kb)
+
+    def registrar(self, predicado: str, segundos: float | None, kb: dict) -> None:
+        """
+        Anota una consulta del predicado; segundos es lo que ha costado derivarla
+        (None si se ha respondido desde su tabla). Materializa o expulsa según la puntuación.
+        """
+        for estadistica in self.estadisticas.values():
+            estadistica.frecuencia *= self.decaimiento
+        estadistica = self.estadisticas.setdefault(predicado, Estadistica())
+        estadistica.frecuencia += 1
+        estadistica.consultas += 1
+        if segundos is not None:
+            if estadistica.coste:
+                estadistica.coste += PESO_COSTE * (segundos - estadistica.coste)
+            else:
+                estadistica.coste = segundos
+        self._ajustar(kb)
+
+    def _ajustar(self, kb: dict) -> None:
+        for predicado, estadistica in self.estadisticas.items():
+            puntuacion = estadistica.puntuacion()
+            if predicado in self.tablas:
+                if puntuacion < self.umbral * HISTERESIS:
+                    del self.tablas[predicado]
+            elif puntuacion >= self.umbral and predicado not in self.demasiado_grandes:
+                self._materializar(predicado, kb)
+
+        # Memoria acotada: fuera las tablas de menor puntuación
+        while self.tablas and self.hechos() > self.max_hechos:
+            predicado = min(self.tablas, key=lambda p: self.estadisticas[p].puntuacion())
+            del self.tablas[predicado]
+            self.demasiado_grandes.add(predicado)
+
+    def _materializar(self, predicado: str, kb: dict) -> None:
+        predicados = self._grafo.dependencias(predicado)
+        if predicados is None:
+            # Depende de reglas con predicados variables: podría necesitar cualquier hecho
+            self.demasiado_grandes.add(predicado)
+            return
+        reglas = [r for r in self._reglas if predicado_de(r.get_consecuente()) in predicados]
+        evaluador = EvaluadorEstratificado(reglas, predicados)
+        evaluador.materializar(kb)
+        self.tablas[predicado] = evaluador
+
+    def hechos(self) -> int:
+        """Hechos guardados entre todas las tablas"""
+        return sum(len(evaluador.hechos) for evaluador in self.tablas.values())
+
+    def invalidar(self) -> None:
+        """Descarta las tablas (p.ej. al quitar hechos); se vuelven a materializar al consultar"""
+        self.tablas.clear()
+        self.demasiado_grandes.clear()
+
+    def estado(self) -> list[str]:
+        """Líneas legibles con el estado de cada predicado (comando 'materializacion!' de la CLI)"""
+        lineas = []
+        ordenados = sorted(self.estadisticas.items(), key=lambda e: e[1].puntuacion(), reverse=True)
+        for predicado, estadistica in ordenados:
+            if predicado in self.tablas:
+                situacion = f'materializado ({len(self.tablas[predicado].hechos)} hechos)'
+            elif predicado in self.demasiado_grandes:
+                situacion = 'no materializable'
+            else:
+                situacion = 'bajo demanda'
+            lineas.append(f'{predicado}: {situacion}, {estadistica.consultas} consultas, '
+                          f'frecuencia {estadistica.frecuencia:.2f}, coste {estadistica.coste * 1000:.2f} ms, '
+                          f'puntuación {estadistica.puntuacion():.4f}')
+        return lineas
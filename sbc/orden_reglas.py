@@ -0,0 +1,70 @@
+"""
+Orden adaptativo de las reglas en consultas de existencia.
+
+razonar para en la primera demostración, pero query prueba las reglas en el orden
+del fichero: si la que suele funcionar está al final (p.ej. 'X rico_en proteina'
+tiene una regla por ingrediente) se prueban antes todas las demás. OrdenReglas
+guarda, por forma de la consulta (predicado y qué posiciones están ligadas) y por
+regla, cuántas veces se ha probado, cuántas ha demostrado la meta y cuánto ha
+tardado, y ordena las alternativas por coste esperado hasta el primer éxito
+(coste medio / probabilidad de éxito). Las reglas sin probar usan el coste medio
+de la forma y probabilidad 1/2; a igualdad se respeta el orden del fichero.
+Sin kb['orden_reglas'] el orden es siempre el del fichero (determinista).
+"""
+from dataclasses import dataclass
+from sbc.ed import Regla
+from sbc.unificar import Patron
+
+# Forma de una meta: predicado (None si es variable), sujeto ligado, objeto ligado
+Forma = tuple[str | None, bool, bool]
+
+
+def forma_de(patron: Patron) -> Forma:
+    """Forma de la meta: los valores concretos no cuentan, solo qué está ligado"""
+    ligadas = {posicion for posicion, _ in patron.literales}
+    predicado = next((valor for posicion, valor in patron.literales if posicion == 1), None)
+    return predicado, 0 in ligadas, 2 in ligadas
+
+
+@dataclass
+class EstadisticaRegla:
+    """Intentos de demostrar metas de una forma con una regla"""
+    # Referencia a la regla: mientras está aquí su id no se reutiliza
+    regla: Regla
+    intentos: int = 0
+    exitos: int = 0
+    segundos: float = 0.0
+
+
+class OrdenReglas:
+    """Estadísticas por forma y regla, y orden de las alternativas según ellas"""
+
+    def __init__(self):
+        self.estadisticas: dict[tuple[Forma, int], EstadisticaRegla] = {}
+        # Intentos y segundos de todas las reglas por forma (coste supuesto de las no probadas)
+        self.formas: dict[Forma, list] = {}
+
+    def puntuacion(self, forma: Forma, regla: Regla) -> float:
+        """Coste esperado hasta demostrar la meta con la regla (menor: se prueba antes)"""
+        intentos, segundos = self.formas.get(forma, (0, 0.0))
+        coste_supuesto = segundos / intentos if intentos else 0.0
+        estadistica = self.estadisticas.get((forma, id(regla)))
+        if estadistica is None or estadistica.regla is not regla:
+            return coste_supuesto * 2
+        # Un intento ficticio al coste medio y medio éxito: las primeras medidas no deciden solas
+        coste = (estadistica.segundos + coste_supuesto) / (estadistica.intentos + 1)
+        probabilidad = (estadistica.exitos + 1) / (estadistica.intentos + 2)
+        return coste / probabilidad
+
+    def registrar(self, forma: Forma, regla: Regla, exito: bool, segundos: float) -> None:
+        """Anota un intento terminado: hasta la primera demostración o hasta agotar la regla"""
+        clave = (forma, id(regla))
+        estadistica = self.estadisticas.get(clave)
+        if estadistica is None or estadistica.regla is not regla:
+            estadistica = self.estadisticas[clave] = EstadisticaRegla(regla)
+        estadistica.intentos += 1
+        estadistica.exitos += exito
+        estadistica.segundos += segundos
+        totales = self.formas.setdefault(forma, [0, 0.0])
+        totales[0] += 1
+        totales[1] += segundos
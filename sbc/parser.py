@@ -1,24 +1,17 @@
-"""Parsers para tripletas y reglas usando pyparsing"""
-from pyparsing import Word, alphanums, Suppress, alphas, delimitedList, Optional, Regex, nums
+"""
+Parsers para tripletas y reglas usando pyparsing.
+Las gramáticas se construyen la primera vez que se usan para que importar
+el módulo (y arrancar la CLI) no pague la importación de pyparsing.
+"""
+import re
+from functools import lru_cache
+from pathlib import Path
+from types import SimpleNamespace
 from sbc.ed import Tripleta, Regla
 
-# Definir variables: cualquier string que empiece con mayuscula
-variable = Word(alphas.upper(), alphanums + '_'  + 'áéíóúñÁÉÍÓÚÑ')
-
-# Literal: empieza con minuscula
-literal = Word(alphas.lower() + nums, alphanums + '_' + 'áéíóúñÁÉÍÓÚÑ')
-
-# Termino o es literal o variable
-termino = variable | literal
-
-# Si se detecta '<-' se ignora
-flecha = Suppress('<-')
-# Si se detecta ',' se ignora (para separar multiples antecedentes)
-coma = Suppress(',')
-
-# Parser para extensión de confianza: [0.8] o [1]
-difusa = Regex(r'0\.\d+|1\.0|1')
-extension = Suppress('[') + difusa + Suppress(']')
+# Forma habitual de una línea de hechos 'S P O [0.8]', reconocida sin pyparsing
+_TERMINO = r'[A-Za-z0-9][A-Za-z0-9_áéíóúñÁÉÍÓÚÑ]*'
+_HECHO_SIMPLE = re.compile(rf'\s*({_TERMINO})\s+({_TERMINO})\s+({_TERMINO})(?:\s*\[(0\.\d+|1\.0|1)\])?\s*')
 
 def crear_tripleta(tokens)->Tripleta:
     """Convertir tokens a tripleta con confianza opcional"""
@@ -34,10 +27,42 @@ def crear_regla(tokens)->Regla:
     confianza = float(tokens[-1]) if len(tokens) > len(antecedentes) + 1 and isinstance(tokens[-1], str) else 1.0
     return Regla(consecuente, antecedentes, confianza)
 
-# Parser de tripleta con extensión opcional
-tripleta_parser = (termino + termino + termino + Optional(extension)).setParseAction(crear_tripleta)
-# Parser de regla: consecuente <- antecedente1, antecedente2, ... [confianza]
-regla_parser = (tripleta_parser + flecha + delimitedList(tripleta_parser, delim=',') + Optional(extension)).setParseAction(crear_regla)
+@lru_cache(maxsize=None)
+def gramatica() -> SimpleNamespace:
+    """Construye (una sola vez) las gramáticas de tripletas y reglas"""
+    from pyparsing import Word, alphanums, Suppress, alphas, delimitedList, Optional, Regex, nums
+
+    # Definir variables: cualquier string que empiece con mayuscula
+    variable = Word(alphas.upper(), alphanums + '_'  + 'áéíóúñÁÉÍÓÚÑ')
+
+    # Literal: empieza con minuscula
+    literal = Word(alphas.lower() + nums, alphanums + '_' + 'áéíóúñÁÉÍÓÚÑ')
+
+    # Termino o es literal o variable
+    termino = variable | literal
+
+    # Si se detecta '<-' se ignora
+    flecha = Suppress('<-')
+
+    # Parser para extensión de confianza: [0.8] o [1]
+    difusa = Regex(r'0\.\d+|1\.0|1')
+    extension = Suppress('[') + difusa + Suppress(']')
+
+    # Parser de tripleta con extensión opcional
+    tripleta_parser = (termino + termino + termino + Optional(extension)).setParseAction(crear_tripleta)
+    # Parser de regla: consecuente <- antecedente1, antecedente2, ... [confianza]
+    regla_parser = (tripleta_parser + flecha + delimitedList(tripleta_parser, delim=',') + Optional(extension)).setParseAction(crear_regla)
+    # Parser de consulta conjuntiva: tripleta1, tripleta2, ... ?
+    conjuncion_parser = delimitedList(tripleta_parser, delim=',') + Suppress('?')
+
+    return SimpleNamespace(tripleta_parser=tripleta_parser, regla_parser=regla_parser,
+                           conjuncion_parser=conjuncion_parser)
+
+def __getattr__(nombre: str):
+    """Acceso perezoso a sbc.parser.tripleta_parser y sbc.parser.regla_parser"""
+    if nombre in ('tripleta_parser', 'regla_parser', 'conjuncion_parser'):
+        return getattr(gramatica(), nombre)
+    raise AttributeError(f'module {__name__!r} has no attribute {nombre!r}')
 
 #
 # Funciones
@@ -45,20 +70,43 @@ regla_parser = (tripleta_parser + flecha + delimitedList(tripleta_parser, delim=
 
 def parsear_tripleta(input: str) -> Tripleta:
     """Parsear un string en una Tripleta"""
-    return tripleta_parser.parseString(input, parseAll=True)[0]
+    return gramatica().tripleta_parser.parseString(input, parseAll=True)[0]
+
+def parsear_tripleta_rapida(input: str) -> Tripleta:
+    """
+    Parsear una tripleta con una expresión regular (carga de ficheros grandes).
+    Las líneas con otra forma se delegan en parsear_tripleta, que da el mismo
+    resultado o el mismo error.
+    """
+    encontrado = _HECHO_SIMPLE.fullmatch(input)
+    if encontrado is None:
+        return parsear_tripleta(input)
+    sujeto, predicado, objeto, confianza = encontrado.groups()
+    return Tripleta(sujeto, predicado, objeto, float(confianza) if confianza else 1.0)
 
 def parsear_regla(input: str) -> Regla:
     """Parsear un string en una Regla"""
-    return regla_parser.parseString(input, parseAll=True)[0]
+    return gramatica().regla_parser.parseString(input, parseAll=True)[0]
+
+def parsear_conjuncion(input: str) -> list[Tripleta]:
+    """Parsear una consulta conjuntiva 'S1 P1 O1, S2 P2 O2 ?' en una lista de Tripletas"""
+    return list(gramatica().conjuncion_parser.parseString(input, parseAll=True))
 
-def parsear_consulta(input: str) -> tuple[Tripleta, str]:
+def parsear_consulta(input: str) -> tuple[Tripleta | list[Tripleta], str]:
     """
     Parsea la entrada de una consulta/comando introducida por un usuario.
     Retorna (Tripleta, tipo) donde tipo es:
     - 'consulta': consulta (termina en ?)
+    - 'conjuncion': varias tripletas separadas por comas (termina en ?); retorna una lista
     - 'hecho': agregar hecho (termina en .)
     - 'descubrir' : 'descubrir nuevos hechos (descubrir!)'
+    - 'grafo': mostrar los estratos del grafo de dependencias de las reglas (grafo!)
+    - 'materializacion': mostrar qué predicados derivados están materializados (materializacion!)
+    - 'limites': ver o cambiar los límites de la sesión (limites pasos=N ...); retorna un dict
     - 'razonar': consulta con razonamiento (empieza por 'razona si ... ?')
+    - 'importar': importar los hechos de un fichero ('importar fichero.txt'); retorna la ruta
+    - 'cuantos': número de respuestas de una consulta o conjunción ('cuantos S P O ?');
+      retorna la Tripleta o la lista de tripletas
     """
     input_usr = input.strip()
     # Separar el input en partes (lista)
@@ -72,6 +120,38 @@ def parsear_consulta(input: str) -> tuple[Tripleta, str]:
             raise ValueError('El comando "descubrir!" no lleva argumentos')
         return None, 'descubrir'
 
+    # Límites de la sesión: 'limites', 'limites pasos=1000 tiempo=2' o 'limites ninguno'
+    # ('limites tipo X ?' es una consulta normal con sujeto 'limites')
+    argumentos = [p.lower() for p in partes[1:]]
+    if partes[0].lower() == 'limites' and partes[-1] not in ('?', '.') and (
+            argumentos == ['ninguno'] or all('=' in p for p in argumentos)):
+        return parsear_limites(partes[1:]), 'limites'
+
+    # Importación de hechos: 'importar fichero.txt' (no termina en ? ni . como las consultas)
+    if partes[0].lower() == 'importar' and partes[-1] not in ('?', '.'):
+        if len(partes) != 2:
+            raise ValueError('El comando de importación debe ser: importar fichero.txt')
+        return Path(partes[1]), 'importar'
+
+    # Consultas de 'grafo!'
+    if partes[0].lower() == 'grafo!':
+        if len(partes) != 1:
+            raise ValueError('El comando "grafo!" no lleva argumentos')
+        return None, 'grafo'
+
+    # Consultas de 'materializacion!'
+    if partes[0].lower() == 'materializacion!':
+        if len(partes) != 1:
+            raise ValueError('El comando "materializacion!" no lleva argumentos')
+        return None, 'materializacion'
+
+    # Conteos: 'cuantos S P O ?' ('cuantos' con menos términos es un sujeto normal)
+    if partes[0].lower() == 'cuantos' and len(partes) >= 5:
+        consulta, tipo = parsear_consulta(' '.join(partes[1:]))
+        if tipo not in ('consulta', 'conjuncion'):
+            raise ValueError('La consulta de conteo debe ser: cuantos S P O ? o cuantos S1 P1 O1, S2 P2 O2 ?')
+        return consulta, 'cuantos'
+
     # Consultas de 'razona si'
     if input_usr.startswith('razona si'):
         # Quitando ['razona', 'si'] el resto de la lista tiene que ser de tamaño 4. 
@@ -85,6 +165,12 @@ def parsear_consulta(input: str) -> tuple[Tripleta, str]:
 
         return tripleta, 'razonar'
 
+    # Consultas conjuntivas: s1 p1 o1, s2 p2 o2 ?
+    if ',' in input_usr:
+        if partes[-1] != '?':
+            raise ValueError('La consulta conjuntiva debe ser: S1 P1 O1, S2 P2 O2, ... ?')
+        return parsear_conjuncion(input_usr), 'conjuncion'
+
     # Consultas normales: s p o ?
     if len(partes) != 4:
         raise ValueError('Formato de consulta inválido: debe ser S P O ? o S P O .')
@@ -101,3 +187,77 @@ def parsear_consulta(input: str) -> tuple[Tripleta, str]:
     tripleta = parsear_tripleta(tripleta_str)
 
     return tripleta, tipo
+
+# Nombre en la CLI -> (campo de sbc.limites.Limites, tipo del valor)
+CAMPOS_LIMITES = {
+    'pasos': ('max_pasos', int),
+    'profundidad': ('max_profundidad', int),
+    'tiempo': ('max_segundos', float),
+    'respuestas': ('max_respuestas', int),
+}
+
+def parsear_limites(partes: list[str]) -> dict[str, int | float | None]:
+    """
+    Parsea los argumentos del comando 'limites': clave=valor con las claves de
+    CAMPOS_LIMITES, 'clave=no' para quitar un límite o 'ninguno' para quitarlos todos.
+    Retorna {campo de Limites: valor} con solo los campos que cambian.
+    """
+    if [p.lower() for p in partes] == ['ninguno']:
+        return {campo: None for campo, _ in CAMPOS_LIMITES.values()}
+    cambios = {}
+    for parte in partes:
+        clave, _, valor = parte.partition('=')
+        if clave.lower() not in CAMPOS_LIMITES or not valor:
+            raise ValueError(f'Límite inválido: {parte} (usa {", ".join(CAMPOS_LIMITES)}=valor o "ninguno")')
+        campo, tipo = CAMPOS_LIMITES[clave.lower()]
+        if valor.lower() == 'no':
+            cambios[campo] = None
+            continue
+        try:
+            numero = tipo(valor)
+        except ValueError:
+            raise ValueError(f'{clave} debe ser un número positivo') from None
+        if numero <= 0:
+            raise ValueError(f'{clave} debe ser un número positivo')
+        cambios[campo] = numero
+    return cambios
+
+def parsear_paginacion(input: str) -> tuple[str, int | None, int]:
+    """
+    Separa la paginación de una consulta: 'S P O ? limit 20 offset 40'.
+    Retorna (consulta sin paginación, limite o None, desplazamiento).
+    """
+    partes = input.split()
+    limite = None
+    desplazamiento = 0
+
+    # Las palabras clave solo cuentan detrás del '?' (o '.') que cierra la consulta:
+    # 'X tiene limit ?' usa limit como término
+    cierres = [i for i, parte in enumerate(partes) if parte in ('?', '.')]
+    fin = cierres[-1] + 1 if cierres else len(partes)
+    cola = partes[fin:]
+    if not cola or cola[0].lower() not in ('limit', 'offset'):
+        return ' '.join(partes), limite, desplazamiento
+
+    # En cualquier orden
+    while cola:
+        clave, valor = cola[0].lower(), cola[1] if len(cola) > 1 else ''
+        if clave not in ('limit', 'offset'):
+            raise ValueError(f'Paginación inválida: {cola[0]} (usa S P O ? limit N offset M)')
+        if not valor.isdigit():
+            raise ValueError(f'{clave} debe ir seguido de un número entero no negativo')
+        if clave == 'limit':
+            if limite is not None:
+                raise ValueError('limit solo puede aparecer una vez')
+            limite = int(valor)
+        else:
+            if desplazamiento:
+                raise ValueError('offset solo puede aparecer una vez')
+            desplazamiento = int(valor)
+        cola = cola[2:]
+    partes = partes[:fin]
+
+    if partes[-1] != '?':
+        raise ValueError('limit y offset solo se pueden usar en consultas (S P O ? limit N offset M)')
+
+    return ' '.join(partes), limite, desplazamiento
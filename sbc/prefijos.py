@@ -0,0 +1,69 @@
+"""
+Antecedentes compartidos entre reglas.
+
+Al derivar, el evaluador (ver sbc.evaluador) pone primero el antecedente que sale
+del delta y después el resto. Muchas reglas comparten esos órdenes o su principio
+(p.ej. 'Plato ingrediente carne' sirve para marida vino_tinto, marida cerveza y
+rico_en proteina). arbol_prefijos junta los órdenes de las reglas que se evalúan
+juntas (un estrato recursivo o los no recursivos de un mismo nivel) en un árbol
+de prefijos, con las variables renombradas por orden de aparición para que
+'Plato ingrediente I' y 'P ingrediente X' sean el mismo nodo. Así cada join parcial
+se calcula una vez por ronda y lo aprovechan todas las reglas que lo comparten.
+"""
+from dataclasses import dataclass, field
+from sbc.ed import Tripleta, Regla, es_variable
+
+Terminos = tuple[str, str, str]
+
+
+@dataclass
+class Nodo:
+    """Antecedente (con variables renombradas) que extiende el prefijo del nodo padre"""
+    antecedente: Tripleta | None
+    hijos: dict[Terminos, 'Nodo'] = field(default_factory=dict)
+    # Reglas cuyo orden termina aquí, con el consecuente en las variables renombradas
+    finales: list[tuple[Regla, Terminos]] = field(default_factory=list)
+
+
+def _renombrar(tripleta: Tripleta, nombres: dict[str, str]) -> Terminos:
+    """Términos con cada variable renombrada por orden de aparición ('#' no sale del parser)"""
+    terminos = []
+    for termino in (tripleta.sujeto, tripleta.predicado, tripleta.objeto):
+        if es_variable(termino):
+            termino = nombres.setdefault(termino, f'V#{len(nombres)}')
+        terminos.append(termino)
+    return tuple(terminos)
+
+
+def arbol_prefijos(reglas: list[Regla]) -> Nodo:
+    """Raíz del árbol con un camino por regla y antecedente que puede salir del delta"""
+    raiz = Nodo(None)
+    for regla in reglas:
+        antecedentes = regla.get_antecedentes()
+        for i, antecedente in enumerate(antecedentes):
+            nombres: dict[str, str] = {}
+            nodo = raiz
+            for siguiente in [antecedente] + antecedentes[:i] + antecedentes[i + 1:]:
+                clave = _renombrar(siguiente, nombres)
+                hijo = nodo.hijos.get(clave)
+                if hijo is None:
+                    hijo = nodo.hijos[clave] = Nodo(Tripleta(*clave))
+                nodo = hijo
+            # Las variables que solo están en el consecuente se quedan como están
+            consecuente = regla.get_consecuente()
+            nodo.finales.append((regla, tuple(nombres.get(t, t) for t in
+                                              (consecuente.sujeto, consecuente.predicado, consecuente.objeto))))
+    return raiz
+
+
+def compartidos(raiz: Nodo) -> tuple[int, int]:
+    """(antecedentes de todos los órdenes, nodos del árbol): la diferencia son joins que no se repiten"""
+    antecedentes = 0
+    nodos = 0
+    pendientes = [(raiz, 0)]
+    while pendientes:
+        nodo, profundidad = pendientes.pop()
+        antecedentes += profundidad * len(nodo.finales)
+        nodos += len(nodo.hijos)
+        pendientes.extend((hijo, profundidad + 1) for hijo in nodo.hijos.values())
+    return antecedentes, nodos
@@ -1,33 +1,134 @@
 """Motor de consultas de la base de conocimiento"""
-from sbc.ed import Tripleta, Sustitucion
-from sbc.unificar import unify
+import time
+from contextlib import nullcontext
+from sbc.ed import Tripleta, Regla, Sustitucion, es_variable
+from sbc.unificar import Patron, compilar_patron, unificar_hecho, unificar_patrones
+from sbc.indice import indice_kb
+from sbc.evaluador import evaluador_kb
+from sbc.limites import Presupuesto, LimiteAlcanzado
+from sbc.maquina import valores_respuestas
+from sbc.diario import registrar_kb
+from sbc.orden_reglas import forma_de
+from sbc.conjuntos_magicos import query_magico
+from sbc.versiones import instantanea_kb
 
-def query(tripleta: Tripleta, kb: dict):
+# Selectividad supuesta de una posición ligada a una variable (valor desconocido al planificar)
+SELECTIVIDAD_VARIABLE = 0.1
+# Coste supuesto de derivar un antecedente con cada regla que puede producirlo
+COSTE_REGLA = 10
+
+def hechos_candidatos(patron: Patron, kb: dict) -> list[Tripleta]:
+    """Hechos que pueden unificar con el patrón, obtenidos del índice de la KB"""
+    return indice_kb(kb).buscar(patron)
+
+def query(tripleta: Tripleta, kb: dict, presupuesto: Presupuesto | None = None, profundidad: int = 0,
+          reglas: list[Regla] | None = None, primera: bool = False):
     """
     Consulta la base de conocimiento para todas las formas en las que se pueda satisfacer una tripleta.
     Produce una sustitución y confianza por cada match exitoso.
+    Con presupuesto cada hecho candidato y cada regla probada cuentan como un paso
+    (ver sbc.limites); puede lanzar LimiteAlcanzado.
+    Con kb['materializacion'] (ver sbc.materializacion) los predicados materializados se
+    responden desde su tabla, una vez por hecho distinto con la confianza máxima.
+    Con reglas solo se prueban esas para la tripleta (p.ej. las candidatas guardadas en
+    sbc.cache_planes); las submetas prueban siempre todas las de la KB.
+    Con primera solo interesa la primera respuesta (razonar): con kb['orden_reglas']
+    (ver sbc.orden_reglas) las reglas se prueban en el orden que antes suele tener éxito.
+    Con un almacén versionado toda la consulta lee una sola versión (ver sbc.versiones).
     """
-    # Primero, buscar en hechos directos
-    for hecho in kb['hechos']:
-        match unify(tripleta, hecho):
-            case [ss]:
+    if profundidad == 0:
+        kb = instantanea_kb(kb)
+    materializacion = kb.get('materializacion')
+    if materializacion is None:
+        yield from query_sin_tablas(tripleta, kb, presupuesto, profundidad, reglas, primera)
+        return
+
+    tabla = materializacion.tabla(tripleta, kb)
+    if tabla is not None:
+        if profundidad == 0:
+            materializacion.registrar(tripleta.predicado, None, kb)
+        patron = compilar_patron(tripleta)
+        for hecho in tabla.buscar(patron):
+            if presupuesto is not None:
+                presupuesto.paso()
+            ss = unificar_hecho(patron, hecho)
+            if ss is not None:
                 yield ss, hecho.confianza
+    elif profundidad == 0 and materializacion.derivado(tripleta.predicado, kb):
+        # El coste solo se mide si se recorren todas las derivaciones (razonar para en la primera)
+        inicio = time.perf_counter()
+        completa = False
+        try:
+            yield from query_sin_tablas(tripleta, kb, presupuesto, profundidad, reglas, primera)
+            completa = True
+        finally:
+            materializacion.registrar(tripleta.predicado, time.perf_counter() - inicio if completa else None, kb)
+    else:
+        yield from query_sin_tablas(tripleta, kb, presupuesto, profundidad, reglas, primera)
+
+def query_sin_tablas(tripleta: Tripleta, kb: dict, presupuesto: Presupuesto | None = None, profundidad: int = 0,
+                     reglas: list[Regla] | None = None, primera: bool = False):
+    """Encadenamiento hacia atrás de query: hechos de la KB y después reglas"""
+    # Clasificar la tripleta una sola vez para todas las unificaciones
+    patron = compilar_patron(tripleta)
+
+    # Primero, buscar en hechos directos
+    for hecho in hechos_candidatos(patron, kb):
+        if presupuesto is not None:
+            presupuesto.paso()
+        ss = unificar_hecho(patron, hecho)
+        if ss is not None:
+            yield ss, hecho.confianza
+
+    # Segundo, buscar en reglas (en orden adaptativo si basta la primera respuesta)
+    orden = kb.get('orden_reglas') if primera else None
+    alternativas = reglas_aplicables(patron, kb['reglas'] if reglas is None else reglas, presupuesto)
+    if orden is not None:
+        forma = forma_de(patron)
+        # sorted es estable: a igual puntuación, orden del fichero
+        alternativas = sorted(alternativas, key=lambda alternativa: orden.puntuacion(forma, alternativa[0]))
+    for regla, ss in alternativas:
+        # Límite de profundidad: se poda esta rama y se sigue con las demás
+        if presupuesto is not None and not presupuesto.puede_profundizar(profundidad):
+            continue
+        # Satisfacer TODOS los antecedentes
+        resultados = query_antecedentes(regla.get_antecedentes(), kb, ss, presupuesto, profundidad + 1, primera)
+        if orden is None:
+            for resultado_ss, confianza_ant in resultados:
+                # MIN entre la regla y los antecedentes
+                yield resultado_ss, min(regla.confianza, confianza_ant)
+            continue
+        # Cada intento se anota al demostrar la meta o al agotar la regla (no si se corta por límites)
+        inicio = time.perf_counter()
+        exito = completa = False
+        try:
+            for resultado_ss, confianza_ant in resultados:
+                exito = True
+                yield resultado_ss, min(regla.confianza, confianza_ant)
+            completa = True
+        finally:
+            if exito or completa:
+                orden.registrar(forma, regla, exito, time.perf_counter() - inicio)
 
-    # Segundo, buscar en reglas
-    for regla in kb['reglas']:
+def reglas_aplicables(patron: Patron, reglas: list[Regla], presupuesto: Presupuesto | None):
+    """
+    (regla, sustitución) de las reglas cuyo consecuente unifica con el patrón, en orden.
+    Es un generador que query recorre en un bucle: no añade un nivel a la pila en cada submeta.
+    """
+    for regla in reglas:
+        if presupuesto is not None:
+            presupuesto.paso()
         # Prueba a unificar con el consecuente
-        match unify(tripleta, regla.get_consecuente()):
-            case [ss]:
-                # Satisfacer TODOS los antecedentes
-                for resultado_ss, confianza_ant in query_antecedentes(regla.get_antecedentes(), kb, ss):
-                    # MIN entre la regla y los antecedentes
-                    confianza_total = min(regla.confianza, confianza_ant)
-                    yield resultado_ss, confianza_total
+        ss = unificar_patrones(patron, compilar_patron(regla.get_consecuente()))
+        if ss is not None:
+            yield regla, ss
 
-def query_antecedentes(antecedentes: list[Tripleta], kb: dict, ss_inicial: Sustitucion):
+def query_antecedentes(antecedentes: list[Tripleta], kb: dict, ss_inicial: Sustitucion,
+                       presupuesto: Presupuesto | None = None, profundidad: int = 0, primera: bool = False):
     """
     Satisface TODOS los antecedentes de una regla recursivamente.
     Devuelve sustitución y confianza mínima de todos los antecedentes.
+    primera como en query (cambia el orden de las respuestas, no cuáles son).
     """
     # CASO BASE
     # Si no hay más antecedentes, hemos terminado todas las comprobaciones
@@ -46,59 +147,229 @@ def query_antecedentes(antecedentes: list[Tripleta], kb: dict, ss_inicial: Susti
 
     # Crea todas las combinaciones posibles
     # Consultar el primer antecedente
-    for ss_primer, confianza_primer in query(primer_antecedente_ss, kb):
+    # Sin materialización se llama directamente a query_sin_tablas: un generador menos por nivel de
+    # la demostración, así que se alcanzan derivaciones igual de profundas que sin sbc.materializacion
+    consultar = query if 'materializacion' in kb else query_sin_tablas
+    for ss_primer, confianza_primer in consultar(primer_antecedente_ss, kb, presupuesto, profundidad,
+                                                 primera=primera):
         # Combinar sustituciones
         merged = Sustitucion(ss_inicial.get_mappings().copy())
         merged.get_mappings().update(ss_primer.get_mappings())
 
         # Recursivamente satisfacer el resto de antecedentes
-        for ss_resto, confianza_resto in query_antecedentes(resto_antecedentes, kb, merged):
+        for ss_resto, confianza_resto in query_antecedentes(resto_antecedentes, kb, merged, presupuesto, profundidad,
+                                                            primera):
             # MIN de todas las confianzas (AND)
             confianza_total = min(confianza_primer, confianza_resto)
             yield ss_resto, confianza_total
             
-def descubrir(kb: dict) -> list[Tripleta]:
+def reglas_candidatas(patron: Patron, kb: dict) -> list[Regla]:
+    """Reglas cuyo consecuente unifica con el patrón (las que lo pueden derivar)"""
+    return [regla for regla in kb['reglas']
+            if unificar_patrones(patron, compilar_patron(regla.get_consecuente())) is not None]
+
+def estimar_coste(tripleta: Tripleta, ligadas: set[str], kb: dict) -> float:
+    """
+    Estimación del número de resultados de un antecedente sabiendo qué variables
+    estarán ligadas: cardinalidad del índice para sus literales, reducida por cada
+    variable ya ligada, más un coste fijo por cada regla que lo puede derivar.
+    """
+    patron = compilar_patron(tripleta)
+    coste = indice_kb(kb).cardinalidad(patron)
+    coste *= SELECTIVIDAD_VARIABLE ** sum(1 for _, v in patron.variables if v in ligadas)
+    return coste + COSTE_REGLA * len(reglas_candidatas(patron, kb))
+
+def planificar(tripletas: list[Tripleta], kb: dict) -> list[Tripleta]:
+    """
+    Ordena los antecedentes de una consulta conjuntiva de forma voraz: en cada paso el
+    más selectivo dadas las variables ya ligadas, así las variables compartidas se ligan pronto.
+    """
+    pendientes = list(tripletas)
+    plan = []
+    ligadas: set[str] = set()
+    while pendientes:
+        # A igualdad de coste se respeta el orden escrito por el usuario
+        siguiente = min(pendientes, key=lambda t: estimar_coste(t, ligadas, kb))
+        pendientes.remove(siguiente)
+        plan.append(siguiente)
+        ligadas.update(t for t in siguiente.terminos() if es_variable(t))
+    return plan
+
+def query_conjuncion(tripletas: list[Tripleta], kb: dict, presupuesto: Presupuesto | None = None):
+    """
+    Consulta conjuntiva (A, B, C ?) ejecutada como un único plan.
+    Produce una sustitución y la confianza mínima de todos los antecedentes por cada match.
+    """
+    yield from query_antecedentes(planificar(tripletas, kb), kb, Sustitucion(), presupuesto)
+
+def respuestas(tripleta: Tripleta | list[Tripleta], kb: dict, limite: int | None = None,
+               desplazamiento: int = 0, presupuesto: Presupuesto | None = None,
+               pila: bool = False, plan: list[Tripleta] | None = None,
+               reglas: list[Regla] | None = None, magico: bool = False) -> list[tuple[tuple[str, ...], float]]:
+    """
+    Respuestas distintas de una consulta (o de una lista de tripletas, conjuntiva):
+    (valores de las variables, confianza).
+    Sin limite se recorren todas las derivaciones y se toma la confianza máxima.
+    Con limite se deja de buscar en cuanto hay desplazamiento + limite respuestas distintas,
+    así que la confianza es la máxima entre las derivaciones exploradas hasta entonces.
+    Con presupuesto se retornan las respuestas encontradas antes de agotarlo
+    (presupuesto.truncado indica el motivo); max_respuestas cuenta respuestas distintas.
+    Con pila se usa el motor iterativo de sbc.maquina (mismas respuestas, sin límite de recursión).
+    plan (orden de la conjunción) y reglas (candidatas de la tripleta) evitan recalcularlos
+    si ya se conocen (ver sbc.cache_planes); las variables siguen el orden escrito.
+    Con magico una tripleta se evalúa hacia delante con conjuntos mágicos (ver
+    sbc.conjuntos_magicos): mismas respuestas, una derivación por hecho.
+    Con un almacén versionado se lee una sola versión aunque otro hilo escriba.
+    """
+    kb = instantanea_kb(kb)
+    tripletas = tripleta if isinstance(tripleta, list) else [tripleta]
+    variables = list(dict.fromkeys(t for t in tripletas for t in t.terminos() if es_variable(t)))
+    conjuncion = isinstance(tripleta, list)
+    if conjuncion and plan is None:
+        plan = planificar(tripletas, kb)
+    if pila:
+        resultados = valores_respuestas(plan if conjuncion else tripletas, variables, kb, presupuesto, conjuncion)
+    else:
+        if conjuncion:
+            resultados = query_antecedentes(plan, kb, Sustitucion(), presupuesto)
+        elif magico:
+            resultados = query_magico(tripleta, kb, presupuesto)
+        else:
+            resultados = query(tripleta, kb, presupuesto, reglas=reglas)
+        resultados = ((tuple(ss.aplicar(v) for v in variables), confianza) for ss, confianza in resultados)
+    valores_dict = {}
+    objetivo = None if limite is None else desplazamiento + limite
+
+    maximo = None if presupuesto is None else presupuesto.limites.max_respuestas
+
+    if objetivo != 0:
+        try:
+            for valores, confianza in resultados:
+                if valores not in valores_dict:
+                    if maximo is not None and len(valores_dict) >= maximo:
+                        presupuesto.truncado = 'max_respuestas'
+                        break
+                    valores_dict[valores] = confianza
+                    # Terminación temprana: no hace falta seguir buscando
+                    if objetivo is not None and len(valores_dict) >= objetivo:
+                        break
+                elif confianza > valores_dict[valores]:
+                    valores_dict[valores] = confianza
+        except LimiteAlcanzado:
+            pass
+        except RecursionError:
+            if presupuesto is None:
+                raise
+            presupuesto.truncado = 'recursion'
+
+    return list(valores_dict.items())[desplazamiento:objetivo]
+
+def contar(tripleta: Tripleta | list[Tripleta], kb: dict, presupuesto: Presupuesto | None = None,
+           plan: list[Tripleta] | None = None, reglas: list[Regla] | None = None) -> int:
+    """
+    Número de respuestas distintas de una consulta o conjunción (len(respuestas(...))).
+    Si ninguna regla puede derivar la tripleta, o su predicado está materializado, se
+    responde con el índice (ver Indice.contar);
+    si no, se cuentan los valores distintos de las variables durante la evaluación con
+    el motor de sbc.maquina, sin construir sustituciones.
+    Con presupuesto se retorna lo contado antes de agotarlo; max_respuestas no se aplica.
+    plan y reglas como en respuestas.
+    """
+    kb = instantanea_kb(kb)
+    conjuncion = isinstance(tripleta, list)
+    materializacion = kb.get('materializacion')
+    if not conjuncion and materializacion is not None:
+        tabla = materializacion.tabla(tripleta, kb)
+        total = None if tabla is None else tabla.contar(compilar_patron(tripleta))
+        if total is not None:
+            return total
+    if not conjuncion:
+        patron = compilar_patron(tripleta)
+        contar_indice = getattr(indice_kb(kb), 'contar', None)
+        if reglas is None:
+            reglas = reglas_candidatas(patron, kb)
+        if contar_indice is not None and not reglas:
+            total = contar_indice(patron)
+            if total is not None:
+                return total
+
+    tripletas = (plan or planificar(tripleta, kb)) if conjuncion else [tripleta]
+    variables = list(dict.fromkeys(t for t in tripletas for t in t.terminos() if es_variable(t)))
+    distintos = set()
+    try:
+        for valores, _ in valores_respuestas(tripletas, variables, kb, presupuesto, conjuncion):
+            distintos.add(valores)
+    except LimiteAlcanzado:
+        pass
+    except RecursionError:
+        if presupuesto is None:
+            raise
+        presupuesto.truncado = 'recursion'
+    return len(distintos)
+
+def descubrir(kb: dict, presupuesto: Presupuesto | None = None, max_pendientes: int | None = None) -> list[Tripleta]:
     """
     Encadenamiento hacia delante: descubre nuevos hechos aplicando reglas.
     Retorna la lista de nuevos hechos descubiertos y los agrega a la KB.
+    Las reglas se evalúan por estratos (ver sbc.evaluador): solo se recalcula lo que
+    depende de hechos añadidos desde el último 'descubrir'.
+    Con presupuesto se agregan y retornan los hechos derivados antes de agotarlo.
+    Con max_pendientes la evaluación se hace en disco, en un SQLite temporal (ver
+    sbc.almacen_sqlite.descubrir_en_disco): además de la KB solo hay en memoria lotes
+    de max_pendientes hechos, pero se recalcula todo en vez de solo lo añadido.
+    El almacén SQLite aplica el presupuesto por sentencia; los fragmentos no lo aplican.
+    Con kb['diario'] los hechos derivados se registran en el diario (ver sbc.diario).
     """
-    nuevos_hechos = []
+    # Almacenes con motor propio (p.ej. SQLite) evalúan las reglas ellos mismos
+    descubrir_almacen = getattr(kb['hechos'], 'descubrir', None)
+    if descubrir_almacen is not None:
+        opciones = {}
+        if presupuesto is not None:
+            opciones['presupuesto'] = presupuesto
+        if max_pendientes is not None:
+            opciones['max_pendientes'] = max_pendientes
+        return descubrir_almacen(kb['reglas'], **opciones)
 
-    for regla in kb['reglas']:
-        for ss, confianza in query_antecedentes(regla.get_antecedentes(), kb, Sustitucion()):
-            # Aplicar sustitución al consecuente
-            nuevo_hecho = regla.get_consecuente().aplicar_sustitucion(ss)
-            # Asignar la confianza calculada
-            nuevo_hecho.confianza = confianza
-            
-            # Verificar que no exista ya en la KB
-            if nuevo_hecho not in kb['hechos']:
-                # MAX (OR): Si ya está en nuevos_hechos, quedarse con el de mayor confianza
-                encontrado = False
-                i = 0
-                while i < len(nuevos_hechos):
-                    if unify(nuevos_hechos[i], nuevo_hecho):
-                        if nuevo_hecho.confianza > nuevos_hechos[i].confianza:
-                            nuevos_hechos[i] = nuevo_hecho
-                        encontrado = True
-                        i = len(nuevos_hechos)  # Salir
-                    else:
-                        i += 1
-                if not encontrado:
-                    nuevos_hechos.append(nuevo_hecho)
-
-    # Agregar a la KB
-    kb['hechos'].extend(nuevos_hechos)
-
-    return nuevos_hechos
-
-def razonar(tripleta: Tripleta, kb: dict) -> bool:
+    # Almacenes versionados: un solo escritor durante todo el encadenamiento
+    escritura = getattr(kb['hechos'], 'escritura', nullcontext)
+    with escritura():
+        if max_pendientes is not None:
+            # Importación perezosa: sqlite3 solo se carga si se usa
+            from sbc.almacen_sqlite import descubrir_en_disco
+            nuevos = descubrir_en_disco(kb, presupuesto, max_pendientes)
+        else:
+            nuevos = evaluador_kb(kb).descubrir(kb, presupuesto)
+        registrar_kb(kb, nuevos, derivados=True)
+    return nuevos
+
+def razonar(tripleta: Tripleta, kb: dict, presupuesto: Presupuesto | None = None, pila: bool = False,
+            reglas: list[Regla] | None = None, magico: bool = False) -> bool:
     """
     Realiza encadenamiento hacia atrás.
     Retorna True si la tripleta puede demostrarse, False en caso contrario.
+    Con presupuesto, False con presupuesto.truncado significa que no se ha podido demostrar
+    dentro de los límites.
+    Con pila se usa el motor iterativo de sbc.maquina; si no, reglas como en query y,
+    con kb['orden_reglas'], las reglas en orden adaptativo (ver sbc.orden_reglas).
+    Con magico se evalúa hacia delante con conjuntos mágicos, como en respuestas.
     """
-    # Si hay algún caso que lo satisface, retorna True
-    for _, _ in query(tripleta, kb):
-        return True
-    
+    kb = instantanea_kb(kb)
+    if pila:
+        # Solo importa si hay respuesta: no se construye ninguna sustitución
+        resultados = valores_respuestas([tripleta], [], kb, presupuesto)
+    elif magico:
+        resultados = query_magico(tripleta, kb, presupuesto)
+    else:
+        resultados = query(tripleta, kb, presupuesto, reglas=reglas, primera=True)
+    try:
+        # Si hay algún caso que lo satisface, retorna True
+        for _, _ in resultados:
+            return True
+    except LimiteAlcanzado:
+        pass
+    except RecursionError:
+        if presupuesto is None:
+            raise
+        presupuesto.truncado = 'recursion'
+
     return False
\ No newline at end of file
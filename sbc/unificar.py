@@ -1,3 +1,5 @@
+from dataclasses import dataclass
+from functools import lru_cache
 from sbc.ed import Tripleta, Sustitucion, es_literal
 
 def ocurre(var: str, term: str, ss: Sustitucion) -> bool:
@@ -89,4 +91,93 @@ def unify(x: Tripleta, y: Tripleta, ss: Sustitucion | None = None) -> list[Susti
     if ss is None:
         return []
 
-    return [ss]
\ No newline at end of file
+    return [ss]
+
+#
+# Camino rápido: tripletas planas precompiladas
+#
+# Los términos del lenguaje son siempre átomos, así que el occurs-check nunca
+# puede fallar y basta con desreferenciar variables. Los patrones se clasifican
+# una sola vez (literal/variable por posición) para no llamar a isupper() en
+# cada unificación.
+
+@dataclass(frozen=True, slots=True)
+class Patron:
+    """Tripleta precompilada: posiciones literales y posiciones variables"""
+    terminos: tuple[str, str, str]
+    literales: tuple[tuple[int, str], ...]
+    variables: tuple[tuple[int, str], ...]
+    nombres_variables: frozenset[str]
+
+
+@lru_cache(maxsize=4096)
+def _compilar(sujeto: str, predicado: str, objeto: str) -> Patron:
+    terminos = (sujeto, predicado, objeto)
+    literales = tuple((i, t) for i, t in enumerate(terminos) if es_literal(t))
+    variables = tuple((i, t) for i, t in enumerate(terminos) if not es_literal(t))
+    return Patron(terminos, literales, variables, frozenset(v for _, v in variables))
+
+
+def compilar_patron(tripleta: Tripleta) -> Patron:
+    """Precompila una tripleta (el resultado se cachea por sus términos)"""
+    return _compilar(tripleta.sujeto, tripleta.predicado, tripleta.objeto)
+
+
+def unificar_hecho(patron: Patron, hecho: Tripleta) -> Sustitucion | None:
+    """
+    Unifica un patrón precompilado con un hecho base.
+    Equivale a unify(patron, hecho) pero retorna la Sustitucion o None.
+    Si el hecho contiene variables se delega en unify.
+    """
+    terminos = (hecho.sujeto, hecho.predicado, hecho.objeto)
+    # Primero los literales: descartan casi todos los hechos sin crear nada
+    for pos, literal in patron.literales:
+        termino = terminos[pos]
+        if termino != literal:
+            if termino[:1].isupper():
+                return _unificar_general(patron, hecho)
+            return None
+
+    mappings = {}
+    for pos, var in patron.variables:
+        termino = terminos[pos]
+        if termino[:1].isupper():
+            return _unificar_general(patron, hecho)
+        previo = mappings.get(var)
+        if previo is None:
+            mappings[var] = termino
+        elif previo != termino:
+            return None
+    return Sustitucion(mappings)
+
+
+def unificar_patrones(x: Patron, y: Patron) -> Sustitucion | None:
+    """
+    Unifica dos patrones precompilados (p.ej. consulta y consecuente de una regla).
+    Mismo resultado que unify(x, y) pero iterativo y sin occurs-check.
+    """
+    variables = x.nombres_variables | y.nombres_variables
+    mappings = {}
+    for t1, t2 in zip(x.terminos, y.terminos):
+        # Desreferenciar: solo las variables son claves de mappings
+        while t1 in mappings:
+            t1 = mappings[t1]
+        while t2 in mappings:
+            t2 = mappings[t2]
+        if t1 == t2:
+            continue
+        if t1 in variables:
+            mappings[t1] = t2
+        elif t2 in variables:
+            mappings[t2] = t1
+        else:
+            return None
+    return Sustitucion(mappings)
+
+
+def _unificar_general(patron: Patron, hecho: Tripleta) -> Sustitucion | None:
+    """Camino lento para hechos que no son base"""
+    match unify(Tripleta(*patron.terminos), hecho):
+        case [ss]:
+            return ss
+    return None
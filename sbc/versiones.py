@@ -0,0 +1,247 @@
+"""
+Almacén de hechos multiversión (MVCC): lecturas sin cerrojos durante las escrituras.
+
+HechosVersionados se comporta como la lista kb['hechos'], pero cada escritura
+(append, extend, eliminar, hechos[:] = ...) publica una versión nueva de una vez:
+    - los hechos se añaden a un registro que solo crece, con la versión en la que
+      aparecen (alta) y, si se quitan, la versión en la que desaparecen (baja)
+    - los índices guardan posiciones del registro, en orden creciente
+    - la versión publicada se cambia al final, con una sola asignación
+Un lector fija una versión con instantanea() (o instantanea_kb) y ve siempre los
+mismos hechos aunque otro hilo siga escribiendo: los hechos de versiones posteriores
+quedan detrás de su límite en el registro y en cada índice, así que no hace falta cerrojo.
+Los escritores se serializan con un cerrojo; escritura() lo mantiene durante
+operaciones largas como 'descubrir'.
+"""
+import threading
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from contextlib import contextmanager
+from sbc.ed import Tripleta, es_variable
+from sbc.unificar import Patron
+
+POSICIONES = ((0,), (1,), (2,), (0, 1), (1, 2), (0, 2), (0, 1, 2))
+
+
+class Instantanea:
+    """Hechos de una versión fija de un HechosVersionados (solo lectura)"""
+
+    def __init__(self, almacen: 'HechosVersionados', version: int):
+        self.almacen = almacen
+        self.version = version
+        # Los hechos de la versión están en las primeras 'limite' posiciones del registro
+        self.limite = almacen._longitudes[version]
+        # Hechos quitados hasta esta versión
+        self.n_bajas = bisect_right(almacen._versiones_bajas, version)
+
+    def visible(self, posicion: int) -> bool:
+        if not self.n_bajas:
+            return True
+        baja = self.almacen._bajas.get(posicion)
+        return baja is None or baja > self.version
+
+    def _hechos(self, posiciones) -> list[Tripleta]:
+        registro = self.almacen._registro
+        if not self.n_bajas:
+            return [registro[i] for i in posiciones]
+        return [registro[i] for i in posiciones if self.visible(i)]
+
+    def __iter__(self):
+        """Recorre el registro hasta el límite de la versión, sin copiarlo"""
+        registro = self.almacen._registro
+        if not self.n_bajas:
+            for i in range(self.limite):
+                yield registro[i]
+            return
+        for i in range(self.limite):
+            if self.visible(i):
+                yield registro[i]
+
+    def __len__(self) -> int:
+        return self.limite - self.n_bajas
+
+    def __getitem__(self, indice):
+        if self.n_bajas:
+            return self.lista()[indice]
+        # Sin bajas los hechos de la versión son un prefijo del registro: no hace falta copiarlo
+        registro = self.almacen._registro
+        if isinstance(indice, slice):
+            return [registro[i] for i in range(*indice.indices(self.limite))]
+        if not -self.limite <= indice < self.limite:
+            raise IndexError('índice fuera de rango')
+        return registro[indice % self.limite]
+
+    def __contains__(self, hecho: Tripleta) -> bool:
+        """Mismo criterio que la lista: mismos términos y misma confianza"""
+        return any(h == hecho for h in self.buscar_terminos(tuple(hecho)))
+
+    def lista(self) -> list[Tripleta]:
+        """Copia de los hechos de la versión en orden de inserción"""
+        return list(self)
+
+    def _posiciones(self, patron: Patron) -> list[int]:
+        posiciones = tuple(pos for pos, _ in patron.literales)
+        clave = tuple(literal for _, literal in patron.literales)
+        tabla = self.almacen._tablas[posiciones].get(clave, [])
+        return tabla[:bisect_left(tabla, self.limite)]
+
+    def buscar(self, patron: Patron) -> list[Tripleta]:
+        """Hechos candidatos para el patrón, como Indice.buscar"""
+        if not patron.literales:
+            # Sin bajas la propia instantánea es una secuencia (len, [i]) que no copia el registro
+            return self.lista() if self.n_bajas else self
+        no_base = self.almacen._no_base
+        return self._hechos(self._posiciones(patron) + no_base[:bisect_left(no_base, self.limite)])
+
+    def buscar_terminos(self, terminos: tuple[str, str, str]) -> list[Tripleta]:
+        if any(es_variable(t) for t in terminos):
+            no_base = self.almacen._no_base
+            return [h for h in self._hechos(no_base[:bisect_left(no_base, self.limite)])
+                    if tuple(h) == terminos]
+        tabla = self.almacen._tablas[(0, 1, 2)].get(terminos, [])
+        return self._hechos(tabla[:bisect_left(tabla, self.limite)])
+
+    def cardinalidad(self, patron: Patron) -> int:
+        """Cota del número de candidatos (cuenta los hechos quitados en versiones anteriores)"""
+        if not patron.literales:
+            return len(self)
+        no_base = self.almacen._no_base
+        return len(self._posiciones(patron)) + bisect_left(no_base, self.limite)
+
+
+class HechosVersionados:
+    """Hechos multiversión: escrituras que publican versiones y lecturas sobre instantáneas"""
+
+    def __init__(self, hechos=()):
+        self._cerrojo = threading.RLock()
+        # Todos los hechos escritos alguna vez, en orden (solo crece)
+        self._registro: list[Tripleta] = []
+        # Longitud del registro en cada versión publicada
+        self._longitudes: list[int] = [0]
+        # Posición -> versión en la que se quitó, y esas versiones en orden (para contar)
+        self._bajas: dict[int, int] = {}
+        self._versiones_bajas: list[int] = []
+        # Posiciones del registro por cada combinación de posiciones ligadas (como Indice)
+        self._tablas: dict[tuple[int, ...], defaultdict] = {p: defaultdict(list) for p in POSICIONES}
+        self._no_base: list[int] = []
+        self.version = 0
+        if hechos:
+            self.extend(hechos)
+
+    def instantanea(self) -> Instantanea:
+        """Fija la última versión publicada"""
+        return Instantanea(self, self.version)
+
+    @contextmanager
+    def escritura(self):
+        """Reserva el almacén para un escritor durante varias operaciones"""
+        with self._cerrojo:
+            yield self
+
+    # Lectura: sobre la última versión publicada
+
+    def __iter__(self):
+        return iter(self.instantanea())
+
+    def __len__(self) -> int:
+        return len(self.instantanea())
+
+    def __getitem__(self, indice):
+        return self.instantanea()[indice]
+
+    def __contains__(self, hecho: Tripleta) -> bool:
+        return hecho in self.instantanea()
+
+    def buscar(self, patron: Patron) -> list[Tripleta]:
+        return self.instantanea().buscar(patron)
+
+    def cardinalidad(self, patron: Patron) -> int:
+        return self.instantanea().cardinalidad(patron)
+
+    # Escritura: cada operación publica una versión
+
+    def _publicar(self, version: int) -> None:
+        self._longitudes.append(len(self._registro))
+        # Hasta aquí ningún lector ve los cambios de esta versión
+        self.version = version
+
+    def _agregar(self, hecho: Tripleta) -> None:
+        posicion = len(self._registro)
+        self._registro.append(hecho)
+        s, p, o = hecho.sujeto, hecho.predicado, hecho.objeto
+        if es_variable(s) or es_variable(p) or es_variable(o):
+            self._no_base.append(posicion)
+            return
+        claves = ((s,), (p,), (o,), (s, p), (p, o), (s, o), (s, p, o))
+        for tabla, clave in zip(self._tablas.values(), claves):
+            tabla[clave].append(posicion)
+
+    def _quitar(self, hecho: Tripleta, version: int) -> bool:
+        """Marca como quitado el hecho (el mismo objeto) en la versión; False si no está"""
+        terminos = (hecho.sujeto, hecho.predicado, hecho.objeto)
+        if any(es_variable(t) for t in terminos):
+            posiciones = self._no_base
+        else:
+            posiciones = self._tablas[(0, 1, 2)].get(terminos, ())
+        for posicion in posiciones:
+            if self._registro[posicion] is hecho and posicion not in self._bajas:
+                self._bajas[posicion] = version
+                self._versiones_bajas.append(version)
+                return True
+        return False
+
+    def append(self, hecho: Tripleta) -> None:
+        self.extend([hecho])
+
+    def extend(self, hechos) -> None:
+        """Agrega los hechos en una sola versión"""
+        with self._cerrojo:
+            version = self.version + 1
+            for hecho in hechos:
+                self._agregar(hecho)
+            self._publicar(version)
+
+    def eliminar(self, hecho: Tripleta) -> None:
+        """Quita un hecho (el mismo objeto que se agregó) en una versión nueva"""
+        with self._cerrojo:
+            version = self.version + 1
+            if not self._quitar(hecho, version):
+                raise ValueError(f'No existe el hecho: {" ".join(hecho)}')
+            self._publicar(version)
+
+    def __delitem__(self, indice: int) -> None:
+        """del hechos[i] (así quita DRed un hecho base)"""
+        self.eliminar(self[indice])
+
+    def __setitem__(self, indice, hechos) -> None:
+        """
+        hechos[:] = nuevos (como hace 'descubrir' al retirar derivados): en una sola versión
+        se quitan los hechos que no están en nuevos y se agregan los que faltan.
+        """
+        if indice != slice(None):
+            raise TypeError('Solo se admite sustituir todos los hechos: hechos[:] = ...')
+        with self._cerrojo:
+            version = self.version + 1
+            nuevos = list(hechos)
+            conservados = {id(h) for h in nuevos}
+            actuales = self.instantanea().lista()
+            for hecho in actuales:
+                if id(hecho) not in conservados:
+                    self._quitar(hecho, version)
+            presentes = {id(h) for h in actuales}
+            for hecho in nuevos:
+                if id(hecho) not in presentes:
+                    self._agregar(hecho)
+            self._publicar(version)
+
+
+def instantanea_kb(kb: dict) -> dict:
+    """
+    KB de solo lectura fijada en la versión actual: las consultas sobre ella no ven
+    las escrituras posteriores. Conserva el resto de claves de la KB (materialización,
+    orden de reglas...). Sin almacén versionado (o si ya está fijada) se retorna la misma KB.
+    """
+    instantanea = getattr(kb['hechos'], 'instantanea', None)
+    if instantanea is None:
+        return kb
+    return {**kb, 'hechos': instantanea(), 'reglas': list(kb['reglas'])}
@@ -0,0 +1,174 @@
+"""
+Modo vigilancia: recarga incremental de los ficheros de la KB.
+
+VigilanteKB comprueba por sondeo la fecha de modificación de los ficheros de
+hechos y reglas. Si alguno cambia, compara sus líneas con las cargadas y aplica
+a la KB en uso solo las altas y bajas:
+    - hechos: se agregan o quitan de kb['hechos'] (el índice se reconstruye si hay bajas)
+    - reglas: se agregan o quitan de kb['reglas'] manteniendo el orden del fichero
+Si ya se ha ejecutado 'descubrir', los hechos derivados se actualizan de forma
+incremental con el evaluador de sbc.evaluador (DRed para las bajas), y las
+tablas materializadas (sbc.materializacion) se descartan si hay bajas.
+"""
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from sbc.ed import Tripleta, Regla
+from sbc.cargar_kb import leer_lineas
+from sbc.parser import parsear_tripleta, parsear_regla
+
+
+def firma(fichero: Path) -> tuple[int, int] | None:
+    """Fecha de modificación y tamaño de un fichero (None si no existe)"""
+    try:
+        estado = fichero.stat()
+    except FileNotFoundError:
+        return None
+    return estado.st_mtime_ns, estado.st_size
+
+
+def diferencia(anteriores: list[str], nuevas: list[str]) -> tuple[list[str], list[str]]:
+    """
+    Líneas agregadas (en el orden del fichero nuevo) y eliminadas entre dos versiones.
+    Las líneas repetidas cuentan tantas veces como aparecen.
+    """
+    agregadas = Counter(nuevas) - Counter(anteriores)
+    eliminadas = Counter(anteriores) - Counter(nuevas)
+    resultado_agregadas = []
+    for linea in nuevas:
+        if agregadas[linea] > 0:
+            agregadas[linea] -= 1
+            resultado_agregadas.append(linea)
+    return resultado_agregadas, list(eliminadas.elements())
+
+
+@dataclass
+class Cambios:
+    """Resumen de una recarga"""
+    hechos_agregados: list[Tripleta] = field(default_factory=list)
+    hechos_eliminados: list[Tripleta] = field(default_factory=list)
+    reglas_agregadas: list[Regla] = field(default_factory=list)
+    reglas_eliminadas: list[Regla] = field(default_factory=list)
+    # Hechos derivados que se han retirado o (re)agregado al mantener 'descubrir'
+    derivados_retirados: list[tuple[str, str, str]] = field(default_factory=list)
+    derivados_agregados: list[Tripleta] = field(default_factory=list)
+
+    def predicados(self) -> set[str]:
+        """Predicados cuyos hechos han cambiado (para invalidar caches)"""
+        return ({h.predicado for h in self.hechos_agregados + self.hechos_eliminados + self.derivados_agregados}
+                | {clave[1] for clave in self.derivados_retirados})
+
+    def resumen(self) -> str:
+        partes = [
+            f'+{len(self.hechos_agregados)} -{len(self.hechos_eliminados)} hechos',
+            f'+{len(self.reglas_agregadas)} -{len(self.reglas_eliminadas)} reglas',
+        ]
+        if self.derivados_agregados or self.derivados_retirados:
+            partes.append(f'+{len(self.derivados_agregados)} -{len(self.derivados_retirados)} derivados')
+        return 'KB recargada: ' + ', '.join(partes)
+
+
+class VigilanteKB:
+    """Recarga incremental de los ficheros de una KB ya cargada con carga_kb"""
+
+    def __init__(self, kb: dict, fichero_hechos: Path, fichero_reglas: Path):
+        self.kb = kb
+        self.fichero_hechos = Path(fichero_hechos)
+        self.fichero_reglas = Path(fichero_reglas)
+        self.firma_hechos = firma(self.fichero_hechos)
+        self.firma_reglas = firma(self.fichero_reglas)
+        self.lineas_hechos = leer_lineas(self.fichero_hechos)
+        self.lineas_reglas = leer_lineas(self.fichero_reglas)
+        # carga_kb crea las reglas en el orden del fichero: línea -> objetos Regla de la KB
+        self.reglas_por_linea: dict[str, list[Regla]] = {}
+        for linea, regla in zip(self.lineas_reglas, kb['reglas']):
+            self.reglas_por_linea.setdefault(linea, []).append(regla)
+
+    def comprobar(self) -> Cambios | None:
+        """
+        Comprueba si los ficheros han cambiado y aplica las diferencias a la KB.
+        Retorna los cambios o None si no se ha modificado nada.
+        Si una línea nueva no se puede parsear se lanza el error sin tocar la KB.
+        """
+        firma_hechos = firma(self.fichero_hechos)
+        firma_reglas = firma(self.fichero_reglas)
+        if firma_hechos == self.firma_hechos and firma_reglas == self.firma_reglas:
+            return None
+
+        lineas_hechos = leer_lineas(self.fichero_hechos) if firma_hechos != self.firma_hechos else self.lineas_hechos
+        lineas_reglas = leer_lineas(self.fichero_reglas) if firma_reglas != self.firma_reglas else self.lineas_reglas
+        hechos_agregados, hechos_eliminados = diferencia(self.lineas_hechos, lineas_hechos)
+        reglas_agregadas, reglas_eliminadas = diferencia(self.lineas_reglas, lineas_reglas)
+
+        # Parsear todo antes de modificar nada
+        cambios = Cambios(
+            hechos_agregados=[parsear_tripleta(linea) for linea in hechos_agregados],
+            hechos_eliminados=[parsear_tripleta(linea) for linea in hechos_eliminados],
+        )
+        nuevas_reglas = [(linea, parsear_regla(linea)) for linea in reglas_agregadas]
+
+        # Orden: bajas de hechos con las reglas antiguas, cambio de reglas y altas de hechos
+        evaluador = self.kb.get('evaluador')
+        if evaluador is not None and self.kb['hechos'] is not evaluador.origen:
+            evaluador = None
+        self._eliminar_hechos(cambios, evaluador)
+        self._aplicar_reglas(lineas_reglas, reglas_eliminadas, nuevas_reglas, cambios, evaluador)
+        self._agregar_hechos(cambios, evaluador)
+        # Las tablas materializadas solo siguen las altas de hechos: con bajas se descartan
+        materializacion = self.kb.get('materializacion')
+        if materializacion is not None and (cambios.hechos_eliminados or cambios.derivados_retirados):
+            materializacion.invalidar()
+
+        self.firma_hechos, self.firma_reglas = firma_hechos, firma_reglas
+        self.lineas_hechos, self.lineas_reglas = lineas_hechos, lineas_reglas
+        return cambios
+
+    def _eliminar_hechos(self, cambios: Cambios, evaluador) -> None:
+        """Quita hechos de la KB; con evaluador también retira los derivados que dependían de ellos"""
+        if not cambios.hechos_eliminados:
+            return
+        kb = self.kb
+        if evaluador is not None:
+            retirados, agregados = evaluador.eliminar_hechos(kb, cambios.hechos_eliminados)
+            cambios.derivados_retirados.extend(retirados)
+            cambios.derivados_agregados.extend(agregados)
+            return
+
+        hechos = kb['hechos']
+        eliminar = getattr(hechos, 'eliminar', None)
+        if eliminar is None and not isinstance(hechos, list):
+            raise ValueError('El almacén de hechos no permite eliminar hechos')
+        for hecho in cambios.hechos_eliminados:
+            if eliminar is not None:
+                eliminar(hecho)
+            elif hecho in hechos:
+                hechos.remove(hecho)
+            else:
+                raise ValueError(f'No existe el hecho: {" ".join(hecho)}')
+        # El índice no sabe quitar hechos: se reconstruye en la siguiente consulta
+        kb.pop('indice', None)
+
+    def _aplicar_reglas(self, lineas: list[str], eliminadas: list[str], nuevas: list[tuple[str, Regla]],
+                        cambios: Cambios, evaluador) -> None:
+        """Actualiza kb['reglas'] en el sitio, en el orden del fichero nuevo"""
+        if not eliminadas and not nuevas:
+            return
+        for linea in eliminadas:
+            cambios.reglas_eliminadas.append(self.reglas_por_linea[linea].pop())
+        for linea, regla in nuevas:
+            self.reglas_por_linea.setdefault(linea, []).append(regla)
+            cambios.reglas_agregadas.append(regla)
+
+        pendientes = {linea: list(reglas) for linea, reglas in self.reglas_por_linea.items()}
+        self.kb['reglas'][:] = [pendientes[linea].pop(0) for linea in lineas]
+
+        if evaluador is not None:
+            retirados, agregados = evaluador.cambiar_reglas(self.kb)
+            cambios.derivados_retirados.extend(retirados)
+            cambios.derivados_agregados.extend(agregados)
+
+    def _agregar_hechos(self, cambios: Cambios, evaluador) -> None:
+        """Agrega hechos a la KB; con evaluador deriva también sus consecuencias"""
+        self.kb['hechos'].extend(cambios.hechos_agregados)
+        if evaluador is not None:
+            cambios.derivados_agregados.extend(evaluador.descubrir(self.kb))
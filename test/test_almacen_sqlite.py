@@ -0,0 +1,171 @@
+import pytest
+from sbc.parser import parsear_tripleta
+from sbc.cargar_kb import carga_kb
+from sbc.query import query, descubrir
+from sbc.almacen_sqlite import HechosSQLite
+
+HECHOS = """
+paella ingrediente gamba
+pizza ingrediente queso
+hamburguesa ingrediente ternera [0.8]
+gamba tipo marisco
+queso tipo lacteo
+ternera tipo carne
+"""
+
+REGLAS = """
+X alergeno marisco <- X ingrediente Ingrediente, Ingrediente tipo marisco
+X alergeno lactosa <- X ingrediente Ingrediente, Ingrediente tipo lacteo
+Plato contiene carne <- Plato ingrediente Ingrediente, Ingrediente tipo carne
+Plato contiene producto_animal <- Plato contiene carne
+Plato contiene producto_animal <- Plato alergeno marisco
+"""
+
+
+@pytest.fixture
+def ficheros(tmp_path):
+    hechos_file = tmp_path / "hechos.txt"
+    hechos_file.write_text(HECHOS)
+    reglas_file = tmp_path / "reglas.txt"
+    reglas_file.write_text(REGLAS)
+    return hechos_file, reglas_file, tmp_path / "kb.sqlite"
+
+
+def como_dict(hechos) -> dict:
+    return {tuple(h): h.confianza for h in hechos}
+
+# ============================
+#  Tests de almacenamiento
+# ============================
+
+def test_carga_kb_sqlite(ficheros):
+    """Los hechos se cargan en el fichero SQLite"""
+    hechos_file, reglas_file, db = ficheros
+    kb = carga_kb(hechos_file, reglas_file, db)
+
+    assert isinstance(kb["hechos"], HechosSQLite)
+    assert len(kb["hechos"]) == 6
+    assert parsear_tripleta("hamburguesa ingrediente ternera [0.8]") in kb["hechos"]
+    assert parsear_tripleta("hamburguesa ingrediente ternera") not in kb["hechos"]
+
+
+def test_sqlite_sobrevive_reinicios(ficheros):
+    """Los hechos agregados siguen en el fichero al volver a abrirlo"""
+    hechos_file, reglas_file, db = ficheros
+    kb = carga_kb(hechos_file, reglas_file, db)
+    kb["hechos"].append(parsear_tripleta("tortilla ingrediente huevo"))
+    kb["hechos"].cerrar()
+
+    reabierto = HechosSQLite(db)
+    assert parsear_tripleta("tortilla ingrediente huevo") in reabierto
+    assert len(reabierto) == 7
+
+
+def test_sqlite_duplicado_conserva_confianza_maxima(tmp_path):
+    """Un hecho repetido se queda con la confianza máxima"""
+    almacen = HechosSQLite(tmp_path / "kb.sqlite")
+    almacen.extend([parsear_tripleta("a b c [0.5]"), parsear_tripleta("a b c [0.9]"), parsear_tripleta("a b c [0.7]")])
+    assert como_dict(almacen) == {("a", "b", "c"): 0.9}
+
+# ============================
+#  Tests del motor sobre SQLite
+# ============================
+
+def test_query_sobre_sqlite(ficheros):
+    """query usa los índices del almacén y da las mismas respuestas"""
+    hechos_file, reglas_file, db = ficheros
+    kb_sql = carga_kb(hechos_file, reglas_file, db)
+    kb_mem = carga_kb(hechos_file, reglas_file)
+
+    tripleta = parsear_tripleta("X contiene producto_animal")
+    respuestas_sql = {ss.aplicar("X") for ss, _ in query(tripleta, kb_sql)}
+    respuestas_mem = {ss.aplicar("X") for ss, _ in query(tripleta, kb_mem)}
+    assert respuestas_sql == respuestas_mem == {"paella", "hamburguesa"}
+
+
+def test_descubrir_sqlite_equivale_a_memoria(ficheros):
+    """Las reglas compiladas a SQL descubren los mismos hechos con las mismas confianzas"""
+    hechos_file, reglas_file, db = ficheros
+    kb_sql = carga_kb(hechos_file, reglas_file, db)
+    kb_mem = carga_kb(hechos_file, reglas_file)
+
+    nuevos_sql = descubrir(kb_sql)
+    nuevos_mem = descubrir(kb_mem)
+
+    assert como_dict(nuevos_sql) == como_dict(nuevos_mem)
+    assert como_dict(nuevos_sql)[("hamburguesa", "contiene", "producto_animal")] == 0.8
+    # Una segunda ejecución ya no descubre nada
+    assert descubrir(kb_sql) == []
+
+
+def test_carga_sqlite_por_lotes(ficheros, monkeypatch):
+    """El fichero de texto se inserta por lotes, sin pasar por una lista completa"""
+    import sbc.cargar_kb
+    hechos_file, reglas_file, db = ficheros
+    monkeypatch.setattr(sbc.cargar_kb, "TAMANO_LOTE_SQLITE", 4)
+    lotes = []
+    extend = HechosSQLite.extend
+    monkeypatch.setattr(HechosSQLite, "extend", lambda self, hechos: (lotes.append(len(hechos)), extend(self, hechos)))
+    kb = carga_kb(hechos_file, reglas_file, db)
+    assert lotes == [4, 2]
+    assert len(kb["hechos"]) == 6
+
+
+def test_sqlite_existente_sin_recargar(ficheros):
+    """Con recargar=False se abre el fichero SQLite sin volver a leer el texto"""
+    hechos_file, reglas_file, db = ficheros
+    carga_kb(hechos_file, reglas_file, db)["hechos"].cerrar()
+    hechos_file.write_text(HECHOS + "tortilla ingrediente huevo\n")
+
+    kb = carga_kb(hechos_file, reglas_file, db, recargar=False)
+    assert len(kb["hechos"]) == 6
+    assert parsear_tripleta("tortilla ingrediente huevo") not in kb["hechos"]
+    assert len(kb["reglas"]) == 5
+    kb["hechos"].cerrar()
+    assert len(carga_kb(hechos_file, reglas_file, db)["hechos"]) == 7
+
+
+def test_descubrir_sqlite_retorna_hechos_mejorados(ficheros):
+    """Como en memoria, un hecho que ya existía y sube de confianza también se retorna"""
+    hechos_file, reglas_file, db = ficheros
+    hechos_file.write_text(HECHOS + "pizza alergeno lactosa [0.3]\n")
+    kb_sql = carga_kb(hechos_file, reglas_file, db)
+    kb_mem = carga_kb(hechos_file, reglas_file)
+
+    nuevos_sql = como_dict(descubrir(kb_sql))
+    assert nuevos_sql == como_dict(descubrir(kb_mem))
+    assert nuevos_sql[("pizza", "alergeno", "lactosa")] == 1.0
+    assert descubrir(kb_sql) == []
+
+
+def test_descubrir_sqlite_tras_agregar_hecho_derivado(ficheros):
+    """Un hecho agregado con un predicado derivado dispara los estratos que dependen de él"""
+    hechos_file, reglas_file, db = ficheros
+    reglas_file.write_text(
+        "X lleva lacteo <- X ingrediente I, I tipo lacteo\n"
+        "X es animal <- X lleva lacteo\n"
+    )
+    kb_sql = carga_kb(hechos_file, reglas_file, db)
+    kb_mem = carga_kb(hechos_file, reglas_file)
+    assert como_dict(descubrir(kb_sql)) == como_dict(descubrir(kb_mem))
+
+    kb_sql["hechos"].append(parsear_tripleta("tarta lleva lacteo"))
+    kb_mem["hechos"].append(parsear_tripleta("tarta lleva lacteo"))
+    # Lo agregado se recuerda aunque se reinicie entre la aserción y 'descubrir'
+    kb_sql["hechos"].cerrar()
+    kb_sql["hechos"] = HechosSQLite(db)
+
+    assert como_dict(descubrir(kb_sql)) == como_dict(descubrir(kb_mem)) == {("tarta", "es", "animal"): 1.0}
+    assert como_dict(kb_sql["hechos"]) == como_dict(kb_mem["hechos"])
+    assert descubrir(kb_sql) == []
+
+
+def test_descubrir_sqlite_con_max_pendientes(ficheros):
+    """max_pendientes acota la caché de SQLite solo durante 'descubrir'"""
+    hechos_file, reglas_file, db = ficheros
+    kb_sql = carga_kb(hechos_file, reglas_file, db)
+    kb_mem = carga_kb(hechos_file, reglas_file)
+    cache = kb_sql["hechos"].conexion.execute("PRAGMA cache_size").fetchone()[0]
+
+    assert como_dict(descubrir(kb_sql, max_pendientes=10)) == como_dict(descubrir(kb_mem))
+    assert kb_sql["hechos"].conexion.execute("PRAGMA cache_size").fetchone()[0] == cache
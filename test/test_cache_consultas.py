@@ -0,0 +1,85 @@
+from sbc.parser import parsear_tripleta, parsear_regla
+from sbc.cache_consultas import CacheConsultas, normalizar
+from sbc.cli import formatear_resultados
+from sbc.grafo import GrafoDependencias
+from sbc.query import query
+
+
+def crear_kb() -> dict:
+    return {
+        "hechos": [
+            parsear_tripleta("paella ingrediente gamba"),
+            parsear_tripleta("chuleton ingrediente ternera"),
+            parsear_tripleta("ternera tipo carne"),
+            parsear_tripleta("tomate color rojo"),
+        ],
+        "reglas": [
+            parsear_regla("Plato marida vino_tinto <- Plato ingrediente Ingrediente, Ingrediente tipo carne"),
+            parsear_regla("Plato marida vino_blanco <- Plato ingrediente gamba"),
+        ],
+    }
+
+# ============================
+#  Tests normalizar / grafo
+# ============================
+
+def test_normalizar_variables_canonicas():
+    """Consultas iguales salvo el nombre de las variables comparten clave"""
+    clave_x, variables_x = normalizar(parsear_tripleta("X marida Y"))
+    clave_a, variables_a = normalizar(parsear_tripleta("A marida B"))
+    assert clave_x == clave_a == ("V0", "marida", "V1")
+    assert variables_x == ["X", "Y"]
+    assert normalizar(parsear_tripleta("X sustituye X"))[0] == ("V0", "sustituye", "V0")
+
+
+def test_grafo_dependencias_transitivas():
+    """marida depende de ingrediente y tipo, pero no de color"""
+    grafo = GrafoDependencias(crear_kb()["reglas"])
+    assert grafo.dependencias("marida") == {"marida", "ingrediente", "tipo"}
+    assert grafo.dependencias("color") == {"color"}
+    assert grafo.dependencias(None) is None
+
+# ============================
+#  Tests de la caché
+# ============================
+
+def test_cache_devuelve_resultados_con_variables_del_usuario():
+    """Un acierto renombra las variables canónicas a las de la consulta"""
+    kb = crear_kb()
+    cache = CacheConsultas()
+    tripleta = parsear_tripleta("X marida vino_tinto")
+    cache.guardar(tripleta, list(query(tripleta, kb)), kb)
+
+    resultados = cache.obtener(parsear_tripleta("P marida vino_tinto"), kb)
+    assert [ss.aplicar("P") for ss, _ in resultados] == ["chuleton"]
+    assert cache.aciertos == 1
+
+
+def test_cache_invalidacion_selectiva():
+    """Agregar un color no invalida 'marida', agregar un tipo sí"""
+    kb = crear_kb()
+    cache = CacheConsultas()
+    list(formatear_resultados("X marida vino_tinto ?", kb, cache))
+
+    list(formatear_resultados("tomate color verde .", kb, cache))
+    assert len(cache) == 1
+
+    list(formatear_resultados("gamba tipo carne .", kb, cache))
+    assert len(cache) == 0
+    assert sorted(formatear_resultados("X marida vino_tinto ?", kb, cache)) == ["chuleton", "paella"]
+
+
+def test_cache_limite_de_memoria():
+    """Se expulsan las entradas menos usadas al superar los límites"""
+    kb = crear_kb()
+    cache = CacheConsultas(max_entradas=2)
+    for consulta in ("X marida Y", "X tipo Y", "X color Y"):
+        tripleta = parsear_tripleta(consulta)
+        cache.guardar(tripleta, list(query(tripleta, kb)), kb)
+    assert len(cache) == 2
+    assert cache.obtener(parsear_tripleta("X marida Y"), kb) is None
+
+    cache = CacheConsultas(max_respuestas=1)
+    tripleta = parsear_tripleta("X ingrediente Y")
+    cache.guardar(tripleta, list(query(tripleta, kb)), kb)
+    assert len(cache) == 0
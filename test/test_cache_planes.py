@@ -0,0 +1,86 @@
+from sbc.cache_planes import CachePlanes
+from sbc.cli import formatear_resultados
+from sbc.parser import parsear_tripleta, parsear_regla
+from sbc.query import planificar
+
+
+def crear_kb() -> dict:
+    return {
+        "hechos": [
+            parsear_tripleta("pizza ingrediente queso"),
+            parsear_tripleta("lasaña ingrediente queso [0.9]"),
+            parsear_tripleta("tarta ingrediente nata"),
+            parsear_tripleta("queso tipo lacteo"),
+            parsear_tripleta("nata tipo lacteo [0.8]"),
+            parsear_tripleta("tomate color rojo"),
+        ],
+        "reglas": [
+            parsear_regla("Plato contiene lacteo <- Plato ingrediente I, I tipo lacteo"),
+            parsear_regla("X rojo si <- X color rojo"),
+        ],
+    }
+
+
+def test_consulta_repetida_no_se_vuelve_a_analizar():
+    kb = crear_kb()
+    planes = CachePlanes()
+    analizadas = []
+
+    def parsear(texto):
+        analizadas.append(texto)
+        return parsear_tripleta(texto.rstrip("?")), "consulta"
+
+    plan = planes.obtener("X contiene lacteo ? limit 2", kb, parsear)
+    # Mismo texto normalizado: misma entrada
+    assert planes.obtener("  X   contiene lacteo ?  limit 2 ", kb, parsear) is plan
+    assert analizadas == ["X contiene lacteo ?"]
+    assert (plan.tipo, plan.limite, plan.desplazamiento) == ("consulta", 2, 0)
+    assert plan.reglas == [kb["reglas"][0]]
+    assert (planes.aciertos, planes.fallos) == (1, 1)
+
+
+def test_plan_de_conjuncion_y_hechos_sin_guardar():
+    kb = crear_kb()
+    planes = CachePlanes()
+    plan = planes.obtener("X ingrediente I, I tipo lacteo, X contiene lacteo ?", kb)
+    assert plan.tipo == "conjuncion" and plan.reglas is None
+    assert plan.orden == planificar(plan.consulta, kb)
+
+    # Un hecho acaba dentro de la KB: cada vez se crea una tripleta nueva
+    hecho = planes.obtener("flan ingrediente nata .", kb)
+    assert hecho.tipo == "hecho"
+    assert planes.obtener("flan ingrediente nata .", kb).consulta is not hecho.consulta
+    assert len(planes) == 1
+
+
+def test_se_vacia_al_cambiar_reglas_y_expulsa_lru():
+    kb = crear_kb()
+    planes = CachePlanes(max_entradas=2)
+    plan = planes.obtener("X contiene lacteo ?", kb)
+    kb["reglas"][1] = parsear_regla("X contiene lacteo <- X ingrediente nata")
+    nuevo = planes.obtener("X contiene lacteo ?", kb)
+    assert nuevo is not plan and nuevo.reglas == kb["reglas"]
+
+    planes.obtener("X color Y ?", kb)
+    planes.obtener("X contiene lacteo ?", kb)
+    planes.obtener("X tipo Y ?", kb)
+    assert list(planes.entradas) == ["X contiene lacteo ?", "X tipo Y ?"]
+
+
+def test_cli_con_planes_igual_que_sin_planes():
+    consultas = [
+        "X contiene lacteo ?",
+        "X contiene lacteo ? limit 1 offset 1",
+        "razona si tarta contiene lacteo ?",
+        "X ingrediente I, I tipo lacteo ?",
+        "cuantos X contiene lacteo ?",
+        "cuantos X ingrediente I, I tipo lacteo ?",
+        "tomate rojo si ?",
+    ]
+    kb, kb_sin_planes = crear_kb(), crear_kb()
+    planes = CachePlanes()
+    for _ in range(2):
+        for consulta in consultas:
+            assert list(formatear_resultados(consulta, kb, planes=planes)) == \
+                list(formatear_resultados(consulta, kb_sin_planes))
+    assert planes.aciertos == len(consultas)
@@ -2,7 +2,7 @@ import pytest
 from pathlib import Path
 from sbc.parser import parsear_consulta, parsear_tripleta, parsear_regla
 from sbc.ed import Tripleta, Regla
-from sbc.cargar_kb import carga_kb
+from sbc.cargar_kb import carga_kb, CargaEnSegundoPlano, carga_directorio, importar_hechos, importar_fichero
 
 # ============================
 #  Tests de carga de datos
@@ -171,3 +171,121 @@ def test_carga_kb_estructura_completa(tmp_path):
     assert all(isinstance(h, Tripleta) for h in kb["hechos"])
     assert all(isinstance(r, Regla) for r in kb["reglas"])
 
+
+# ============================
+#  Tests de carga en segundo plano
+# ============================
+
+def test_carga_en_segundo_plano(tmp_path):
+    """obtener() espera a la carga y retorna la misma KB que carga_kb"""
+    hechos_file = tmp_path / "hechos.txt"
+    hechos_file.write_text("tomate color rojo\nplatano color amarillo")
+    reglas_file = tmp_path / "reglas.txt"
+    reglas_file.write_text("X color rojo <- X tipo fruta")
+
+    carga = CargaEnSegundoPlano(hechos_file, reglas_file)
+    kb = carga.obtener()
+
+    assert carga.terminada()
+    assert kb == carga_kb(hechos_file, reglas_file)
+
+
+def test_carga_en_segundo_plano_propaga_errores(tmp_path):
+    """Un error de parseo en el hilo se relanza al pedir la KB"""
+    hechos_file = tmp_path / "hechos.txt"
+    hechos_file.write_text("tomate color")
+    reglas_file = tmp_path / "reglas.txt"
+    reglas_file.write_text("")
+
+    carga = CargaEnSegundoPlano(hechos_file, reglas_file)
+    with pytest.raises(Exception):
+        carga.obtener()
+
+
+# ============================
+#  Tests de carga de directorios
+# ============================
+
+def crear_directorio(tmp_path):
+    """KB repartida en varios ficheros, con hechos y reglas mezclados"""
+    (tmp_path / "italiana").mkdir()
+    (tmp_path / "italiana" / "pizza.txt").write_text(
+        "# pizzas\npizza ingrediente queso\npizza ingrediente tomate [0.9]\n"
+    )
+    (tmp_path / "japonesa.txt").write_text(
+        "sushi ingrediente arroz\nX contiene Y <- X ingrediente Y\n"
+    )
+    (tmp_path / "notas.md").write_text("esto no se carga")
+    return tmp_path
+
+
+def test_carga_directorio(tmp_path):
+    kb = carga_directorio(crear_directorio(tmp_path), n_procesos=1)
+    # Ficheros en orden de ruta y, dentro de cada uno, en orden de línea
+    assert kb["hechos"] == [
+        parsear_tripleta("pizza ingrediente queso"),
+        parsear_tripleta("pizza ingrediente tomate [0.9]"),
+        parsear_tripleta("sushi ingrediente arroz"),
+    ]
+    assert kb["reglas"] == [parsear_regla("X contiene Y <- X ingrediente Y")]
+    # Los términos repetidos entre ficheros son el mismo objeto
+    assert kb["hechos"][0].predicado is kb["hechos"][2].predicado
+    # El índice ya está construido
+    assert len(kb["indice"]) == 3
+
+
+def test_carga_directorio_en_paralelo(tmp_path):
+    """Con varios procesos el resultado es el mismo que en uno"""
+    crear_directorio(tmp_path)
+    paralelo = carga_directorio(tmp_path, n_procesos=2)
+    secuencial = carga_directorio(tmp_path, n_procesos=1)
+    assert paralelo["hechos"] == secuencial["hechos"]
+    assert paralelo["reglas"] == secuencial["reglas"]
+
+
+def test_carga_directorio_glob(tmp_path):
+    crear_directorio(tmp_path)
+    kb = carga_directorio(str(tmp_path / "**" / "pizza*.txt"), n_procesos=1)
+    assert len(kb["hechos"]) == 2
+    assert kb["reglas"] == []
+
+
+def test_carga_directorio_errores(tmp_path):
+    with pytest.raises(ValueError):
+        carga_directorio(tmp_path)
+    (tmp_path / "malo.txt").write_text("tomate color rojo\ntomate color\n")
+    with pytest.raises(ValueError) as excinfo:
+        carga_directorio(tmp_path, n_procesos=1)
+    assert "malo.txt:2" in str(excinfo.value)
+
+# ============================
+#  Tests importación de hechos
+# ============================
+
+def test_importar_hechos_descarta_duplicados():
+    kb = {"hechos": [parsear_tripleta("pan tipo cereal")], "reglas": []}
+    importacion = importar_hechos(kb, [
+        parsear_tripleta("pan tipo cereal"),          # ya estaba en la KB
+        ("arroz", "tipo", "cereal"),
+        ("arroz", "tipo", "cereal"),                  # repetido en el lote
+        ("arroz", "tipo", "cereal", 0.5),             # otra confianza: es otro hecho
+    ])
+    assert importacion.insertados == [Tripleta("arroz", "tipo", "cereal"), Tripleta("arroz", "tipo", "cereal", 0.5)]
+    assert importacion.duplicados == 2
+    assert kb["hechos"][1:] == importacion.insertados
+    # El índice queda al día
+    assert len(kb["indice"]) == 3
+    assert "Importados 2 hechos (2 duplicados)" in importacion.resumen()
+
+
+def test_importar_fichero_con_error_no_agrega_nada(tmp_path):
+    fichero = tmp_path / "nuevos.txt"
+    fichero.write_text("arroz tipo cereal\n# comentario\n\nmal formado\n", encoding="utf-8")
+    kb = {"hechos": [], "reglas": []}
+    with pytest.raises(ValueError, match="nuevos.txt:4"):
+        importar_fichero(kb, fichero)
+    assert kb["hechos"] == []
+
+    fichero.write_text("arroz tipo cereal\npan tipo cereal [0.9]\narroz tipo cereal\n", encoding="utf-8")
+    importacion = importar_fichero(kb, fichero)
+    assert len(importacion.insertados) == 2 and importacion.duplicados == 1
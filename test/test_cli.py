@@ -319,4 +319,100 @@ def test_formatear_resultados_descubrir_con_nuevos_hechos(monkeypatch):
     # para confianza 1.0 -> sin [conf]
     assert "  pizza contiene queso" in resultados[1]
     # para confianza 0.8 -> [0.8]
-    assert "  ensalada contiene tomate [0.8]" in resultados[2]
\ No newline at end of file
+    assert "  ensalada contiene tomate [0.8]" in resultados[2]
+
+# ============================
+#  Tests formatear_resultados: paginación
+# ============================
+
+def test_formatear_resultados_consulta_paginada():
+    """limit/offset se aplican sobre las respuestas distintas"""
+    from sbc.parser import parsear_tripleta, parsear_regla
+
+    kb = {
+        "hechos": [parsear_tripleta(f"plato{i} ingrediente queso") for i in range(5)],
+        "reglas": [parsear_regla("X contiene lacteo <- X ingrediente queso")],
+    }
+
+    assert list(formatear_resultados("X contiene lacteo ? limit 2", kb)) == ["plato0", "plato1"]
+    assert list(formatear_resultados("X contiene lacteo ? limit 2 offset 3", kb)) == ["plato3", "plato4"]
+    assert list(formatear_resultados("plato0 contiene Y ? limit 1", kb)) == ["contiene = lacteo"]
+
+# ============================
+#  Tests formatear_resultados: consultas conjuntivas
+# ============================
+
+def test_formatear_resultados_conjuncion():
+    from sbc.parser import parsear_tripleta
+
+    kb = {
+        "hechos": [
+            parsear_tripleta("pizza ingrediente queso"),
+            parsear_tripleta("lasaña ingrediente queso [0.9]"),
+            parsear_tripleta("tarta ingrediente fresa"),
+            parsear_tripleta("queso tipo lacteo"),
+        ],
+        "reglas": [],
+    }
+
+    # Las variables se muestran en el orden en que aparecen en la consulta
+    assert list(formatear_resultados("X ingrediente I, I tipo lacteo ?", kb)) == ["pizza queso", "lasaña queso [90%]"]
+    assert list(formatear_resultados("X ingrediente I, I tipo lacteo ? limit 1 offset 1", kb)) == ["lasaña queso [90%]"]
+    assert list(formatear_resultados("lasaña ingrediente queso, queso tipo lacteo ?", kb)) == ["SI (confianza: 90%)"]
+    assert list(formatear_resultados("tarta ingrediente fresa, fresa tipo lacteo ?", kb)) == ["NO"]
+
+# ============================
+#  Tests formatear_resultados: grafo!
+# ============================
+
+def test_formatear_resultados_grafo():
+    from sbc.parser import parsear_regla
+
+    kb = {
+        "hechos": [],
+        "reglas": [
+            parsear_regla("X contiene Y <- X ingrediente Y"),
+            parsear_regla("X contiene Z <- X contiene Y, Y parte_de Z"),
+            parsear_regla("X alergeno Y <- X contiene Y, Y tipo alergeno"),
+        ],
+    }
+    assert list(formatear_resultados("grafo!", kb)) == [
+        "Estrato 1 (recursivo, 2 reglas): contiene <- ingrediente, parte_de",
+        "Estrato 2 (no recursivo, 1 reglas): alergeno <- contiene, tipo",
+    ]
+    assert list(formatear_resultados("grafo!", {"hechos": [], "reglas": []})) == ["No hay reglas"]
+
+# ============================
+#  Tests formatear_resultados: cuantos
+# ============================
+
+def test_formatear_resultados_cuantos():
+    from sbc.parser import parsear_tripleta, parsear_regla
+
+    kb = {
+        "hechos": [parsear_tripleta(f"plato{i} ingrediente queso") for i in range(5)]
+                  + [parsear_tripleta("plato0 ingrediente nata")],
+        "reglas": [parsear_regla("X contiene lacteo <- X ingrediente Y")],
+    }
+    assert list(formatear_resultados("cuantos X ingrediente queso ?", kb)) == ["5"]
+    # plato0 se deriva dos veces pero cuenta una
+    assert list(formatear_resultados("cuantos X contiene lacteo ?", kb)) == ["5"]
+    assert list(formatear_resultados("cuantos plato9 contiene lacteo ?", kb)) == ["0"]
+    with pytest.raises(ValueError):
+        list(formatear_resultados("cuantos X contiene lacteo ? limit 2", kb))
+
+# ============================
+#  Tests formatear_resultados: importar
+# ============================
+
+def test_formatear_resultados_importar(tmp_path):
+    from sbc.parser import parsear_tripleta
+
+    fichero = tmp_path / "nuevos.txt"
+    fichero.write_text("arroz tipo cereal\npan tipo cereal\npan tipo cereal\n", encoding="utf-8")
+    kb = {"hechos": [parsear_tripleta("pan tipo cereal")], "reglas": []}
+
+    resultados = list(formatear_resultados(f"importar {fichero}", kb))
+    assert resultados[0].startswith("Importados 1 hechos (2 duplicados)")
+    assert list(formatear_resultados("X tipo cereal ?", kb)) == ["pan", "arroz"]
+    assert list(formatear_resultados("arroz tipo cereal .", kb)) == ["Ya existe el hecho: arroz tipo cereal"]
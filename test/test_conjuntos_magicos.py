@@ -0,0 +1,125 @@
+import pytest
+from sbc.parser import parsear_tripleta, parsear_regla
+from sbc.query import query, respuestas as respuestas_consulta, razonar
+from sbc.cli import formatear_resultados
+from sbc.limites import Limites, Presupuesto, LimiteAlcanzado
+from sbc.conjuntos_magicos import query_magico, reescribir, EvaluadorMagico
+
+
+def crear_kb(hechos: list[str], reglas: list[str]) -> dict:
+    return {
+        "hechos": [parsear_tripleta(h) for h in hechos],
+        "reglas": [parsear_regla(r) for r in reglas],
+    }
+
+
+def respuestas(resultados, tripleta) -> dict:
+    """Valores únicos de las variables con su confianza máxima"""
+    variables = [t for t in tripleta if t[0].isupper()]
+    valores = {}
+    for ss, confianza in resultados:
+        clave = tuple(ss.aplicar(v) for v in variables)
+        valores[clave] = max(valores.get(clave, 0.0), confianza)
+    return valores
+
+
+KB_PLATOS = crear_kb(
+    [
+        "paella ingrediente arroz",
+        "paella ingrediente gamba",
+        "pizza ingrediente queso",
+        "hamburguesa ingrediente ternera [0.8]",
+        "gamba tipo marisco",
+        "queso tipo lacteo",
+        "ternera tipo carne",
+    ],
+    [
+        "X alergeno marisco <- X ingrediente Ingrediente, Ingrediente tipo marisco",
+        "X alergeno lactosa <- X ingrediente Ingrediente, Ingrediente tipo lacteo",
+        "Plato contiene carne <- Plato ingrediente Ingrediente, Ingrediente tipo carne",
+        "Plato contiene producto_animal <- Plato contiene carne",
+        "Plato contiene producto_animal <- Plato alergeno marisco [0.9]",
+    ],
+)
+
+# ============================
+#  Tests de reescritura
+# ============================
+
+def test_reescribir_adorna_antecedentes():
+    """El sujeto ligado de la consulta se propaga por los antecedentes"""
+    adornadas = reescribir(KB_PLATOS["reglas"], ("alergeno", "bbf"))
+    # Solo las reglas de 'alergeno' son relevantes
+    assert {ra.regla.get_consecuente().predicado for ra in adornadas} == {"alergeno"}
+    assert adornadas[0].adornos_antecedentes == ["bbf", "bbb"]
+
+
+# ============================
+#  Tests de evaluación
+# ============================
+
+@pytest.mark.parametrize("consulta", [
+    "paella alergeno A",
+    "X alergeno lactosa",
+    "X contiene producto_animal",
+    "hamburguesa contiene Y",
+    "X Y Z",
+])
+def test_query_magico_equivale_a_query(consulta):
+    """Mismas respuestas y confianzas que el encadenamiento hacia atrás"""
+    tripleta = parsear_tripleta(consulta)
+    assert respuestas(query_magico(tripleta, KB_PLATOS), tripleta) == \
+        respuestas(query(tripleta, KB_PLATOS), tripleta)
+
+
+def test_query_magico_solo_deriva_hechos_relevantes():
+    """Con el sujeto ligado solo se derivan hechos sobre ese sujeto"""
+    evaluador = EvaluadorMagico(KB_PLATOS, parsear_tripleta("paella alergeno A"))
+    evaluador.evaluar()
+    assert {clave[0] for clave in evaluador.confianzas} == {"paella"}
+
+
+def test_query_magico_reglas_recursivas_terminan():
+    """Una regla recursiva (transitividad) alcanza el punto fijo"""
+    kb = crear_kb(
+        ["a sub b", "b sub c", "c sub d", "x sub y"],
+        ["A sub C <- A sub B, B sub C"],
+    )
+    tripleta = parsear_tripleta("a sub Z")
+    assert set(respuestas(query_magico(tripleta, kb), tripleta)) == {("b",), ("c",), ("d",)}
+
+
+# ============================
+#  Tests de los puntos de entrada
+# ============================
+
+@pytest.mark.parametrize("consulta", [
+    "paella alergeno A",
+    "X contiene producto_animal",
+    "X Y Z",
+])
+def test_respuestas_magico_equivale_a_respuestas(consulta):
+    """respuestas(magico=True) da las mismas respuestas, paginadas igual"""
+    tripleta = parsear_tripleta(consulta)
+    assert respuestas_consulta(tripleta, KB_PLATOS, magico=True) == respuestas_consulta(tripleta, KB_PLATOS)
+    assert respuestas_consulta(tripleta, KB_PLATOS, 1, 1, magico=True) == respuestas_consulta(tripleta, KB_PLATOS, 1, 1)
+    assert razonar(tripleta, KB_PLATOS, magico=True)
+    assert not razonar(parsear_tripleta("pizza alergeno marisco"), KB_PLATOS, magico=True)
+
+
+def test_query_magico_respeta_presupuesto():
+    """Cada candidato de un join gasta un paso del presupuesto"""
+    with pytest.raises(LimiteAlcanzado):
+        list(query_magico(parsear_tripleta("X Y Z"), KB_PLATOS, Presupuesto(Limites(max_pasos=3))))
+
+
+@pytest.mark.parametrize("consulta", [
+    "X contiene producto_animal ?",
+    "X alergeno A ? limit 1 offset 1",
+    "razona si paella alergeno marisco ?",
+])
+def test_cli_magico_equivale_a_cli(consulta):
+    """La opción --magico de la CLI muestra las mismas respuestas"""
+    magico = sorted(formatear_resultados(consulta, KB_PLATOS, magico=True))
+    assert magico == sorted(formatear_resultados(consulta, KB_PLATOS))
+    assert magico
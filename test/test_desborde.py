@@ -0,0 +1,36 @@
+from sbc import desborde
+from sbc.desborde import LoteDesbordable
+
+
+def test_lote_mezcla_tramos_con_confianza_maxima():
+    lote = LoteDesbordable(max_claves=2)
+    lote[("b", "p", "x")] = 0.5
+    lote[("a", "p", "x")] = 0.3
+    # Ya volcadas: se vuelven a escribir y al mezclar gana la confianza máxima
+    lote[("a", "p", "x")] = 0.9
+    lote[("b", "p", "x")] = 0.1
+    lote[("c", "p", "x")] = 0.2
+
+    assert lote.volcadas == 4 and len(lote.tramos) == 2
+    assert list(lote.items()) == [(("a", "p", "x"), 0.9), (("b", "p", "x"), 0.5), (("c", "p", "x"), 0.2)]
+    lote.cerrar()
+    assert lote.tramos == [] and list(lote.items()) == []
+
+
+def test_lote_sin_volcar_es_un_dict():
+    lote = LoteDesbordable(max_claves=10)
+    lote[("a", "p", "x")] = 0.3
+    assert lote.get(("a", "p", "x"), -1.0) == 0.3
+    assert lote.get(("z", "p", "x"), -1.0) == -1.0
+    assert dict(lote.items()) == {("a", "p", "x"): 0.3}
+
+
+def test_lote_acota_los_ficheros_abiertos(monkeypatch):
+    monkeypatch.setattr(desborde, "MAX_TRAMOS", 3)
+    lote = LoteDesbordable(max_claves=1)
+    for i in range(10):
+        lote[(f"s{i % 4}", "p", "o")] = i / 10
+    assert len(lote.tramos) <= 3
+    assert dict(lote.items()) == {("s0", "p", "o"): 0.8, ("s1", "p", "o"): 0.9,
+                                  ("s2", "p", "o"): 0.6, ("s3", "p", "o"): 0.7}
+    lote.cerrar()
@@ -0,0 +1,224 @@
+import pytest
+from sbc.parser import parsear_tripleta, parsear_regla
+from sbc.query import descubrir
+from sbc.grafo import GrafoDependencias
+from sbc.evaluador import evaluador_kb
+from sbc.prefijos import compartidos
+from sbc.limites import Limites, Presupuesto
+
+
+def crear_kb() -> dict:
+    return {
+        "hechos": [
+            parsear_tripleta("paella ingrediente gamba"),
+            parsear_tripleta("hamburguesa ingrediente ternera [0.8]"),
+            parsear_tripleta("gamba tipo marisco"),
+            parsear_tripleta("ternera tipo carne"),
+            parsear_tripleta("marisco parte_de producto_mar"),
+            parsear_tripleta("producto_mar parte_de producto_animal"),
+        ],
+        "reglas": [
+            parsear_regla("Plato contiene Cosa <- Plato ingrediente I, I tipo Cosa"),
+            parsear_regla("Plato contiene B <- Plato contiene A, A parte_de B"),
+            parsear_regla("Plato apto vegano <- Plato sin producto_animal"),
+            parsear_regla("Plato peligroso alergia <- Plato contiene marisco"),
+        ],
+    }
+
+
+def como_dict(hechos) -> dict:
+    return {tuple(h): h.confianza for h in hechos}
+
+# ============================
+#  Tests grafo de dependencias
+# ============================
+
+def test_estratos_en_orden_topologico():
+    grafo = GrafoDependencias(crear_kb()["reglas"])
+    estratos = grafo.estratos()
+    predicados = [e.predicados for e in estratos]
+    # 'peligroso' depende de 'contiene', así que va detrás
+    assert predicados.index({"contiene"}) < predicados.index({"peligroso"})
+    recursivos = {p for e in estratos if e.recursivo for p in e.predicados}
+    assert recursivos == {"contiene"}
+
+
+def test_componente_fuerte_con_dos_predicados():
+    reglas = [
+        parsear_regla("X a Y <- X b Y"),
+        parsear_regla("X b Y <- X a Y, Y c Z"),
+        parsear_regla("X d Y <- X a Y"),
+    ]
+    estratos = GrafoDependencias(reglas).estratos()
+    assert [(e.predicados, e.recursivo) for e in estratos] == [({"a", "b"}, True), ({"d"}, False)]
+    assert estratos[0].entradas == {"a", "b", "c"}
+
+# ============================
+#  Tests descubrir
+# ============================
+
+def test_descubrir_estratos_recursivos():
+    kb = crear_kb()
+    nuevos = como_dict(descubrir(kb))
+    assert nuevos == {
+        ("paella", "contiene", "marisco"): 1.0,
+        ("paella", "contiene", "producto_mar"): 1.0,
+        ("paella", "contiene", "producto_animal"): 1.0,
+        ("hamburguesa", "contiene", "carne"): 0.8,
+        ("paella", "peligroso", "alergia"): 1.0,
+    }
+    # Los hechos nuevos se agregan a la KB
+    assert parsear_tripleta("paella peligroso alergia") in kb["hechos"]
+
+
+def test_descubrir_sin_cambios_no_evalua_nada():
+    kb = crear_kb()
+    descubrir(kb)
+    assert descubrir(kb) == []
+    assert evaluador_kb(kb).evaluados == 0
+
+
+def test_descubrir_incremental_salta_estratos():
+    """Solo se evalúan los estratos cuyas entradas reciben hechos nuevos"""
+    kb = crear_kb()
+    descubrir(kb)
+    kb["hechos"].append(parsear_tripleta("sopa ingrediente gamba"))
+    nuevos = como_dict(descubrir(kb))
+    assert nuevos == {
+        ("sopa", "contiene", "marisco"): 1.0,
+        ("sopa", "contiene", "producto_mar"): 1.0,
+        ("sopa", "contiene", "producto_animal"): 1.0,
+        ("sopa", "peligroso", "alergia"): 1.0,
+    }
+    # 'apto' solo depende de 'sin', que no ha cambiado
+    evaluador = evaluador_kb(kb)
+    assert evaluador.saltados == 1
+    assert evaluador.evaluados == len(evaluador.estratos) - 1
+
+
+def test_descubrir_mejora_confianza():
+    """Una derivación mejor de un hecho ya descubierto sube su confianza (MAX)"""
+    kb = crear_kb()
+    descubrir(kb)
+    kb["hechos"].append(parsear_tripleta("hamburguesa ingrediente ternera [0.9]"))
+    assert como_dict(descubrir(kb)) == {("hamburguesa", "contiene", "carne"): 0.9}
+
+
+def test_descubrir_reconstruye_si_cambian_las_reglas():
+    kb = crear_kb()
+    descubrir(kb)
+    kb["reglas"].append(parsear_regla("Plato tiene_mar si <- Plato contiene producto_mar"))
+    assert como_dict(descubrir(kb)) == {("paella", "tiene_mar", "si"): 1.0}
+
+# ============================
+#  Tests memoria acotada (sbc.desborde)
+# ============================
+
+def crear_kb_combinaciones(n: int) -> dict:
+    """Cada ingrediente combina con todos los demás: n * n consecuentes"""
+    return {
+        "hechos": [parsear_tripleta(f"i{k} tipo fruta [0.{k % 9 + 1}]") for k in range(n)],
+        "reglas": [parsear_regla("A combina_bien B <- A tipo fruta, B tipo fruta")],
+    }
+
+
+@pytest.mark.parametrize("max_pendientes", [1, 7, 1000])
+def test_descubrir_con_pendientes_acotados_igual_que_sin_limite(max_pendientes):
+    esperado = crear_kb_combinaciones(20)
+    descubrir(esperado)
+    kb = crear_kb_combinaciones(20)
+    nuevos = evaluador_kb(kb).descubrir(kb, max_pendientes=max_pendientes)
+
+    assert len(nuevos) == 400
+    assert como_dict(kb["hechos"]) == como_dict(esperado["hechos"])
+    volcadas = evaluador_kb(kb).volcadas
+    assert volcadas > 0 if max_pendientes < 400 else volcadas == 0
+
+
+@pytest.mark.parametrize("max_pendientes", [1, 7, 1000])
+def test_descubrir_con_max_pendientes_se_evalua_en_disco(max_pendientes):
+    """Sin estado del evaluador en memoria: mismo cierre, agregado a la KB por lotes"""
+    esperado = crear_kb()
+    nuevos_esperados = como_dict(descubrir(esperado))
+    kb = crear_kb()
+    lotes = []
+
+    class Hechos(list):
+        def extend(self, nuevos):
+            lotes.append(len(nuevos))
+            super().extend(nuevos)
+
+    kb["hechos"] = Hechos(kb["hechos"])
+    assert como_dict(descubrir(kb, max_pendientes=max_pendientes)) == nuevos_esperados
+    assert como_dict(kb["hechos"]) == como_dict(esperado["hechos"])
+    assert "evaluador" not in kb
+    assert max(lotes) <= max_pendientes and sum(lotes) == len(nuevos_esperados)
+
+    # Lo ya derivado no se vuelve a retornar; un hecho nuevo solo trae sus consecuencias
+    assert descubrir(kb, max_pendientes=max_pendientes) == []
+    kb["hechos"].append(parsear_tripleta("tarta ingrediente gamba"))
+    assert set(como_dict(descubrir(kb, max_pendientes=max_pendientes))) == {
+        ("tarta", "contiene", "marisco"), ("tarta", "contiene", "producto_mar"),
+        ("tarta", "contiene", "producto_animal"), ("tarta", "peligroso", "alergia"),
+    }
+
+
+def test_descubrir_en_disco_con_presupuesto():
+    """Al agotar el presupuesto se agrega lo derivado hasta entonces"""
+    kb = crear_kb()
+    presupuesto = Presupuesto(Limites(max_pasos=1))
+    nuevos = descubrir(kb, presupuesto, max_pendientes=10)
+    assert presupuesto.truncado == "max_pasos"
+    assert 0 < len(nuevos) < len(descubrir(crear_kb()))
+    assert all(hecho in kb["hechos"] for hecho in nuevos)
+
+
+def test_descubrir_comparte_antecedentes_entre_reglas():
+    kb = crear_kb()
+    # Mismo principio que la primera regla con otros nombres de variables
+    lleva = parsear_regla("P lleva T <- P ingrediente X, X tipo T")
+    lleva.confianza = 0.9
+    kb["reglas"] += [lleva, parsear_regla("P lleva de_mar <- P ingrediente X, X tipo T, T parte_de producto_mar")]
+    evaluador = evaluador_kb(kb)
+    (estrato,) = [e for e in evaluador.estratos if "lleva" in e.predicados]
+    raiz = evaluador.arboles[id(estrato)]
+    # Un camino por antecedente que sale del delta: 'P ingrediente X, X tipo T' es el mismo en las dos reglas
+    assert len(raiz.hijos) == 3
+    assert compartidos(raiz) == (13, 9)
+
+    nuevos = como_dict(descubrir(kb))
+    assert nuevos[("hamburguesa", "lleva", "carne")] == 0.8
+    assert nuevos[("paella", "lleva", "marisco")] == 0.9
+    assert nuevos[("paella", "lleva", "de_mar")] == 1.0
+    assert ("hamburguesa", "lleva", "de_mar") not in nuevos
+
+
+def test_descubrir_comparte_antecedentes_entre_estratos():
+    kb = {
+        "hechos": [
+            parsear_tripleta("chuleton ingrediente carne [0.9]"),
+            parsear_tripleta("ensalada ingrediente lechuga"),
+        ],
+        "reglas": [
+            parsear_regla("P marida vino_tinto <- P ingrediente carne"),
+            parsear_regla("P rico_en proteina <- P ingrediente carne"),
+            parsear_regla("P recomendado deportistas <- P rico_en proteina"),
+        ],
+    }
+    evaluador = evaluador_kb(kb)
+    # 'marida' y 'rico_en' son estratos distintos del mismo nivel: se evalúan con un solo árbol
+    assert [len(nivel) for nivel in evaluador.niveles] == [2, 1]
+    (conjunto,) = evaluador._unidades(evaluador.niveles[0])
+    assert conjunto.predicados == {"marida", "rico_en"}
+    (raiz,) = evaluador.arboles[id(conjunto)].hijos.values()
+    assert len(raiz.finales) == 2
+    assert compartidos(evaluador.arboles[id(conjunto)]) == (2, 1)
+
+    nuevos = como_dict(descubrir(kb))
+    assert nuevos == {
+        ("chuleton", "marida", "vino_tinto"): 0.9,
+        ("chuleton", "rico_en", "proteina"): 0.9,
+        ("chuleton", "recomendado", "deportistas"): 0.9,
+    }
+    # Se siguen contando estratos, no conjuntos
+    assert evaluador.evaluados == 3
@@ -0,0 +1,99 @@
+import os
+from sbc import diario as modulo_diario
+from sbc.cargar_kb import importar_hechos
+from sbc.cli import formatear_resultados
+from sbc.diario import Diario
+from sbc.parser import parsear_tripleta, parsear_regla
+from sbc.query import descubrir
+
+
+def crear_reglas() -> list:
+    return [parsear_regla("Plato contiene lacteo <- Plato ingrediente I, I tipo lacteo [0.9]")]
+
+
+def crear_kb(directorio) -> dict:
+    kb = {
+        "hechos": [parsear_tripleta("pizza ingrediente queso"), parsear_tripleta("queso tipo lacteo [0.7]")],
+        "reglas": crear_reglas(),
+    }
+    kb["diario"] = Diario(directorio)
+    kb["diario"].punto_de_control(kb)
+    return kb
+
+
+def como_lista(hechos) -> list:
+    return [(tuple(h), h.confianza) for h in hechos]
+
+
+def test_recupera_control_y_diario_con_evaluador(tmp_path):
+    kb = crear_kb(tmp_path)
+    importar_hechos(kb, [("tarta", "ingrediente", "nata"), ("nata", "tipo", "lacteo", 0.25)])
+    assert len(descubrir(kb)) == 2
+    list(formatear_resultados("flan ingrediente nata .", kb))
+    kb["diario"].cerrar()
+
+    recuperada = Diario(tmp_path).recuperar(crear_reglas())
+    assert como_lista(recuperada["hechos"]) == como_lista(kb["hechos"])
+    # El evaluador se restaura: solo queda por cerrar el hecho agregado después de 'descubrir'
+    evaluador = recuperada["evaluador"]
+    assert evaluador.vistos == len(kb["hechos"]) - 1
+    assert como_lista(descubrir(recuperada)) == [(("flan", "contiene", "lacteo"), 0.25)]
+
+    # Con otras reglas no se restaura
+    otras = crear_reglas() + [parsear_regla("X dulce si <- X ingrediente nata")]
+    assert "evaluador" not in Diario(tmp_path).recuperar(otras)
+
+
+def test_bloque_cortado_se_descarta(tmp_path):
+    kb = crear_kb(tmp_path)
+    importar_hechos(kb, [("tarta", "ingrediente", "nata")])
+    importar_hechos(kb, [("flan", "ingrediente", "huevo"), ("flan", "ingrediente", "leche")])
+    kb["diario"].cerrar()
+    # Caída a mitad del último bloque
+    ruta = tmp_path / "diario.bin"
+    ruta.write_bytes(ruta.read_bytes()[:-5])
+
+    diario = Diario(tmp_path)
+    recuperada = diario.recuperar(crear_reglas())
+    assert como_lista(recuperada["hechos"])[-1] == (("tarta", "ingrediente", "nata"), 1.0)
+    # Se sigue escribiendo detrás del último bloque entero
+    recuperada["diario"] = diario
+    importar_hechos(recuperada, [("flan", "ingrediente", "huevo")])
+    diario.cerrar()
+    assert como_lista(Diario(tmp_path).recuperar(crear_reglas())["hechos"])[-2:] == [
+        (("tarta", "ingrediente", "nata"), 1.0), (("flan", "ingrediente", "huevo"), 1.0)
+    ]
+
+
+def test_punto_de_control_deja_obsoleto_el_diario(tmp_path):
+    kb = crear_kb(tmp_path)
+    importar_hechos(kb, [("tarta", "ingrediente", "nata")])
+    anterior = (tmp_path / "diario.bin").read_bytes()
+    kb["diario"].punto_de_control(kb)
+    kb["diario"].cerrar()
+    # Caída justo después del rename: el diario viejo sigue ahí pero es de otra generación
+    (tmp_path / "diario.bin").write_bytes(anterior)
+
+    recuperada = Diario(tmp_path).recuperar(crear_reglas())
+    assert como_lista(recuperada["hechos"]) == como_lista(kb["hechos"])
+
+
+def test_escritura_en_grupo_y_puntos_de_control_periodicos(tmp_path, monkeypatch):
+    sincronizaciones = []
+    fsync = os.fsync
+    monkeypatch.setattr(modulo_diario.os, "fsync", lambda fd: (sincronizaciones.append(fd), fsync(fd)))
+    kb = crear_kb(tmp_path)
+    kb["diario"] = diario = Diario(tmp_path, grupo=3, cada=5)
+    sincronizaciones.clear()
+
+    for i in range(4):
+        list(formatear_resultados(f"plato{i} ingrediente queso .", kb))
+    # Un fsync al tercer hecho; el cuarto está escrito pero sin sincronizar
+    assert diario.sin_sincronizar == 1 and diario.registros == 4
+    assert len(sincronizaciones) == 1
+
+    list(formatear_resultados("plato4 ingrediente queso .", kb))
+    # Al quinto hecho se escribe un punto de control y el diario empieza de cero
+    assert diario.registros == 0 and diario.generacion == 2
+    diario.cerrar()
+    assert len(Diario(tmp_path).recuperar(crear_reglas())["hechos"]) == 7
@@ -0,0 +1,128 @@
+import pytest
+from sbc.parser import parsear_tripleta, parsear_regla, parsear_conjuncion
+from sbc.cargar_kb import carga_kb
+from sbc.fragmentos import HechosFragmentados
+from sbc.query import query, descubrir, planificar
+from sbc.query import respuestas as respuestas_consulta
+from sbc.unificar import compilar_patron
+
+HECHOS = """
+paella ingrediente gamba
+paella ingrediente arroz
+pizza ingrediente queso
+hamburguesa ingrediente ternera [0.8]
+gamba tipo marisco
+queso tipo lacteo
+ternera tipo carne
+arroz tipo grano
+"""
+
+REGLAS = """
+X alergeno marisco <- X ingrediente Ingrediente, Ingrediente tipo marisco
+X alergeno lactosa <- X ingrediente Ingrediente, Ingrediente tipo lacteo
+Plato contiene carne <- Plato ingrediente Ingrediente, Ingrediente tipo carne
+Plato contiene producto_animal <- Plato contiene carne
+Plato contiene producto_animal <- Plato alergeno marisco
+Ingrediente1 combina_bien Ingrediente2 <- Ingrediente1 tipo carne, Ingrediente2 tipo grano
+"""
+
+
+@pytest.fixture
+def kbs(tmp_path):
+    """La misma KB en memoria y repartida en 3 procesos"""
+    hechos_file = tmp_path / "hechos.txt"
+    hechos_file.write_text(HECHOS)
+    reglas_file = tmp_path / "reglas.txt"
+    reglas_file.write_text(REGLAS)
+    kb_frag = carga_kb(hechos_file, reglas_file, n_fragmentos=3)
+    yield carga_kb(hechos_file, reglas_file), kb_frag
+    kb_frag["hechos"].cerrar()
+
+
+def respuestas(tripleta, kb) -> dict:
+    variables = [t for t in tripleta if t[0].isupper()]
+    valores = {}
+    for ss, confianza in query(tripleta, kb):
+        clave = tuple(ss.aplicar(v) for v in variables)
+        valores[clave] = max(valores.get(clave, 0.0), confianza)
+    return valores
+
+# ============================
+#  Tests de almacenamiento
+# ============================
+
+def test_fragmentos_reparten_por_sujeto(kbs):
+    """Cada hecho vive en el fragmento de su sujeto y no se pierde ninguno"""
+    kb_mem, kb_frag = kbs
+    hechos = kb_frag["hechos"]
+    assert len(hechos) == len(kb_mem["hechos"])
+    assert sorted(tuple(h) for h in hechos) == sorted(tuple(h) for h in kb_mem["hechos"])
+    assert parsear_tripleta("hamburguesa ingrediente ternera [0.8]") in hechos
+
+    # Las dos búsquedas de 'paella' van al mismo fragmento
+    lote = hechos.buscar_lote([("paella", "ingrediente", "X"), ("pizza", "P", "O")])
+    assert sorted(t[2] for t in lote[0]) == ["arroz", "gamba"]
+    assert lote[1] == [("pizza", "ingrediente", "queso", 1.0)]
+
+# ============================
+#  Tests del motor
+# ============================
+
+@pytest.mark.parametrize("consulta", [
+    "X alergeno marisco",
+    "X contiene producto_animal",
+    "paella P O",
+    "X tipo Y",
+])
+def test_query_fragmentada_equivale_a_memoria(kbs, consulta):
+    """Scatter-gather da las mismas respuestas que un solo proceso"""
+    kb_mem, kb_frag = kbs
+    tripleta = parsear_tripleta(consulta)
+    assert respuestas(tripleta, kb_frag) == respuestas(tripleta, kb_mem)
+
+
+def test_conjuncion_fragmentada_equivale_a_memoria(kbs):
+    """El planificador de conjunciones cuenta candidatos preguntando a los fragmentos"""
+    kb_mem, kb_frag = kbs
+    hechos = kb_frag["hechos"]
+    assert hechos.cardinalidad(compilar_patron(parsear_tripleta("X ingrediente Y"))) == 4
+    assert hechos.cardinalidad(compilar_patron(parsear_tripleta("paella ingrediente Y"))) == 2
+    conjuncion = parsear_conjuncion("X ingrediente I, I tipo lacteo ?")
+    assert planificar(conjuncion, kb_frag) == planificar(conjuncion, kb_mem)
+    assert sorted(respuestas_consulta(conjuncion, kb_frag)) == sorted(respuestas_consulta(conjuncion, kb_mem))
+    assert respuestas_consulta(conjuncion, kb_frag) == [(("pizza", "queso"), 1.0)]
+
+
+def test_descubrir_fragmentado_equivale_a_memoria(kbs):
+    """Los joins repartidos descubren los mismos hechos con las mismas confianzas"""
+    kb_mem, kb_frag = kbs
+    nuevos_frag = {tuple(h): h.confianza for h in descubrir(kb_frag)}
+    nuevos_mem = {tuple(h): h.confianza for h in descubrir(kb_mem)}
+    assert nuevos_frag == nuevos_mem
+    assert nuevos_frag[("hamburguesa", "contiene", "producto_animal")] == 0.8
+    assert descubrir(kb_frag) == []
+
+
+def test_descubrir_fragmentado_recursivo_por_rondas():
+    """Cierre transitivo: cada ronda solo une los hechos nuevos de la anterior"""
+    hechos = HechosFragmentados(3)
+    try:
+        hechos.extend(parsear_tripleta(f"n{i} sig n{i + 1}") for i in range(8))
+        hechos.append(parsear_tripleta("n0 alcanza n1 [0.5]"))
+        reglas = [
+            parsear_regla("A alcanza B <- A sig B"),
+            parsear_regla("A alcanza C <- A alcanza B, B sig C"),
+        ]
+        kb_frag = {"hechos": hechos, "reglas": reglas}
+        kb_mem = {"hechos": list(hechos), "reglas": reglas}
+        nuevos = {tuple(h): h.confianza for h in descubrir(kb_frag)}
+        assert nuevos == {tuple(h): h.confianza for h in descubrir(kb_mem)}
+        assert len(nuevos) == 8 * 9 // 2
+        # El hecho base mejorado también se retorna, como en memoria
+        assert nuevos[("n0", "alcanza", "n1")] == 1.0
+        # Pertenencia y duplicados los resuelven los fragmentos
+        assert parsear_tripleta("n0 alcanza n8") in hechos
+        assert parsear_tripleta("n0 alcanza n1 [0.5]") not in hechos
+        assert not hasattr(hechos, "claves")
+    finally:
+        hechos.cerrar()
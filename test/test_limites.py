@@ -0,0 +1,156 @@
+import pytest
+from sbc.parser import parsear_tripleta, parsear_regla, parsear_limites, parsear_consulta
+from sbc.query import query, respuestas, razonar, descubrir
+from sbc.limites import Limites, Presupuesto, Cancelacion, LimiteAlcanzado, recoger
+from sbc.cli import formatear_resultados
+
+
+def kb_recursiva() -> dict:
+    """Regla recursiva por la izquierda: sin límites 'query' no termina"""
+    return {
+        "hechos": [parsear_tripleta(f"p{i} padre p{i + 1}") for i in range(6)],
+        "reglas": [
+            parsear_regla("X antecesor Y <- X antecesor Z, Z padre Y"),
+            parsear_regla("X antecesor Y <- X padre Y"),
+        ],
+    }
+
+
+def kb_producto(n: int = 60) -> dict:
+    """Cuerpo con producto cartesiano: n * n combinaciones"""
+    return {
+        "hechos": [parsear_tripleta(f"a{i} tipo cosa") for i in range(n)],
+        "reglas": [parsear_regla("X par Y <- X tipo cosa, Y tipo cosa")],
+    }
+
+# ============================
+#  Tests Presupuesto
+# ============================
+
+def test_max_pasos_lanza_y_marca_truncado():
+    presupuesto = Presupuesto(Limites(max_pasos=3))
+    for _ in range(3):
+        presupuesto.paso()
+    with pytest.raises(LimiteAlcanzado):
+        presupuesto.paso()
+    assert presupuesto.truncado == "max_pasos"
+
+
+def test_cancelacion():
+    cancelacion = Cancelacion()
+    cancelacion.cancelar()
+    presupuesto = Presupuesto(cancelacion=cancelacion)
+    resultados = recoger(query(parsear_tripleta("X par Y"), kb_producto(), presupuesto), presupuesto)
+    assert presupuesto.truncado == "cancelada"
+    assert len(resultados) < 60 * 60
+
+# ============================
+#  Tests query / respuestas / razonar
+# ============================
+
+def test_profundidad_corta_recursion_infinita():
+    presupuesto = Presupuesto(Limites(max_profundidad=8))
+    encontradas = respuestas(parsear_tripleta("p0 antecesor A"), kb_recursiva(), presupuesto=presupuesto)
+    assert presupuesto.truncado == "max_profundidad"
+    assert (("p1",), 1.0) in encontradas
+
+
+def test_recursion_sin_profundidad_no_rompe_el_proceso():
+    """Con presupuesto, un RecursionError se convierte en un resultado truncado"""
+    presupuesto = Presupuesto(Limites(max_pasos=10**9))
+    respuestas(parsear_tripleta("p0 antecesor A"), kb_recursiva(), presupuesto=presupuesto)
+    assert presupuesto.truncado == "recursion"
+
+
+def test_max_pasos_retorna_resultados_parciales():
+    presupuesto = Presupuesto(Limites(max_pasos=500))
+    resultados = recoger(query(parsear_tripleta("X par Y"), kb_producto(), presupuesto), presupuesto)
+    assert presupuesto.truncado == "max_pasos"
+    assert 0 < len(resultados) < 60 * 60
+
+
+def test_max_respuestas_cuenta_respuestas_distintas():
+    presupuesto = Presupuesto(Limites(max_respuestas=5))
+    encontradas = respuestas(parsear_tripleta("X par a0"), kb_producto(), presupuesto=presupuesto)
+    assert len(encontradas) == 5
+    assert presupuesto.truncado == "max_respuestas"
+
+
+def test_recoger_cuenta_respuestas_distintas_como_respuestas():
+    """'pizza' sale por dos derivaciones y cuenta como una sola respuesta"""
+    kb = {
+        "hechos": [parsear_tripleta(h) for h in (
+            "pizza ingrediente queso", "pizza ingrediente mozzarella", "lasaña ingrediente queso",
+            "tarta ingrediente nata", "queso tipo lacteo", "mozzarella tipo lacteo", "nata tipo lacteo",
+        )],
+        "reglas": [parsear_regla("Plato contiene lacteo <- Plato ingrediente I, I tipo lacteo")],
+    }
+    tripleta = parsear_tripleta("X contiene lacteo")
+    presupuestos = [Presupuesto(Limites(max_respuestas=2)) for _ in range(2)]
+    recogidos = recoger(query(tripleta, kb, presupuestos[0]), presupuestos[0], ["X"])
+    encontradas = respuestas(tripleta, kb, presupuesto=presupuestos[1])
+    assert len(recogidos) == 3
+    assert {ss.aplicar("X") for ss, _ in recogidos} == {valores[0] for valores, _ in encontradas}
+    assert presupuestos[0].truncado == presupuestos[1].truncado == "max_respuestas"
+
+
+def test_sin_truncar_no_marca_nada():
+    presupuesto = Presupuesto(Limites(max_pasos=10_000, max_respuestas=100))
+    encontradas = respuestas(parsear_tripleta("X par a0"), kb_producto(10), presupuesto=presupuesto)
+    assert len(encontradas) == 10
+    assert presupuesto.truncado is None
+
+
+def test_razonar_con_tiempo_agotado():
+    presupuesto = Presupuesto(Limites(max_segundos=0.0))
+    assert not razonar(parsear_tripleta("a0 par zzz"), kb_producto(), presupuesto)
+    assert presupuesto.truncado == "max_segundos"
+
+# ============================
+#  Tests descubrir
+# ============================
+
+def test_descubrir_truncado_y_despues_completo():
+    kb = kb_producto(30)
+    presupuesto = Presupuesto(Limites(max_pasos=100))
+    parciales = descubrir(kb, presupuesto)
+    assert presupuesto.truncado == "max_pasos"
+    assert 0 < len(parciales) < 30 * 30
+    # Lo derivado ya está en la KB; el resto aparece en el siguiente 'descubrir'
+    resto = descubrir(kb)
+    assert len(parciales) + len(resto) == 30 * 30
+
+# ============================
+#  Tests CLI
+# ============================
+
+def test_parsear_limites():
+    assert parsear_limites(["pasos=100", "tiempo=1.5"]) == {"max_pasos": 100, "max_segundos": 1.5}
+    assert parsear_limites(["profundidad=no"]) == {"max_profundidad": None}
+    assert parsear_limites(["ninguno"]) == {
+        "max_pasos": None, "max_profundidad": None, "max_segundos": None, "max_respuestas": None,
+    }
+    with pytest.raises(ValueError):
+        parsear_limites(["pasos=-1"])
+    with pytest.raises(ValueError):
+        parsear_limites(["memoria=10"])
+
+
+def test_limites_como_sujeto_de_una_consulta():
+    """Solo es el comando si no termina en ?/. y todos los argumentos son clave=valor"""
+    assert parsear_consulta("limites tipo X ?") == (parsear_tripleta("limites tipo X"), "consulta")
+    assert parsear_consulta("limites tipo comando .") == (parsear_tripleta("limites tipo comando"), "hecho")
+    assert parsear_consulta("limites") == ({}, "limites")
+    assert parsear_consulta("limites pasos=5") == ({"max_pasos": 5}, "limites")
+    with pytest.raises(ValueError):
+        parsear_consulta("limites memoria=10")
+
+
+def test_cli_limites_de_sesion():
+    kb = kb_producto()
+    limites = Limites()
+    assert list(formatear_resultados("limites pasos=200", kb, limites=limites)) == ["Límites: max_pasos=200"]
+    salida = list(formatear_resultados("X par Y ?", kb, limites=limites))
+    assert salida[-1] == "(resultados truncados: max_pasos)"
+    assert list(formatear_resultados("limites ninguno", kb, limites=limites)) == ["Límites: sin límites"]
+    assert len(list(formatear_resultados("X par a0 ?", kb, limites=limites))) == 60
@@ -0,0 +1,115 @@
+import pytest
+from sbc.parser import parsear_tripleta, parsear_regla
+from sbc.ed import Tripleta, Sustitucion
+from sbc.query import query, query_antecedentes, respuestas, razonar
+from sbc.maquina import Maquina, resolver, resolver_antecedentes
+from sbc.cli import formatear_resultados
+from sbc.limites import Limites, Presupuesto
+
+
+def crear_kb() -> dict:
+    return {
+        "hechos": [
+            parsear_tripleta("pizza ingrediente queso"),
+            parsear_tripleta("pizza ingrediente mozzarella"),
+            parsear_tripleta("lasaña ingrediente queso [0.9]"),
+            parsear_tripleta("tarta ingrediente nata"),
+            parsear_tripleta("queso tipo lacteo"),
+            parsear_tripleta("mozzarella tipo lacteo [0.8]"),
+            parsear_tripleta("nata tipo lacteo"),
+        ],
+        "reglas": [
+            parsear_regla("Plato contiene lacteo <- Plato ingrediente Ingrediente, Ingrediente tipo lacteo"),
+            # Reutiliza nombres de variables de la otra regla: los ámbitos deben comportarse igual que en query
+            parsear_regla("Ingrediente apto Plato <- Ingrediente tipo lacteo, Plato contiene lacteo"),
+        ],
+    }
+
+
+def crear_kb_cadena(n: int) -> dict:
+    """n0 sig n1 sig ... nN y el cierre transitivo 'alcanza' como regla recursiva"""
+    return {
+        "hechos": [Tripleta(f"n{i}", "sig", f"n{i + 1}") for i in range(n)],
+        "reglas": [
+            parsear_regla("A alcanza B <- A sig B"),
+            parsear_regla("A alcanza C <- A sig B, B alcanza C"),
+        ],
+    }
+
+
+@pytest.mark.parametrize("consulta", [
+    "X contiene lacteo",
+    "pizza contiene lacteo",
+    "X apto Y",
+    "queso apto Plato",
+    "X ingrediente Y",
+    "X P lacteo",
+])
+def test_mismas_respuestas_que_query(consulta):
+    """Mismas sustituciones y confianzas, en el mismo orden"""
+    kb = crear_kb()
+    tripleta = parsear_tripleta(consulta)
+    assert list(resolver(tripleta, kb)) == list(query(tripleta, kb))
+
+
+def test_antecedentes_igual_que_query_antecedentes():
+    kb = crear_kb()
+    antecedentes = [parsear_tripleta("X ingrediente I"), parsear_tripleta("I tipo lacteo")]
+    assert list(resolver_antecedentes(antecedentes, kb)) == list(query_antecedentes(antecedentes, kb, Sustitucion()))
+
+
+def test_mismos_pasos_y_poda_con_presupuesto():
+    kb = crear_kb_cadena(20)
+    tripleta = parsear_tripleta("n0 alcanza X")
+    presupuestos = [Presupuesto(Limites(max_profundidad=5)) for _ in range(2)]
+    assert list(resolver(tripleta, kb, presupuestos[0])) == list(query(tripleta, kb, presupuestos[1]))
+    assert presupuestos[0].pasos == presupuestos[1].pasos
+    assert presupuestos[0].truncado == presupuestos[1].truncado == 'max_profundidad'
+
+
+def test_derivacion_profunda_sin_limite_de_recursion():
+    """query agota la recursión de Python; la máquina no usa la pila de Python"""
+    kb = crear_kb_cadena(3000)
+    tripleta = parsear_tripleta("n0 alcanza n3000")
+    with pytest.raises(RecursionError):
+        razonar(tripleta, kb)
+    assert razonar(tripleta, kb, pila=True)
+    assert respuestas(parsear_tripleta("n2990 alcanza X"), kb, pila=True) == [
+        ((f"n{i}",), 1.0) for i in range(2991, 3001)
+    ]
+
+
+def test_query_sin_materializacion_no_gasta_pila_de_mas():
+    """Sin kb['materializacion'] cada nivel de la demostración usa los mismos marcos que antes de añadirla"""
+    kb = crear_kb_cadena(280)
+    assert razonar(parsear_tripleta("n0 alcanza n280"), kb)
+    assert sum(1 for _ in query(parsear_tripleta("n0 alcanza X"), kb)) == 280
+
+
+def test_respuestas_y_razonar_con_pila():
+    kb = crear_kb()
+    tripleta = parsear_tripleta("X contiene lacteo")
+    assert respuestas(tripleta, kb, pila=True) == respuestas(tripleta, kb)
+    assert respuestas(tripleta, kb, limite=1, desplazamiento=1, pila=True) == [(("lasaña",), 0.9)]
+    conjuncion = [parsear_tripleta("X ingrediente I"), parsear_tripleta("I tipo lacteo")]
+    assert respuestas(conjuncion, kb, pila=True) == respuestas(conjuncion, kb)
+    assert razonar(parsear_tripleta("tarta contiene lacteo"), kb, pila=True)
+    assert not razonar(parsear_tripleta("tarta contiene carne"), kb, pila=True)
+
+
+def test_respuestas_proyectadas_no_recorren_el_rastro(monkeypatch):
+    """Con las variables de la consulta cada respuesta solo liga esas, sea cual sea la profundidad"""
+    kb = crear_kb_cadena(300)
+    tripleta = parsear_tripleta("n0 alcanza X")
+    proyectadas = list(resolver(tripleta, kb, variables=["X"]))
+    assert [(ss.get_mappings(), c) for ss, c in proyectadas] == [({"X": f"n{i}"}, 1.0) for i in range(1, 301)]
+    assert [(ss.aplicar("X"), c) for ss, c in resolver(parsear_tripleta("X contiene lacteo"), crear_kb(), variables=["X"])] \
+        == [(ss.aplicar("X"), c) for ss, c in query(parsear_tripleta("X contiene lacteo"), crear_kb())]
+
+    # razonar y la CLI con --pila no construyen la sustitución completa
+    monkeypatch.setattr(Maquina, "sustitucion", lambda self, variables=None: pytest.fail("sustitución completa")
+                        if variables is None else Sustitucion({v: self.valor(v) for v in variables}))
+    assert razonar(parsear_tripleta("n0 alcanza n300"), kb, pila=True)
+    assert list(formatear_resultados("n295 alcanza X ?", kb, pila=True)) == [
+        f"alcanza = n{i}" for i in range(296, 301)
+    ]
@@ -0,0 +1,94 @@
+from sbc.cli import formatear_resultados
+from sbc.materializacion import Materializador
+from sbc.parser import parsear_tripleta, parsear_regla
+from sbc.query import respuestas, contar, razonar
+
+
+def crear_kb() -> dict:
+    return {
+        "hechos": [
+            parsear_tripleta("pizza ingrediente queso"),
+            parsear_tripleta("pizza ingrediente mozzarella"),
+            parsear_tripleta("lasaña ingrediente queso [0.9]"),
+            parsear_tripleta("tarta ingrediente nata"),
+            parsear_tripleta("queso tipo lacteo"),
+            parsear_tripleta("mozzarella tipo lacteo [0.8]"),
+            parsear_tripleta("nata tipo lacteo"),
+            parsear_tripleta("tomate color rojo"),
+        ],
+        "reglas": [
+            parsear_regla("Plato contiene lacteo <- Plato ingrediente I, I tipo lacteo"),
+            parsear_regla("Plato prohibido intolerante <- Plato contiene lacteo"),
+        ],
+    }
+
+
+def test_materializa_al_superar_umbral():
+    kb = crear_kb()
+    kb["materializacion"] = materializacion = Materializador(umbral=0.0)
+    tripleta = parsear_tripleta("X contiene lacteo")
+    esperado = respuestas(tripleta, crear_kb())
+
+    assert respuestas(tripleta, kb) == esperado
+    assert "contiene" in materializacion.tablas
+    # Ahora desde la tabla: mismas respuestas y confianzas
+    assert sorted(respuestas(tripleta, kb)) == sorted(esperado)
+    assert contar(tripleta, kb) == 3
+    assert razonar(parsear_tripleta("lasaña contiene lacteo"), kb)
+    # Los predicados base no se materializan
+    respuestas(parsear_tripleta("X color Y"), kb)
+    assert "color" not in materializacion.estadisticas
+
+
+def test_tabla_al_dia_al_agregar_hechos():
+    kb = crear_kb()
+    kb["materializacion"] = materializacion = Materializador(umbral=0.0)
+    tripleta = parsear_tripleta("X contiene lacteo")
+    respuestas(tripleta, kb)
+    tabla = materializacion.tablas["contiene"]
+
+    kb["hechos"].append(parsear_tripleta("flan ingrediente nata [0.7]"))
+    assert (("flan",), 0.7) in respuestas(tripleta, kb)
+    # Se ha actualizado la misma tabla, sin volver a derivar todo
+    assert materializacion.tablas["contiene"] is tabla
+    assert contar(tripleta, kb) == 4
+
+
+def test_cambio_de_reglas_descarta_tablas():
+    kb = crear_kb()
+    kb["materializacion"] = materializacion = Materializador(umbral=0.0)
+    tripleta = parsear_tripleta("X contiene lacteo")
+    respuestas(tripleta, kb)
+    kb["reglas"][0] = parsear_regla("Plato contiene lacteo <- Plato ingrediente nata")
+    assert respuestas(tripleta, kb) == [(("tarta",), 1.0)]
+    assert len(materializacion.tablas["contiene"].hechos) < 10
+
+
+def test_expulsion_por_decaimiento_y_por_tamano():
+    kb = crear_kb()
+    # Decaimiento fuerte: en cuanto se consulta otro predicado el primero deja de estar caliente
+    materializacion = kb["materializacion"] = Materializador(umbral=1e-9, decaimiento=1e-6)
+    respuestas(parsear_tripleta("X contiene lacteo"), kb)
+    assert "contiene" in materializacion.tablas
+    respuestas(parsear_tripleta("X prohibido intolerante"), kb)
+    assert "contiene" not in materializacion.tablas
+    assert "prohibido" in materializacion.tablas
+
+    kb = crear_kb()
+    materializacion = kb["materializacion"] = Materializador(umbral=0.0, max_hechos=3)
+    assert len(respuestas(parsear_tripleta("X contiene lacteo"), kb)) == 3
+    assert materializacion.tablas == {} and materializacion.hechos() == 0
+    assert "contiene: no materializable" in materializacion.estado()[0]
+
+
+def test_cli_materializacion():
+    kb = crear_kb()
+    assert list(formatear_resultados("materializacion!", kb)) == [
+        "Materialización desactivada (usa --materializar)"
+    ]
+    kb["materializacion"] = Materializador(umbral=0.0)
+    list(formatear_resultados("X contiene lacteo ?", kb))
+    lineas = list(formatear_resultados("materializacion!", kb))
+    assert lineas[0].startswith("contiene: materializado (")
+    assert "1 consultas" in lineas[0]
+    assert lineas[-1].startswith("Hechos materializados: ")
@@ -0,0 +1,85 @@
+import itertools
+from types import SimpleNamespace
+from sbc.orden_reglas import OrdenReglas, forma_de
+from sbc.parser import parsear_tripleta, parsear_regla
+from sbc.query import razonar, respuestas
+from sbc.unificar import compilar_patron
+
+
+def crear_kb() -> dict:
+    return {
+        "hechos": [
+            parsear_tripleta("tortilla ingrediente huevo"),
+            parsear_tripleta("pechuga ingrediente pollo"),
+            parsear_tripleta("pollo_asado ingrediente pollo"),
+            parsear_tripleta("ensalada ingrediente lechuga"),
+        ],
+        "reglas": [
+            parsear_regla("Plato rico_en proteina <- Plato ingrediente huevo"),
+            parsear_regla("Plato rico_en proteina <- Plato ingrediente carne"),
+            parsear_regla("Plato rico_en proteina <- Plato ingrediente pollo"),
+        ],
+    }
+
+
+def test_forma_de_la_meta():
+    assert forma_de(compilar_patron(parsear_tripleta("pechuga rico_en proteina"))) == ("rico_en", True, True)
+    assert forma_de(compilar_patron(parsear_tripleta("X rico_en proteina"))) == ("rico_en", False, True)
+    assert forma_de(compilar_patron(parsear_tripleta("X P Y"))) == (None, False, False)
+
+
+def test_puntuacion_prefiere_la_regla_barata_que_suele_funcionar():
+    huevo, carne, pollo = crear_kb()["reglas"]
+    orden = OrdenReglas()
+    forma = ("rico_en", True, True)
+    # Sin datos todas empatan (se respeta el orden del fichero)
+    assert orden.puntuacion(forma, huevo) == orden.puntuacion(forma, pollo)
+    orden.registrar(forma, huevo, False, 1.0)
+    orden.registrar(forma, carne, True, 5.0)
+    orden.registrar(forma, pollo, True, 1.0)
+    puntuaciones = [orden.puntuacion(forma, r) for r in (huevo, carne, pollo)]
+    assert puntuaciones[2] < puntuaciones[0] and puntuaciones[2] < puntuaciones[1]
+    # Otra forma de meta no comparte estadísticas
+    assert orden.puntuacion(("rico_en", False, True), pollo) == 0.0
+
+
+def test_razonar_prueba_antes_la_regla_que_ha_funcionado(monkeypatch):
+    # Cada intento cuesta lo mismo: el orden solo depende de los éxitos
+    reloj = itertools.count()
+    monkeypatch.setattr("sbc.query.time", SimpleNamespace(perf_counter=lambda: next(reloj)))
+    kb = crear_kb()
+    kb["orden_reglas"] = orden = OrdenReglas()
+    huevo, carne, pollo = kb["reglas"]
+    forma = ("rico_en", True, True)
+
+    assert razonar(parsear_tripleta("pechuga rico_en proteina"), kb)
+    assert [orden.estadisticas[(forma, id(r))].intentos for r in (huevo, carne, pollo)] == [1, 1, 1]
+    assert razonar(parsear_tripleta("pollo_asado rico_en proteina"), kb)
+    # La de pollo va primero y basta con ella
+    assert [orden.estadisticas[(forma, id(r))].intentos for r in (huevo, carne, pollo)] == [1, 1, 2]
+    assert not razonar(parsear_tripleta("ensalada rico_en proteina"), kb)
+    assert razonar(parsear_tripleta("tortilla rico_en proteina"), kb)
+
+
+def test_mismas_respuestas_con_y_sin_orden_adaptativo():
+    kb = crear_kb()
+    kb["orden_reglas"] = OrdenReglas()
+    tripleta = parsear_tripleta("X rico_en proteina")
+    for plato in ("pechuga", "tortilla", "ensalada", "pollo_asado"):
+        meta = parsear_tripleta(f"{plato} rico_en proteina")
+        assert razonar(meta, kb) == razonar(meta, crear_kb())
+    # Fuera de razonar el orden es siempre el del fichero (determinista)
+    assert respuestas(tripleta, kb) == respuestas(tripleta, crear_kb())
+
+
+def test_orden_adaptativo_no_gasta_pila_de_mas():
+    """Mismo número de marcos por nivel de la demostración que con el orden del fichero"""
+    kb = {
+        "hechos": [parsear_tripleta(f"n{i} sig n{i + 1}") for i in range(280)],
+        "reglas": [
+            parsear_regla("A alcanza B <- A sig B"),
+            parsear_regla("A alcanza C <- A sig B, B alcanza C"),
+        ],
+        "orden_reglas": OrdenReglas(),
+    }
+    assert razonar(parsear_tripleta("n0 alcanza n280"), kb)
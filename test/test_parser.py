@@ -1,5 +1,8 @@
+import subprocess
+import sys
+from pathlib import Path
 import pytest
-from sbc.parser import parsear_consulta, parsear_tripleta, parsear_regla
+from sbc.parser import parsear_consulta, parsear_tripleta, parsear_regla, parsear_paginacion, parsear_tripleta_rapida
 from sbc.ed import Tripleta, Regla
 
 
@@ -100,6 +103,25 @@ def test_parsear_consulta_descubrir():
     assert tripleta is None
 
 
+def test_parsear_consulta_grafo():
+    """
+    Test parsear consulta tipo "grafo" (grafo!)
+    """
+    tripleta, tipo = parsear_consulta("grafo!")
+    assert tipo == "grafo"
+    assert tripleta is None
+    with pytest.raises(ValueError):
+        parsear_consulta("grafo! contiene")
+
+
+def test_parsear_consulta_materializacion():
+    tripleta, tipo = parsear_consulta("materializacion!")
+    assert tipo == "materializacion"
+    assert tripleta is None
+    with pytest.raises(ValueError):
+        parsear_consulta("materializacion! contiene")
+
+
 # ============================
 #  Tests parsear_consulta ERRORES
 # ============================
@@ -170,4 +192,119 @@ def test_parsear_consulta_descubrir_con_argumentos():
     """
     with pytest.raises(ValueError) as excinfo:
         parsear_consulta("descubrir! algo")
-    assert 'descubrir!' in str(excinfo.value)
\ No newline at end of file
+    assert 'descubrir!' in str(excinfo.value)
+
+# ============================
+#  Tests de construcción perezosa
+# ============================
+
+def test_importar_parser_no_importa_pyparsing():
+    """La gramática no se construye (ni se importa pyparsing) hasta el primer uso"""
+    codigo = (
+        "import sys, sbc.cli, sbc.parser\n"
+        "assert 'pyparsing' not in sys.modules\n"
+        "sbc.parser.parsear_tripleta('tomate color rojo')\n"
+        "assert 'pyparsing' in sys.modules\n"
+        "assert sbc.parser.tripleta_parser is sbc.parser.gramatica().tripleta_parser\n"
+    )
+    resultado = subprocess.run([sys.executable, "-c", codigo], cwd=Path(__file__).resolve().parents[1])
+    assert resultado.returncode == 0
+
+
+# ============================
+#  Tests parsear_paginacion
+# ============================
+
+def test_parsear_paginacion_limit_offset():
+    """Separa limit y offset del resto de la consulta"""
+    assert parsear_paginacion("X contiene lacteo ? limit 20 offset 40") == ("X contiene lacteo ?", 20, 40)
+    assert parsear_paginacion("X contiene lacteo ? offset 5 limit 2") == ("X contiene lacteo ?", 2, 5)
+    assert parsear_paginacion("X contiene lacteo ? limit 3") == ("X contiene lacteo ?", 3, 0)
+
+
+def test_parsear_paginacion_sin_paginacion():
+    """Las consultas sin paginación no cambian"""
+    assert parsear_paginacion("tomate tipo verdura .") == ("tomate tipo verdura .", None, 0)
+    assert parsear_paginacion("descubrir!") == ("descubrir!", None, 0)
+
+
+def test_parsear_paginacion_limit_y_offset_como_terminos():
+    """Delante del '?' o del '.' limit y offset son términos normales"""
+    assert parsear_paginacion("X tiene limit ?") == ("X tiene limit ?", None, 0)
+    assert parsear_paginacion("coche tiene offset ?") == ("coche tiene offset ?", None, 0)
+    assert parsear_paginacion("a b limit .") == ("a b limit .", None, 0)
+    assert parsear_paginacion("X tiene limit ? limit 5") == ("X tiene limit ?", 5, 0)
+    assert parsear_consulta("a b limit .") == (parsear_tripleta("a b limit"), "hecho")
+
+
+def test_parsear_paginacion_errores():
+    """limit/offset mal formados o fuera de una consulta"""
+    with pytest.raises(ValueError):
+        parsear_paginacion("X contiene lacteo ? limit veinte")
+    with pytest.raises(ValueError):
+        parsear_paginacion("X contiene lacteo ? limit 1 limit 2")
+    with pytest.raises(ValueError):
+        parsear_paginacion("tomate tipo verdura . limit 2")
+    with pytest.raises(ValueError):
+        parsear_paginacion("X contiene lacteo ? limit 2 postre")
+
+# ============================
+#  Tests consultas conjuntivas
+# ============================
+
+def test_parsear_consulta_conjuncion():
+    tripletas, tipo = parsear_consulta("X ingrediente I, I tipo lacteo ?")
+    assert tipo == "conjuncion"
+    assert tripletas == [Tripleta("X", "ingrediente", "I"), Tripleta("I", "tipo", "lacteo")]
+
+
+def test_parsear_consulta_conjuncion_sin_interrogacion():
+    with pytest.raises(ValueError):
+        parsear_consulta("X ingrediente I, I tipo lacteo .")
+
+# ============================
+#  Tests parsear_tripleta_rapida
+# ============================
+
+@pytest.mark.parametrize("linea", [
+    "tomate color rojo",
+    "hamburguesa ingrediente carne [0.8]",
+    "platano color amarillo [1]",
+    "X tipo fruta",
+    "  pan   tipo grano  ",
+    "a b c[0.5]",
+    "a b c [ 0.5 ]",
+])
+def test_parsear_tripleta_rapida_igual_que_pyparsing(linea):
+    assert parsear_tripleta_rapida(linea) == parsear_tripleta(linea)
+
+
+def test_parsear_tripleta_rapida_errores():
+    with pytest.raises(Exception):
+        parsear_tripleta_rapida("tomate color")
+
+# ============================
+#  Tests cuantos
+# ============================
+
+def test_parsear_consulta_cuantos():
+    tripleta, tipo = parsear_consulta("cuantos X alergeno lactosa ?")
+    assert tipo == "cuantos"
+    assert tripleta == Tripleta("X", "alergeno", "lactosa")
+    tripletas, tipo = parsear_consulta("cuantos X ingrediente I, I tipo lacteo ?")
+    assert tipo == "cuantos"
+    assert len(tripletas) == 2
+    # Con tres términos 'cuantos' es un sujeto más
+    assert parsear_consulta("cuantos tipo palabra ?")[1] == "consulta"
+    with pytest.raises(ValueError):
+        parsear_consulta("cuantos X alergeno lactosa .")
+
+
+def test_parsear_consulta_importar():
+    ruta, tipo = parsear_consulta("importar nuevos.txt")
+    assert tipo == "importar"
+    assert ruta == Path("nuevos.txt")
+    # Con ? o . es una consulta con sujeto 'importar'
+    assert parsear_consulta("importar tipo comando ?")[1] == "consulta"
+    with pytest.raises(ValueError):
+        parsear_consulta("importar a.txt b.txt")
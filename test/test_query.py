@@ -0,0 +1,133 @@
+import pytest
+from sbc.parser import parsear_tripleta, parsear_regla
+from sbc.query import query, respuestas, razonar, planificar, query_conjuncion, contar
+
+
+def crear_kb() -> dict:
+    return {
+        "hechos": [
+            parsear_tripleta("pizza ingrediente queso"),
+            parsear_tripleta("pizza ingrediente mozzarella"),
+            parsear_tripleta("lasaña ingrediente queso [0.9]"),
+            parsear_tripleta("tarta ingrediente nata"),
+            parsear_tripleta("queso tipo lacteo"),
+            parsear_tripleta("mozzarella tipo lacteo"),
+            parsear_tripleta("nata tipo lacteo"),
+        ],
+        "reglas": [
+            parsear_regla("Plato contiene lacteo <- Plato ingrediente Ingrediente, Ingrediente tipo lacteo"),
+        ],
+    }
+
+# ============================
+#  Tests query / razonar
+# ============================
+
+def test_query_hechos_y_reglas():
+    """query produce una respuesta por cada camino (pizza aparece dos veces)"""
+    kb = crear_kb()
+    resultados = [ss.aplicar("X") for ss, _ in query(parsear_tripleta("X contiene lacteo"), kb)]
+    assert resultados == ["pizza", "pizza", "lasaña", "tarta"]
+
+
+def test_razonar():
+    kb = crear_kb()
+    assert razonar(parsear_tripleta("tarta contiene lacteo"), kb)
+    assert not razonar(parsear_tripleta("tarta contiene carne"), kb)
+
+# ============================
+#  Tests respuestas (paginación)
+# ============================
+
+def test_respuestas_distintas_con_confianza_maxima():
+    kb = crear_kb()
+    assert respuestas(parsear_tripleta("X contiene lacteo"), kb) == [
+        (("pizza",), 1.0), (("lasaña",), 0.9), (("tarta",), 1.0),
+    ]
+
+
+def test_respuestas_limit_offset():
+    kb = crear_kb()
+    tripleta = parsear_tripleta("X contiene lacteo")
+    assert respuestas(tripleta, kb, limite=1) == [(("pizza",), 1.0)]
+    assert respuestas(tripleta, kb, limite=1, desplazamiento=1) == [(("lasaña",), 0.9)]
+    assert respuestas(tripleta, kb, limite=5, desplazamiento=2) == [(("tarta",), 1.0)]
+    assert respuestas(tripleta, kb, limite=0) == []
+
+
+def test_respuestas_terminacion_temprana(monkeypatch):
+    """Con limit el motor deja de pedir resultados a query"""
+    tripleta = parsear_tripleta("X contiene lacteo")
+    consumidos = []
+
+    def query_contando(t, kb, *args, **kwargs):
+        for resultado in query(t, kb, *args, **kwargs):
+            # Solo contamos la consulta de nivel superior, no las de los antecedentes
+            if t is tripleta:
+                consumidos.append(resultado)
+            yield resultado
+
+    monkeypatch.setattr("sbc.query.query", query_contando)
+    respuestas(tripleta, crear_kb(), limite=2)
+    # pizza, pizza (repetida), lasaña -> se para ahí sin buscar tarta
+    assert len(consumidos) == 3
+
+# ============================
+#  Tests consultas conjuntivas
+# ============================
+
+def test_planificar_empieza_por_el_antecedente_mas_selectivo():
+    """'I tipo lacteo' (3 hechos) va antes que 'X ingrediente I' (4 hechos)"""
+    kb = crear_kb()
+    conjuncion = [parsear_tripleta("X ingrediente I"), parsear_tripleta("I tipo lacteo")]
+    assert planificar(conjuncion, kb) == [conjuncion[1], conjuncion[0]]
+
+
+def test_query_conjuncion_confianza_minima():
+    kb = crear_kb()
+    conjuncion = [parsear_tripleta("X ingrediente I"), parsear_tripleta("I tipo lacteo")]
+    resultados = sorted((ss.aplicar("X"), ss.aplicar("I"), c) for ss, c in query_conjuncion(conjuncion, kb))
+    assert resultados == [
+        ("lasaña", "queso", 0.9), ("pizza", "mozzarella", 1.0),
+        ("pizza", "queso", 1.0), ("tarta", "nata", 1.0),
+    ]
+
+
+def test_respuestas_conjuncion_con_reglas():
+    """Los antecedentes de una conjunción también se pueden derivar con reglas"""
+    kb = crear_kb()
+    conjuncion = [parsear_tripleta("X contiene lacteo"), parsear_tripleta("X ingrediente nata")]
+    assert respuestas(conjuncion, kb) == [(("tarta",), 1.0)]
+
+# ============================
+#  Tests contar (cuantos)
+# ============================
+
+@pytest.mark.parametrize("consulta", [
+    "X ingrediente Y", "X ingrediente queso", "pizza ingrediente Y", "pizza ingrediente queso",
+    "pizza ingrediente fresa", "X Y Z", "X contiene lacteo", "pizza contiene X", "X X X",
+])
+def test_contar_igual_que_respuestas(consulta):
+    kb = crear_kb()
+    tripleta = parsear_tripleta(consulta)
+    assert contar(tripleta, kb) == len(respuestas(tripleta, kb))
+
+
+def test_contar_hechos_desde_el_indice(monkeypatch):
+    """Sin reglas que deriven el patrón no se evalúa nada, aunque haya hechos repetidos"""
+    kb = crear_kb()
+    kb["hechos"].append(parsear_tripleta("pizza ingrediente queso [0.5]"))
+
+    def sin_evaluar(*args):
+        raise AssertionError("no debería evaluar la consulta")
+
+    monkeypatch.setattr("sbc.query.valores_respuestas", sin_evaluar)
+    assert contar(parsear_tripleta("X ingrediente queso"), kb) == 2
+    assert contar(parsear_tripleta("X ingrediente Y"), kb) == 4
+    assert contar(parsear_tripleta("X tipo lacteo"), kb) == 3
+
+
+def test_contar_conjuncion():
+    kb = crear_kb()
+    conjuncion = [parsear_tripleta("X ingrediente I"), parsear_tripleta("I tipo lacteo")]
+    assert contar(conjuncion, kb) == len(respuestas(conjuncion, kb)) == 4
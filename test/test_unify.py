@@ -0,0 +1,76 @@
+import itertools
+from sbc.ed import Tripleta, Sustitucion
+from sbc.unificar import unify, compilar_patron, unificar_hecho, unificar_patrones
+
+# Términos para generar todas las combinaciones: literales y variables repetidas
+TERMINOS = ["tomate", "color", "rojo", "X", "Y"]
+TRIPLETAS = [Tripleta(*ts) for ts in itertools.product(TERMINOS, repeat=3)]
+HECHOS = [Tripleta(*ts) for ts in itertools.product(["tomate", "color", "rojo"], repeat=3)]
+
+
+def esperado(x: Tripleta, y: Tripleta) -> dict | None:
+    """Resultado de referencia con unify"""
+    match unify(x, y):
+        case [ss]:
+            return ss.get_mappings()
+    return None
+
+# ============================
+#  Tests unify
+# ============================
+
+def test_unify_literal_con_variable():
+    """Unifica variables con literales"""
+    [ss] = unify(Tripleta("X", "color", "rojo"), Tripleta("tomate", "color", "rojo"))
+    assert ss.aplicar("X") == "tomate"
+
+
+def test_unify_falla_con_literales_distintos():
+    """Dos literales distintos no unifican"""
+    assert unify(Tripleta("X", "color", "rojo"), Tripleta("tomate", "color", "verde")) == []
+
+
+def test_unify_variable_repetida():
+    """Una variable repetida debe tomar el mismo valor"""
+    assert unify(Tripleta("X", "sustituye", "X"), Tripleta("leche", "sustituye", "nata")) == []
+    assert unify(Tripleta("X", "sustituye", "X"), Tripleta("leche", "sustituye", "leche")) != []
+
+# ============================
+#  Tests camino rápido
+# ============================
+
+def test_unificar_hecho_equivale_a_unify():
+    """El camino rápido da exactamente las mismas sustituciones que unify"""
+    for patron in TRIPLETAS:
+        compilado = compilar_patron(patron)
+        for hecho in HECHOS:
+            ss = unificar_hecho(compilado, hecho)
+            obtenido = ss.get_mappings() if ss is not None else None
+            assert obtenido == esperado(patron, hecho)
+
+
+def test_unificar_hecho_no_base_usa_unify():
+    """Si el hecho contiene variables se obtiene lo mismo que con unify"""
+    for patron in TRIPLETAS:
+        for hecho in (Tripleta("X", "color", "rojo"), Tripleta("tomate", "Y", "X")):
+            ss = unificar_hecho(compilar_patron(patron), hecho)
+            obtenido = ss.get_mappings() if ss is not None else None
+            assert obtenido == esperado(patron, hecho)
+
+
+def test_unificar_patrones_equivale_a_unify():
+    """Patrón contra consecuente de regla: mismas sustituciones que unify"""
+    for x in TRIPLETAS:
+        compilado = compilar_patron(x)
+        for y in TRIPLETAS:
+            ss = unificar_patrones(compilado, compilar_patron(y))
+            obtenido = ss.get_mappings() if ss is not None else None
+            assert obtenido == esperado(x, y)
+
+
+def test_unificar_hecho_devuelve_sustitucion():
+    """El resultado es una Sustitucion utilizable por el resto del motor"""
+    ss = unificar_hecho(compilar_patron(Tripleta("X", "color", "Y")), Tripleta("tomate", "color", "rojo"))
+    assert isinstance(ss, Sustitucion)
+    assert ss.aplicar("X") == "tomate"
+    assert ss.aplicar("Y") == "rojo"
@@ -0,0 +1,176 @@
+import threading
+from pathlib import Path
+from sbc.cargar_kb import carga_kb
+from sbc.cli import formatear_resultados
+from sbc.ed import Tripleta
+from sbc.parser import parsear_tripleta, parsear_regla
+from sbc.query import descubrir, respuestas, contar, query
+from sbc.unificar import compilar_patron
+from sbc.versiones import HechosVersionados, instantanea_kb
+
+
+def patron(texto: str):
+    return compilar_patron(parsear_tripleta(texto))
+
+
+def test_instantanea_no_ve_escrituras_posteriores():
+    almacen = HechosVersionados([Tripleta("pizza", "ingrediente", "queso")])
+    antes = almacen.instantanea()
+    almacen.extend([Tripleta("tarta", "ingrediente", "nata"), Tripleta("pizza", "ingrediente", "tomate")])
+
+    assert list(antes) == [Tripleta("pizza", "ingrediente", "queso")]
+    assert antes.buscar(patron("pizza ingrediente X")) == [Tripleta("pizza", "ingrediente", "queso")]
+    assert Tripleta("tarta", "ingrediente", "nata") not in antes
+    assert len(almacen) == 3
+    assert len(almacen.buscar(patron("pizza ingrediente X"))) == 2
+    assert almacen.version == antes.version + 1
+
+
+def test_bajas_por_version():
+    queso = Tripleta("pizza", "ingrediente", "queso")
+    tomate = Tripleta("pizza", "ingrediente", "tomate")
+    almacen = HechosVersionados([queso, tomate])
+    antes = almacen.instantanea()
+    almacen.eliminar(queso)
+
+    assert list(antes) == [queso, tomate] and len(antes) == 2
+    assert list(almacen) == [tomate] and len(almacen) == 1
+    assert queso not in almacen
+    assert almacen.buscar(patron("X ingrediente Y")) == [tomate]
+
+    # hechos[:] = ... quita y agrega en una sola versión
+    nata = Tripleta("tarta", "ingrediente", "nata")
+    version = almacen.version
+    almacen[:] = [nata]
+    assert list(almacen) == [nata] and almacen.version == version + 1
+    assert almacen[0] is nata and almacen[1:] == []
+
+
+def test_descubrir_igual_que_con_lista():
+    hechos = ["pizza ingrediente queso", "queso tipo lacteo", "tarta ingrediente nata", "nata tipo lacteo"]
+    reglas = [parsear_regla("Plato contiene lacteo <- Plato ingrediente I, I tipo lacteo")]
+    kb_lista = {"hechos": [parsear_tripleta(h) for h in hechos], "reglas": list(reglas)}
+    kb = {"hechos": HechosVersionados(parsear_tripleta(h) for h in hechos), "reglas": list(reglas)}
+
+    lectura = instantanea_kb(kb)
+    assert descubrir(kb) == descubrir(kb_lista)
+    assert list(kb["hechos"]) == kb_lista["hechos"]
+    # La lectura fijada antes de descubrir no ve los derivados
+    assert respuestas(parsear_tripleta("X contiene lacteo"), {"hechos": lectura["hechos"], "reglas": []}) == []
+    assert len(respuestas(parsear_tripleta("X contiene lacteo"), {"hechos": kb["hechos"], "reglas": []})) == 2
+
+
+def test_lectores_concurrentes_ven_versiones_completas():
+    """Cada escritura publica un lote entero: un lector nunca ve medio lote"""
+    almacen = HechosVersionados()
+    tamano_lote = 50
+    errores = []
+    fin = threading.Event()
+    lotes = patron("X tipo lote")
+
+    def lector():
+        while not fin.is_set():
+            instantanea = almacen.instantanea()
+            n = len(instantanea)
+            candidatos = instantanea.buscar(lotes)
+            if n % tamano_lote or len(candidatos) != n or len(list(instantanea)) != n:
+                errores.append(n)
+
+    hilos = [threading.Thread(target=lector) for _ in range(3)]
+    for hilo in hilos:
+        hilo.start()
+    for lote in range(100):
+        almacen.extend(Tripleta(f"h{lote}_{i}", "tipo", "lote") for i in range(tamano_lote))
+    fin.set()
+    for hilo in hilos:
+        hilo.join()
+
+    assert errores == []
+    assert len(almacen) == 100 * tamano_lote
+
+
+def test_carga_kb_versionada(tmp_path):
+    hechos = tmp_path / "hechos.txt"
+    hechos.write_text("tomate color rojo\nplatano color amarillo\n", encoding="utf-8")
+    kb = carga_kb(hechos, Path("/no/existe"), versionado=True)
+    assert isinstance(kb["hechos"], HechosVersionados)
+    assert respuestas(parsear_tripleta("X color rojo"), instantanea_kb(kb)) == [(("tomate",), 1.0)]
+
+
+def test_recorrido_sin_patron_no_copia_el_registro():
+    """Un recorrido sin literales se detiene en el límite de la instantánea"""
+    almacen = HechosVersionados(Tripleta(f"h{i}", "tipo", "lote") for i in range(3))
+    antes = almacen.instantanea()
+    todos = antes.buscar(patron("X Y Z"))
+    recorrido = iter(antes)
+    assert next(recorrido) == Tripleta("h0", "tipo", "lote")
+    almacen.append(Tripleta("h3", "tipo", "lote"))
+    assert len(list(recorrido)) == 2
+    assert len(todos) == 3 and list(todos) == antes.lista()
+
+
+def test_cli_agrega_hecho_con_cerrojo_de_escritura():
+    """La aserción espera al escritor que tiene el almacén reservado"""
+    almacen = HechosVersionados()
+    kb = {"hechos": almacen, "reglas": []}
+    salida = []
+    hilo = threading.Thread(target=lambda: salida.extend(formatear_resultados("tarta ingrediente nata .", kb)))
+    with almacen.escritura():
+        hilo.start()
+        hilo.join(0.2)
+        assert hilo.is_alive()
+        # Otro escritor agrega el mismo hecho mientras la aserción espera
+        almacen.append(Tripleta("tarta", "ingrediente", "nata"))
+    hilo.join()
+    assert salida == ["Ya existe el hecho: tarta ingrediente nata"]
+    assert len(almacen) == 1
+
+
+def test_consulta_con_reglas_lee_una_sola_version():
+    """Un 'descubrir' a mitad de una consulta no mezcla versiones en sus joins"""
+    hechos = [f"a{i} sig a{i + 1}" for i in range(6)]
+    reglas = [
+        parsear_regla("X cerca Y <- X sig Y"),
+        parsear_regla("X dos Z <- X sig Y, Y cerca Z"),
+    ]
+    kb = {"hechos": HechosVersionados(parsear_tripleta(h) for h in hechos), "reglas": reglas}
+    tripleta = parsear_tripleta("X dos Z")
+    esperadas = [(ss.aplicar("X"), ss.aplicar("Z")) for ss, _ in query(tripleta, kb)]
+
+    resultados = query(tripleta, kb)
+    primera, _ = next(resultados)
+    # 'cerca' pasa a estar también como hecho: una lectura sin fijar lo encontraría dos veces
+    assert descubrir(kb)
+    vistas = [(primera.aplicar("X"), primera.aplicar("Z"))]
+    vistas += [(ss.aplicar("X"), ss.aplicar("Z")) for ss, _ in resultados]
+    assert vistas == esperadas
+    assert len(list(query(tripleta, kb))) > len(esperadas)
+
+
+def test_lectores_de_conjunciones_concurrentes_con_descubrir():
+    """respuestas y contar ven cada uno una versión completa mientras otro hilo descubre"""
+    reglas = [parsear_regla("X par Y <- X lote L, Y lote L")]
+    kb = {"hechos": HechosVersionados(), "reglas": reglas}
+    conjuncion = [parsear_tripleta("X lote L"), parsear_tripleta("Y lote M")]
+    tamano_lote = 5
+    errores = []
+    fin = threading.Event()
+
+    def lector():
+        while not fin.is_set():
+            # Con una sola versión hay n² pares; si cada antecedente leyera una versión, n1·n2
+            for n in (len(respuestas(conjuncion, kb)), contar(conjuncion, kb)):
+                if round(n ** 0.5) ** 2 != n:
+                    errores.append(n)
+
+    hilos = [threading.Thread(target=lector) for _ in range(2)]
+    for hilo in hilos:
+        hilo.start()
+    for lote in range(30):
+        kb["hechos"].extend(Tripleta(f"h{lote}_{i}", "lote", f"l{lote}") for i in range(tamano_lote))
+        descubrir(kb)
+    fin.set()
+    for hilo in hilos:
+        hilo.join()
+
+    assert errores == []
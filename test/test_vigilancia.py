@@ -0,0 +1,106 @@
+import os
+import pytest
+from sbc.parser import parsear_tripleta
+from sbc.cargar_kb import carga_kb
+from sbc.query import descubrir, query
+from sbc.vigilancia import VigilanteKB, diferencia
+
+HECHOS = """
+paella ingrediente gamba
+sopa ingrediente gamba [0.5]
+gamba tipo marisco
+marisco parte_de producto_animal
+"""
+
+REGLAS = """
+Plato contiene Cosa <- Plato ingrediente I, I tipo Cosa
+Plato contiene B <- Plato contiene A, A parte_de B
+"""
+
+
+def escribir(fichero, texto: str) -> None:
+    """Escribe el fichero y adelanta su fecha de modificación para que el cambio se note"""
+    fichero.write_text(texto)
+    estado = fichero.stat()
+    os.utime(fichero, ns=(estado.st_atime_ns, estado.st_mtime_ns + 10**9))
+
+
+@pytest.fixture
+def kb_vigilada(tmp_path):
+    hechos_file = tmp_path / "hechos.txt"
+    reglas_file = tmp_path / "reglas.txt"
+    hechos_file.write_text(HECHOS)
+    reglas_file.write_text(REGLAS)
+    kb = carga_kb(hechos_file, reglas_file)
+    return kb, VigilanteKB(kb, hechos_file, reglas_file), hechos_file, reglas_file
+
+
+def como_dict(hechos) -> dict:
+    """Clave -> confianza máxima (la KB puede tener un hecho repetido con varias confianzas)"""
+    resultado = {}
+    for h in hechos:
+        resultado[tuple(h)] = max(h.confianza, resultado.get(tuple(h), -1.0))
+    return resultado
+
+
+def test_diferencia_lineas():
+    agregadas, eliminadas = diferencia(["a", "b", "b", "c"], ["b", "d", "c", "e"])
+    assert agregadas == ["d", "e"]
+    assert sorted(eliminadas) == ["a", "b"]
+
+
+def test_sin_cambios(kb_vigilada):
+    _, vigilante, _, _ = kb_vigilada
+    assert vigilante.comprobar() is None
+
+
+def test_altas_y_bajas_de_hechos(kb_vigilada):
+    kb, vigilante, hechos_file, _ = kb_vigilada
+    # Consulta antes del cambio para que exista el índice
+    assert len(list(query(parsear_tripleta("X ingrediente gamba"), kb))) == 2
+
+    escribir(hechos_file, HECHOS.replace("sopa ingrediente gamba [0.5]", "tortilla ingrediente huevo"))
+    cambios = vigilante.comprobar()
+    assert cambios.hechos_agregados == [parsear_tripleta("tortilla ingrediente huevo")]
+    assert cambios.hechos_eliminados == [parsear_tripleta("sopa ingrediente gamba [0.5]")]
+    assert [ss.aplicar("X") for ss, _ in query(parsear_tripleta("X ingrediente Y"), kb)] == ["paella", "tortilla"]
+
+
+def test_derivados_se_mantienen_como_recalculando(kb_vigilada, tmp_path):
+    """Tras cada recarga los hechos son los mismos que cargando y descubriendo de cero"""
+    kb, vigilante, hechos_file, reglas_file = kb_vigilada
+    descubrir(kb)
+
+    versiones = [
+        (HECHOS.replace("paella ingrediente gamba", ""), REGLAS),
+        (HECHOS + "producto_animal parte_de ser_vivo\n", REGLAS),
+        (HECHOS, REGLAS.replace("Plato contiene B <- Plato contiene A, A parte_de B", "")),
+        (HECHOS + "paella ingrediente gamba [0.3]\n", REGLAS),
+    ]
+    for hechos, reglas in versiones:
+        escribir(hechos_file, hechos)
+        escribir(reglas_file, reglas)
+        vigilante.comprobar()
+        referencia = carga_kb(hechos_file, reglas_file)
+        descubrir(referencia)
+        assert como_dict(kb["hechos"]) == como_dict(referencia["hechos"])
+
+
+def test_baja_de_hecho_retira_derivados(kb_vigilada):
+    kb, vigilante, hechos_file, _ = kb_vigilada
+    descubrir(kb)
+    escribir(hechos_file, HECHOS.replace("marisco parte_de producto_animal", ""))
+    cambios = vigilante.comprobar()
+    assert sorted(cambios.derivados_retirados) == [
+        ("paella", "contiene", "producto_animal"), ("sopa", "contiene", "producto_animal"),
+    ]
+    assert "contiene" in cambios.predicados()
+
+
+def test_linea_invalida_no_toca_la_kb(kb_vigilada):
+    kb, vigilante, hechos_file, _ = kb_vigilada
+    antes = list(kb["hechos"])
+    escribir(hechos_file, HECHOS + "esto no es un hecho valido\n")
+    with pytest.raises(Exception):
+        vigilante.comprobar()
+    assert kb["hechos"] == antes